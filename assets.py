@@ -0,0 +1,146 @@
+import os
+import pygame
+from cache import LRUCache
+
+IMAGE_DIR = os.path.join("assets", "images")
+
+FALLBACK_COLOR = (255, 0, 255)  # Magenta, only used if no color is given
+
+
+def image_path(name):
+    return os.path.join(IMAGE_DIR, name)
+
+
+class AssetCache:
+    """Process-wide registry of image surfaces.
+
+    Every source image is read from disk and converted once, and every
+    (path, size) pair is scaled once and shared between all the objects
+    that ask for it. Scaled surfaces for sizes nobody has asked for in a
+    while are evicted LRU-style; the converted originals are kept.
+    """
+
+    def __init__(self, max_scaled=256):
+        # (path, converted) -> Surface, or None if loading failed. Without a
+        # video mode there is nothing to convert_alpha() for, so those loads
+        # are kept apart and redone once a display exists.
+        self._originals = {}
+        self._scaled = LRUCache(max_scaled)
+        self.disk_loads = 0
+
+    def load(self, path):
+        """Return the original surface for path, or None if it can't be loaded.
+
+        The surface is converted for fast blitting when a display mode is set.
+        """
+        converted = pygame.display.get_surface() is not None
+        key = (path, converted)
+        if key in self._originals:
+            return self._originals[key]
+        self.disk_loads += 1
+        try:
+            surface = pygame.image.load(path)
+            if converted:
+                surface = surface.convert_alpha()
+        except (pygame.error, FileNotFoundError) as e:
+            print(f"Error loading image {path}: {e}")
+            surface = None
+        self._originals[key] = surface
+        return surface
+
+    def get(self, path, size, fallback_color=FALLBACK_COLOR):
+        """Return a shared surface of path scaled to size (width, height).
+
+        If the image can't be loaded a solid surface filled with
+        fallback_color is cached in its place, so the failure is only
+        reported once.
+        """
+        size = (int(size[0]), int(size[1]))
+        key = (path, size, pygame.display.get_surface() is not None)
+        surface = self._scaled.get(key)
+        if surface is not None:
+            return surface
+
+        original = self.load(path)
+        if original is not None:
+            surface = pygame.transform.scale(original, size)
+        else:
+            surface = pygame.Surface(size)
+            surface.fill(fallback_color)
+        self._scaled.put(key, surface)
+        return surface
+
+    def preload(self, specs):
+        """Warm the cache. specs is an iterable of (path, size) or (path, size, fallback_color)."""
+        for spec in specs:
+            self.get(*spec)
+
+    def evict(self, path=None):
+        """Drop cached surfaces for path (or everything when path is None)."""
+        if path is None:
+            self._originals.clear()
+            self._scaled.clear()
+            return
+        self._originals.pop((path, True), None)
+        self._originals.pop((path, False), None)
+        for key in self._scaled.keys():
+            if key[0] == path:
+                self._scaled.pop(key)
+
+    def stats(self):
+        stats = self._scaled.stats()
+        stats["originals"] = len(self._originals)
+        stats["disk_loads"] = self.disk_loads
+        return stats
+
+
+class Sprite:
+    """Class attribute that looks up an entity's image on first access.
+
+    Entities declare e.g. image = Sprite("bed.png") and get a surface
+    scaled to their size (a number or a (width, height) tuple), falling
+    back to their color. Nothing is loaded until something draws, so
+    headless simulations never touch the image files. Every lookup goes
+    through default_cache, not the entity, so entities with __slots__
+    work, every instance of a type shares one surface, and the cache's
+    LRU limit, stats() and evict() cover sprites too.
+    """
+
+    def __init__(self, filename, original=False):
+        self.filename = filename
+        self.original = original
+
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+        path = image_path(self.filename)
+        if self.original:
+            return load_image(path)
+        size = obj.size if isinstance(obj.size, tuple) else (obj.size, obj.size)
+        return get_image(path, size, obj.color)
+
+    def scaled(self, obj, scale):
+        """obj's image at scale times its size (e.g. a camera zoom), shared through the cache."""
+        width, height = obj.size if isinstance(obj.size, tuple) else (obj.size, obj.size)
+        size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        return get_image(image_path(self.filename), size, obj.color)
+
+
+# Shared by Simling, FoodSource and Bed
+default_cache = AssetCache()
+
+
+def get_image(path, size, fallback_color=FALLBACK_COLOR):
+    return default_cache.get(path, size, fallback_color)
+
+
+def load_image(path):
+    return default_cache.load(path)
+
+
+def preload(specs):
+    default_cache.preload(specs)
+
+
+def stats():
+    return default_cache.stats()
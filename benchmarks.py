@@ -0,0 +1,385 @@
+"""Benchmarks for the simulation and rendering hot paths.
+
+    python benchmarks.py                        # Everything, 10 to 100k simlings
+    python benchmarks.py --quick                # Small sizes only
+    python benchmarks.py --output results.json  # Write machine-readable results
+    python benchmarks.py --save-baseline        # Store results in bench_baseline.json
+    python benchmarks.py --baseline other.json  # Compare against another run
+
+Results are compared against bench_baseline.json when it exists, and the
+exit status is 1 if any benchmark got slower by more than --tolerance.
+Baselines are machine specific, so make your own before changing things.
+
+Rendering runs under the dummy SDL video driver unless SDL_VIDEODRIVER is
+already set.
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import numpy as np  # noqa: E402
+import pygame  # noqa: E402
+
+from objects import FoodSource, Bed  # noqa: E402
+from population import Population  # noqa: E402
+from render import Renderer  # noqa: E402
+from lod import LODScheduler  # noqa: E402
+from parallel import ParallelWorld  # noqa: E402
+from simling import Simling  # noqa: E402
+from spatial import ObjectGrid, closest_objects  # noqa: E402
+from telemetry import DeltaEncoder, capture_frame, encode_message  # noqa: E402
+from utility import CLASSIC, BALANCED  # noqa: E402
+from world import World  # noqa: E402
+
+SIZES = (10, 100, 1_000, 10_000, 100_000)
+QUICK_SIZES = (10, 100, 1_000)
+OBJECT_COUNTS = (10, 100, 1_000, 10_000)
+SCREEN_SIZE = (800, 600)
+LARGE_WORLD_SIZE = (8000, 6000)  # 100 screens, for level-of-detail updates
+BASELINE = "bench_baseline.json"
+
+
+def measure(function, min_time=0.2, max_runs=1000):
+    """Seconds per call of function(), best of a few batches."""
+    function()  # Warm up (and lazy-load anything that needs it)
+    runs = 0
+    best = float("inf")
+    start = time.perf_counter()
+    while runs < max_runs:
+        t0 = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - t0)
+        runs += 1
+        if time.perf_counter() - start > min_time:
+            break
+    return best
+
+
+def build_world(count, seed=0, size=SCREEN_SIZE, world_type=World, **options):
+    world = world_type(seed=seed, size=size, **options)
+    world.spawn_simlings(count, *size)
+    for simling in world.simlings:
+        simling.hunger = world.rng.uniform(0, 90)
+        simling.sleep = world.rng.uniform(0, 90)
+    for simling in world.simlings[::4]:
+        simling.set_player_commanded_target((world.rng.uniform(0, size[0]),
+                                             world.rng.uniform(0, size[1])))
+    world.add_food_source(x=50, y=50)
+    world.add_food_source(x=700, y=500)
+    world.add_bed(x=400, y=50)
+    world.add_bed(x=100, y=500)
+    return world
+
+
+def bench_update(sizes):
+    results = {}
+    for count in sizes:
+        world = build_world(count)
+        results[f"update_many/n={count}"] = (
+            1.0 / measure(lambda: world.step(1 / 60)), "ticks/s", True)
+        if count <= 10_000:  # The per-object path gets very slow past this
+            simlings = world.simlings
+
+            def per_object():
+                for simling in simlings:
+                    simling.update(1 / 60, world.world_objects)
+            results[f"update_per_object/n={count}"] = (1.0 / measure(per_object, max_runs=50), "ticks/s", True)
+
+            def move_per_object():
+                for simling in simlings:
+                    simling.move_towards_target(1 / 60)
+            results[f"move_towards_target/n={count}"] = (1.0 / measure(move_per_object, max_runs=50), "ticks/s", True)
+
+        # Only one screen of a much larger world in view
+        large = build_world(count, size=LARGE_WORLD_SIZE)
+        results[f"update_large_world/n={count}"] = (1.0 / measure(lambda: large.step(1 / 60)), "ticks/s", True)
+        large.lod = LODScheduler(large, view=(0, 0, *SCREEN_SIZE))
+        results[f"update_large_world_lod/n={count}"] = (
+            1.0 / measure(lambda: large.step(1 / 60)), "ticks/s", True)
+    return results
+
+
+def bench_parallel(sizes, worker_counts=(1, 2, 4)):
+    """Steps per second of ParallelWorld against a single-process World doing the same work.
+
+    Both run without contention or conversations, which ParallelWorld
+    doesn't support. Below a thousand simlings handing work to the pool
+    costs more than it saves, so those sizes are skipped.
+    """
+    results = {}
+    for count in sizes:
+        if count < 1_000:
+            continue
+        world = build_world(count, contention=False, social=False)
+        results[f"parallel_step/world/n={count}"] = (
+            1.0 / measure(lambda: world.step(1 / 60), max_runs=30), "ticks/s", True)
+        for workers in worker_counts:
+            with build_world(count, world_type=ParallelWorld, contention=False, workers=workers) as parallel:
+                results[f"parallel_step/workers={workers}/n={count}"] = (
+                    1.0 / measure(lambda: parallel.step(1 / 60), max_runs=30), "ticks/s", True)
+    return results
+
+
+def bench_social(sizes):
+    """Pairing every simling for conversations, at the same density whatever the count.
+
+    Neighbor queries only look at nearby cells, so the time per simling
+    should stay flat as the population grows.
+    """
+    results = {}
+    for count in sizes:
+        scale = max(1.0, (count / 1000) ** 0.5)  # 1000 simlings per screen
+        world = World(seed=0, size=(SCREEN_SIZE[0] * scale, SCREEN_SIZE[1] * scale))
+        world.spawn_simlings(count, *world.size)
+        population = world.population
+        indices = population.indices()
+        population.social[indices] = 80
+
+        def pair_everyone():
+            population.action[indices] = 0  # Idle again
+            world.interactions.pair(indices)
+        results[f"social_pair/n={count}"] = (measure(pair_everyone, max_runs=20) / count * 1e6, "us", False)
+    return results
+
+
+def bench_decide(sizes):
+    """Scoring what every simling would do, in one batch, for each AI configuration."""
+    results = {}
+    for count in sizes:
+        world = build_world(count)
+        population = world.population
+        indices = population.indices()
+        for name, ai in (("classic", CLASSIC), ("balanced", BALANCED)):
+            results[f"ai_decide/{name}/n={count}"] = (
+                measure(lambda: ai.decide(population, indices, world.world_objects)) * 1e3, "ms", False)
+    return results
+
+
+def bench_telemetry(sizes):
+    """What publishing costs the frame loop (capture) and the server thread (encoding a delta)."""
+    results = {}
+    for count in sizes:
+        world = build_world(count)
+        frames = [capture_frame(world)]
+        world.step()
+        frames.append(capture_frame(world))
+        encoder = DeltaEncoder(keyframe_interval=np.inf)
+        alternating = itertools.cycle(frames)
+        results[f"telemetry_capture/n={count}"] = (measure(lambda: capture_frame(world)) * 1e3, "ms", False)
+        results[f"telemetry_delta/n={count}"] = (
+            measure(lambda: encode_message(encoder.encode(*next(alternating)))) * 1e3, "ms", False)
+    return results
+
+
+def bench_find_closest(object_counts):
+    results = {}
+    rng = random.Random(1)
+    probe = Simling(x=400, y=300, population=Population())
+    points = [(rng.uniform(0, 4000), rng.uniform(0, 4000)) for _ in range(1000)]
+    for count in object_counts:
+        foods = [FoodSource(x=rng.uniform(0, 4000), y=rng.uniform(0, 4000)) for _ in range(count)]
+        grid = ObjectGrid(foods)
+        for name, objects in (("list", foods), ("grid", grid)):
+            def query():
+                probe.x = rng.uniform(0, 4000)
+                probe.y = rng.uniform(0, 4000)
+                probe.find_closest_object(objects)
+            results[f"find_closest_object/{name}/objects={count}"] = (measure(query) * 1e6, "us", False)
+        xs = np.array([p[0] for p in points])
+        ys = np.array([p[1] for p in points])
+        # The grid should beat both a vectorized scan of the list and one nearest() per point
+        results[f"nearest_many/grid/objects={count}/queries=1000"] = (
+            measure(lambda: grid.nearest_many(xs, ys)) * 1e3, "ms", False)
+        results[f"nearest_many/list/objects={count}/queries=1000"] = (
+            measure(lambda: closest_objects(foods, xs, ys)) * 1e3, "ms", False)
+        results[f"nearest_many/grid-loop/objects={count}/queries=1000"] = (
+            measure(lambda: [grid.nearest(x, y) for x, y in points]) * 1e3, "ms", False)
+    # What main.py does: a couple of objects and many simlings
+    foods = [FoodSource(x=50, y=50), FoodSource(x=700, y=500)]
+    grid = ObjectGrid(foods)
+    xs = np.array([rng.uniform(0, 3200) for _ in range(10_000)])
+    ys = np.array([rng.uniform(0, 2400) for _ in range(10_000)])
+    for name, objects in (("list", foods), ("grid", grid)):
+        results[f"nearest_many/{name}/objects=2/queries=10000"] = (
+            measure(lambda: closest_objects(objects, xs, ys)) * 1e3, "ms", False)
+    return results
+
+
+def bench_reservations(object_counts, seekers=20_000):
+    """Picking food for a crowd all at once, with contention, as the number of food sources grows."""
+    results = {}
+    rng = np.random.default_rng(2)
+    xs, ys = rng.uniform(0, 4000, seekers), rng.uniform(0, 4000, seekers)
+    speeds = np.full(seekers, 50.0)
+    for count in (4,) + tuple(object_counts):
+        world = World(size=(4000, 4000))
+        for x, y in rng.uniform(0, 4000, (count, 2)).tolist():
+            world.add_food_source(x=x, y=y)
+        reservations = world.food_sources.reservations
+        results[f"reservations_choose/objects={count}/seekers={seekers}"] = (
+            measure(lambda: reservations.choose(xs, ys, speeds)) * 1e3, "ms", False)
+    return results
+
+
+def bench_construction(sizes):
+    results = {}
+    for count in sizes:
+        if count > 10_000:
+            continue
+
+        def make_simlings():
+            population = Population()
+            for i in range(count):
+                Simling(x=i, y=i, population=population)
+
+        def make_objects():
+            for i in range(count):
+                FoodSource(x=i, y=i)
+                Bed(x=i, y=i)
+        results[f"construct_simling/n={count}"] = (measure(make_simlings, max_runs=20) / count * 1e6, "us", False)
+        results[f"construct_food_and_bed/n={count}"] = (measure(make_objects, max_runs=20) / count * 1e6, "us", False)
+    return results
+
+
+def bench_memory(sizes):
+    """Bytes per entity allocated through Python (tracemalloc), right after creation and after a draw.
+
+    A simling's share of its Population's columns is included, and so are
+    the x, y values passed in.
+    """
+    results = {}
+    count = max(size for size in sizes if size <= 100_000)
+    kinds = (("simling", lambda i, population: Simling(x=i, y=i, population=population)),
+             ("food_source", lambda i, population: FoodSource(x=i, y=i)),
+             ("bed", lambda i, population: Bed(x=i, y=i)))
+    for name, make in kinds:
+        tracemalloc.start()
+        start = tracemalloc.get_traced_memory()[0]
+        population = Population()
+        entities = [make(i, population) for i in range(count)]
+        created = tracemalloc.get_traced_memory()[0]
+        for entity in entities:
+            entity.image
+        drawn = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        results[f"memory/{name}/n={count}"] = ((created - start) / count, "bytes", False)
+        results[f"memory_drawn/{name}/n={count}"] = ((drawn - start) / count, "bytes", False)
+    return results
+
+
+def bench_draw(sizes):
+    results = {}
+    pygame.display.init()
+    pygame.font.init()
+    screen = pygame.display.set_mode(SCREEN_SIZE)
+    for count in sizes:
+        world = build_world(count)
+        renderer = Renderer(screen, world)
+
+        def full_frame():
+            renderer.invalidate()
+            renderer.draw()
+
+        def dirty_frame():
+            world.step(1 / 60)
+            renderer.draw()
+        results[f"draw_full/n={count}"] = (measure(full_frame, max_runs=100) * 1e3, "ms", False)
+        results[f"draw_dirty_with_step/n={count}"] = (measure(dirty_frame, max_runs=100) * 1e3, "ms", False)
+
+        # The same number of simlings spread over 100 screens, one in view
+        large = build_world(count, size=LARGE_WORLD_SIZE)
+        large_renderer = Renderer(screen, large)
+
+        def large_full_frame():
+            large_renderer.invalidate()
+            large_renderer.draw()
+        results[f"draw_full_large_world/n={count}"] = (measure(large_full_frame, max_runs=100) * 1e3, "ms", False)
+    return results
+
+
+def run(sizes, object_counts):
+    results = {}
+    for bench in (lambda: bench_update(sizes), lambda: bench_parallel(sizes), lambda: bench_social(sizes),
+                  lambda: bench_decide(sizes), lambda: bench_telemetry(sizes),
+                  lambda: bench_find_closest(object_counts), lambda: bench_reservations(object_counts),
+                  lambda: bench_construction(sizes), lambda: bench_memory(sizes), lambda: bench_draw(sizes)):
+        for name, (value, unit, higher_is_better) in bench().items():
+            results[name] = {"value": value, "unit": unit, "higher_is_better": higher_is_better}
+            print(f"{name:60s} {value:14.3f} {unit}")
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pygame": pygame.version.ver,
+            "machine": platform.machine(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+
+
+def compare(current, baseline, tolerance):
+    """Print the change against baseline per benchmark. Returns the regressed names."""
+    regressions = []
+    print(f"\n{'benchmark':60s} {'baseline':>12s} {'current':>12s} {'change':>8s}")
+    for name, result in current["results"].items():
+        base = baseline["results"].get(name)
+        if base is None or not base["value"]:
+            continue
+        ratio = result["value"] / base["value"]
+        # Positive change is always an improvement
+        change = ratio - 1 if result["higher_is_better"] else 1 / ratio - 1
+        flag = ""
+        if change < -tolerance:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:60s} {base['value']:12.3f} {result['value']:12.3f} {change:+8.1%}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--quick", action="store_true", help="only small population sizes")
+    parser.add_argument("--sizes", help="comma separated population sizes")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--baseline", help=f"JSON results to compare against (default {BASELINE} if it exists)")
+    parser.add_argument("--save-baseline", action="store_true", help=f"write results to {BASELINE}")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed slowdown before a benchmark counts as regressed (default 0.25)")
+    args = parser.parse_args(argv)
+
+    if args.sizes:
+        sizes = tuple(int(size) for size in args.sizes.split(","))
+    else:
+        sizes = QUICK_SIZES if args.quick else SIZES
+    object_counts = OBJECT_COUNTS[:3] if args.quick else OBJECT_COUNTS
+
+    baseline_path = args.baseline
+    if baseline_path is None and not args.save_baseline and os.path.exists(BASELINE):
+        baseline_path = BASELINE
+
+    current = run(sizes, object_counts)
+    for path in (args.output, BASELINE if args.save_baseline else None):
+        if path:
+            with open(path, "w") as f:
+                json.dump(current, f, indent=2, sort_keys=True)
+    if baseline_path:
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+        regressions = compare(current, baseline, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} benchmark(s) regressed by more than {args.tolerance:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
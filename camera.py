@@ -0,0 +1,81 @@
+import math
+
+# Zoom goes in quarter octaves, so there are few enough sizes to cache a
+# scaled sprite for each
+ZOOM_LEVELS = tuple(2 ** (step / 4) for step in range(-8, 9))  # 0.25 to 4
+
+
+class Camera:
+    """Which part of the world the screen shows, and how big.
+
+    x, y is the world position at the top left of the viewport and zoom
+    the number of screen pixels per world unit, one of ZOOM_LEVELS. The
+    view is kept inside the world (centred on it when the world is
+    smaller than the view). A camera at 0, 0 with zoom 1 draws the world
+    exactly as it was drawn before there was one.
+    """
+
+    def __init__(self, viewport_size, world_size, x=0.0, y=0.0):
+        self.width, self.height = viewport_size
+        self.world_width, self.world_height = world_size
+        self.x = x
+        self.y = y
+        self.zoom_index = ZOOM_LEVELS.index(1.0)
+        self._clamp()
+
+    @property
+    def zoom(self):
+        return ZOOM_LEVELS[self.zoom_index]
+
+    def state(self):
+        """Everything that decides what ends up where on screen, for cache keys."""
+        return (self.x, self.y, self.zoom_index)
+
+    def view_rect(self):
+        """Visible part of the world as x, y, width, height in world units."""
+        return (self.x, self.y, self.width / self.zoom, self.height / self.zoom)
+
+    def world_to_screen(self, x, y):
+        return (math.floor((x - self.x) * self.zoom), math.floor((y - self.y) * self.zoom))
+
+    def screen_to_world(self, position):
+        return (self.x + position[0] / self.zoom, self.y + position[1] / self.zoom)
+
+    def scaled(self, length):
+        """Screen pixels covered by length world units, at least one."""
+        return max(1, round(length * self.zoom))
+
+    def pan(self, dx, dy):
+        """Move the view by dx, dy screen pixels."""
+        self.x += dx / self.zoom
+        self.y += dy / self.zoom
+        self._clamp()
+
+    def center_on(self, x, y):
+        view_x, view_y, view_width, view_height = self.view_rect()
+        self.x = x - view_width / 2
+        self.y = y - view_height / 2
+        self._clamp()
+
+    def zoom_by(self, steps, anchor=None):
+        """Zoom in (positive steps) or out by steps levels, keeping the world point at anchor
+        (a screen position, the centre by default) where it is."""
+        if anchor is None:
+            anchor = (self.width / 2, self.height / 2)
+        world_x, world_y = self.screen_to_world(anchor)
+        self.zoom_index = min(max(self.zoom_index + steps, 0), len(ZOOM_LEVELS) - 1)
+        self.x = world_x - anchor[0] / self.zoom
+        self.y = world_y - anchor[1] / self.zoom
+        self._clamp()
+
+    def _clamp(self):
+        _, _, view_width, view_height = self.view_rect()
+        self.x = _clamp_axis(self.x, view_width, self.world_width)
+        self.y = _clamp_axis(self.y, view_height, self.world_height)
+
+
+def _clamp_axis(position, view_length, world_length):
+    slack = world_length - view_length
+    if slack < 0:
+        return slack / 2
+    return min(max(position, 0.0), slack)
@@ -0,0 +1,54 @@
+import math
+
+SELECT_BUTTON = 1  # Left mouse button
+COMMAND_BUTTON = 3  # Right mouse button
+FORMATION_SPACING = 30  # Distance between simlings sent somewhere as a group
+
+
+def handle_click(selection, picker, button, position, end=None):
+    """Apply a mouse click to the game state. Returns the selection (a list of simlings) afterwards.
+
+    Left click selects the simling under the cursor (or deselects), a
+    left drag from position to end selects every simling in the box.
+    Right click sends the selection to position, in formation. Positions
+    are in world coordinates (see camera.Camera.screen_to_world) and
+    picker is a picking.SimlingPicker over the world's population. Shared
+    by main.py and the replay engine, so both handle input exactly the
+    same way.
+    """
+    if button == SELECT_BUTTON:
+        picker.sync()
+        if end is None:
+            simling = picker.at(*position)
+            return [simling] if simling is not None else []
+        left, right = sorted((position[0], end[0]))
+        top, bottom = sorted((position[1], end[1]))
+        return picker.in_rect(left, top, right - left, bottom - top)
+    if button == COMMAND_BUTTON and selection:
+        command_group(selection, position)
+    return selection
+
+
+def formation_offsets(count, spacing=FORMATION_SPACING):
+    """Offsets of a square-ish grid of count places, row by row, centred on 0, 0."""
+    columns = math.ceil(math.sqrt(count))
+    rows = math.ceil(count / columns) if count else 0
+    return [((i % columns - (columns - 1) / 2) * spacing, (i // columns - (rows - 1) / 2) * spacing)
+            for i in range(count)]
+
+
+def command_group(simlings, position):
+    """Send simlings to position, each to its own place in a grid formation around it.
+
+    Places are handed out by where the simlings are now, top rows to the
+    topmost simlings and left to right within a row, so their paths
+    don't cross much. A single simling goes to position itself.
+    """
+    offsets = formation_offsets(len(simlings))
+    columns = math.ceil(math.sqrt(len(simlings)))
+    by_height = sorted(simlings, key=lambda simling: (simling.y, simling.x))
+    ordered = []
+    for start in range(0, len(by_height), columns):
+        ordered.extend(sorted(by_height[start:start + columns], key=lambda simling: (simling.x, simling.y)))
+    for simling, (dx, dy) in zip(ordered, offsets):
+        simling.set_player_commanded_target((position[0] + dx, position[1] + dy))
@@ -0,0 +1,135 @@
+import time
+import numpy as np
+from simling import Simling
+
+
+class LODScheduler:
+    """Level-of-detail updates: full rate on screen, less often further away.
+
+    Set it as world.lod and World.step hands the simlings to it. Simlings
+    within margin of the view rectangle, and the ones in focus (e.g. the
+    selected one), are updated every step. The others get a level from
+    their distance to the view, one per band pixels, and level L only runs
+    every 2**L steps. Each level is split into buckets by slot, so its work
+    is spread evenly over those steps.
+
+    A skipped simling isn't lost time: it is advanced by everything since
+    its last update in one go when its bucket runs. Needs decay linearly,
+    so that is exact. Movement is one straight step of speed * elapsed,
+    ending on the target like the per-step model. What does lag is the AI,
+    which notices thresholds and arrivals up to one interval late.
+
+    Due buckets run nearest level first until budget_seconds of update
+    time is spent this step. The rest wait for their next turn, except
+    those max_lag seconds behind, so far away simlings are never starved.
+    Timing makes the updates machine dependent: don't use it for recorded
+    sessions (see replay.py).
+    """
+
+    def __init__(self, world, view=(0, 0, 800, 600), levels=4, band=400, margin=50,
+                 budget_seconds=0.004, max_lag=1.0):
+        self.world = world
+        self.view = view  # x, y, width, height in world coordinates
+        self.focus = []  # Simlings updated every step wherever they are
+        self.levels = levels
+        self.band = band
+        self.margin = margin
+        self.budget_seconds = budget_seconds
+        self.max_lag = max_lag
+        self.frame = 0
+        # Per slot. A slot's level only changes when it moves, which is when
+        # it is updated, or when the view does.
+        self._updated_at = np.zeros(0)  # World time the slot is up to date with
+        self._level = np.zeros(0, dtype=np.int64)
+        self._interval_mask = np.zeros(0, dtype=np.int64)  # 2**level - 1
+        self._known = np.zeros(0, dtype=np.int64)  # Serial of the simling each slot was tracked for
+        self._levels_view = None  # View the levels were computed for
+        self.last_updated = 0
+        self.last_deferred = 0
+
+    def _sync_slots(self):
+        population = self.world.population
+        grow = population.capacity - len(self._known)
+        if grow > 0:
+            self._updated_at = np.concatenate([self._updated_at, np.zeros(grow)])
+            self._level = np.concatenate([self._level, np.zeros(grow, dtype=np.int64)])
+            self._interval_mask = np.concatenate([self._interval_mask, np.zeros(grow, dtype=np.int64)])
+            self._known = np.concatenate([self._known, np.zeros(grow, dtype=np.int64)])
+        # Simlings added since the last step start out up to date
+        serial = population.serial[:population.count]
+        new = np.flatnonzero(serial != self._known[:population.count])
+        if len(new):
+            self._known[new] = serial[new]
+            self._updated_at[new] = self.world.time
+            self._set_levels(new)
+        if self._levels_view != tuple(self.view):
+            self._levels_view = tuple(self.view)
+            self._set_levels(population.indices())
+
+    def _set_levels(self, slots):
+        levels = self.levels_of(slots)
+        self._level[slots] = levels
+        self._interval_mask[slots] = (1 << levels) - 1
+
+    def levels_of(self, indices):
+        """LOD level of each slot by distance to the view: 0 for every step, L for every 2**L steps.
+
+        Focus isn't included, update() runs those every step itself.
+        """
+        population = self.world.population
+        left, top, width, height = self.view
+        x = population.x[indices]
+        y = population.y[indices]
+        dx = np.maximum(np.maximum(left - (x + Simling.size), x - (left + width)), 0.0)
+        dy = np.maximum(np.maximum(top - (y + Simling.size), y - (top + height)), 0.0)
+        outside = np.sqrt(dx * dx + dy * dy) - self.margin
+        levels = np.where(outside <= 0, 0, 1 + np.maximum(outside, 0) // self.band).astype(np.int64)
+        return np.minimum(levels, self.levels - 1, out=levels)
+
+    def update(self, time_delta_seconds):
+        """Advance the world's simlings for one step of time_delta_seconds (the clock is World.step's)."""
+        self._sync_slots()
+        now = self.world.time + time_delta_seconds
+        indices = self.world.population.indices()
+        due = indices[(self.frame - indices) & self._interval_mask[indices] == 0]
+        focus = [simling.index for simling in self.focus if simling is not None]
+        if focus:
+            due = np.union1d(due, focus)
+        levels = self._level[due]
+        if focus:
+            levels[np.isin(due, focus)] = 0
+
+        start = time.perf_counter()
+        updated = 0
+        deferred = 0
+        for level in range(self.levels):
+            slots = due[levels == level]
+            if level and len(slots) and time.perf_counter() - start > self.budget_seconds:
+                starved = now - self._updated_at[slots] >= self.max_lag
+                deferred += len(slots) - np.count_nonzero(starved)
+                slots = slots[starved]
+            if len(slots):
+                self._update(slots, now)
+                updated += len(slots)
+        self.frame += 1
+        self.last_updated = updated
+        self.last_deferred = deferred
+        return updated
+
+    def _update(self, slots, now):
+        self.world.update_slots(now - self._updated_at[slots], slots)
+        self._updated_at[slots] = now
+        self._set_levels(slots)
+
+    def sync(self):
+        """Bring every simling up to the world clock, e.g. before a snapshot."""
+        self._sync_slots()
+        indices = self.world.population.indices()
+        behind = indices[self._updated_at[indices] < self.world.time]
+        if len(behind):
+            self._update(behind, self.world.time)
+
+    def behind(self, simling):
+        """Seconds simling's state lags the world clock."""
+        self._sync_slots()
+        return self.world.time - float(self._updated_at[simling.index])
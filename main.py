@@ -1,7 +1,22 @@
-from simling import Simling
-from objects import FoodSource, Bed
+import logging
+import os
+from world import World
+from render import Renderer
+from profiler import FrameProfiler
+from snapshot import Snapshot, SnapshotWriter
+from controls import handle_click, SELECT_BUTTON, COMMAND_BUTTON
+from picking import SimlingPicker
+from replay import InputRecorder
+from lod import LODScheduler
+from camera import Camera
+from ui import SelectedSimlingPanel, ProfilerOverlay, SelectionBox
+from telemetry import TelemetryServer, start_logging
 import pygame # Ensure pygame is imported if not already fully
 
+# Messages go out as JSON lines on stderr, written by a background thread
+log_listener = start_logging()
+log = logging.getLogger("simling")
+
 # Initialize Pygame
 pygame.init()
 pygame.font.init() # Explicitly initialize font module
@@ -10,6 +25,13 @@ pygame.font.init() # Explicitly initialize font module
 SCREEN_WIDTH = 800
 SCREEN_HEIGHT = 600
 
+# The world is bigger than the screen, the camera shows part of it
+WORLD_WIDTH = 3200
+WORLD_HEIGHT = 2400
+PAN_SPEED = 600  # Screen pixels per second while an arrow key is held
+DRAG_THRESHOLD = 5  # Screen pixels the mouse must move with the left button down to drag out a box
+TELEMETRY_RATE = 5  # Frames a second streamed to dashboards, capturing every frame would cost the loop
+
 # Create the game screen
 screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
 
@@ -22,97 +44,162 @@ clock = pygame.time.Clock()
 # UI Font
 ui_font = pygame.font.Font(None, 28) # System default font, size 28
 
-# Selected Simling Tracker
-selected_simling = None
-
-# Create Simlings
-simlings = [
-    Simling(x=100, y=100),
-    Simling(x=150, y=200),
-]
-
-# Create food sources and beds
-food_sources = [
-    FoodSource(x=50, y=50),
-    FoodSource(x=700, y=500),
-]
-beds = [
-    Bed(x=400, y=50),
-    Bed(x=100, y=500),
-]
-
-# World objects dictionary
-world_objects = {
-    "food_sources": food_sources,
-    "beds": beds,
-}
+# Selected Simlings Tracker, left click picks one, dragging a box picks everyone in it
+selection = []
+drag_start = None  # Screen position the left button went down at
+
+# The world is saved to this file on exit (and with F6) and picked up again on start
+snapshot_path = os.environ.get("SIMLING_SNAPSHOT", "world.snap")
+snapshot_writer = SnapshotWriter()
+
+# The simulation itself, the loop below only feeds it frame times and draws it
+if os.path.exists(snapshot_path):
+    saved = Snapshot.load(snapshot_path)
+    world = saved.restore()
+    saved.close()
+    log.info("Restored %d simlings from %s", len(world.simlings), snapshot_path,
+             extra={"data": {"simlings": len(world.simlings), "path": snapshot_path}})
+else:
+    world = World(size=(WORLD_WIDTH, WORLD_HEIGHT))
+
+    # Create Simlings
+    world.add_simling(x=100, y=100)
+    world.add_simling(x=150, y=200)
+
+    # Create food sources, beds and a television
+    world.add_food_source(x=50, y=50)
+    world.add_food_source(x=700, y=500)
+    world.add_bed(x=400, y=50)
+    world.add_bed(x=100, y=500)
+    world.add_television(x=600, y=250)
+
+simlings = world.simlings
+
+# Spatial hash for clicks, drags and hovering, kept up to date every frame
+picker = SimlingPicker(world.population)
+
+# Frame profiler: F3 toggles it and its overlay, F4 captures 120 frames with cProfile,
+# F5 exports the timings. SIMLING_PROFILE=1 starts with it enabled, SIMLING_CPROFILE=N
+# captures the first N frames and SIMLING_PROFILE_EXPORT=path.csv/.json exports on exit.
+profiler = FrameProfiler.from_env()
+profile_export_path = os.environ.get("SIMLING_PROFILE_EXPORT", "frame_profile.json")
+
+# Arrow keys or dragging with the middle button pan, the mouse wheel zooms
+camera = Camera((SCREEN_WIDTH, SCREEN_HEIGHT), world.size)
+
+# Static background and objects are cached, see render.Renderer
+renderer = Renderer(screen, world, profiler=profiler, camera=camera, picker=picker)
+panel = SelectedSimlingPanel(ui_font)
+selection_box = SelectionBox()
+profiler_overlay = ProfilerOverlay(profiler, pygame.font.Font(None, 20), x=SCREEN_WIDTH - 230)
+
+# SIMLING_RECORD=path records frame times and clicks for replay.py
+recorder = InputRecorder.from_env(world)
+
+# Simlings off screen are updated less often. Not while recording: which ones
+# get updated depends on timing, so a replay couldn't reproduce it.
+lod = None
+if recorder.path is None:
+    lod = world.lod = LODScheduler(world, view=camera.view_rect())
+
+# SIMLING_TELEMETRY=port streams the world and per-frame metrics to dashboards, see telemetry.py
+telemetry = TelemetryServer.from_env(rate=TELEMETRY_RATE)
+if telemetry is not None:
+    log.info("Streaming telemetry on port %d", telemetry.port, extra={"data": {"port": telemetry.port}})
 
 # Main game loop
 running = True
 while running:
     # Time Delta Calculation
     time_delta_seconds = clock.tick(60) / 1000.0  # Aim for 60 FPS, convert ms to s
+    profiler.begin_frame()
 
     # Process events
     for event in pygame.event.get():
         if event.type == pygame.QUIT:
             running = False
-        if event.type == pygame.MOUSEBUTTONDOWN:
-            if event.button == 1:  # Left mouse button
-                selected_simling = None # Deselect by default
-                for simling_obj in simlings: 
-                    simling_rect = pygame.Rect(simling_obj.x, simling_obj.y, simling_obj.size, simling_obj.size)
-                    if simling_rect.collidepoint(event.pos):
-                        selected_simling = simling_obj
-                        print(f"Selected Simling at ({selected_simling.x}, {selected_simling.y})")
-                        break # Stop after selecting one
-            elif event.button == 3:  # Right mouse button
-                if selected_simling is not None:
-                    selected_simling.set_player_commanded_target(event.pos)
-                    print(f"Commanding selected Simling to {event.pos}")
+        if event.type == pygame.KEYDOWN:
+            if event.key == pygame.K_F3:
+                profiler.toggle()
+            elif event.key == pygame.K_F4:
+                profiler.capture(120)
+            elif event.key == pygame.K_F5:
+                profiler.export(profile_export_path, writer=snapshot_writer)  # Written off the frame loop
+            elif event.key == pygame.K_F6:
+                if lod is not None:
+                    lod.sync()
+                snapshot_writer.save(Snapshot.capture(world), snapshot_path)
+                log.info("Saving world to %s", snapshot_path, extra={"data": {"path": snapshot_path}})
+        if event.type == pygame.MOUSEWHEEL:
+            camera.zoom_by(event.y, anchor=pygame.mouse.get_pos())
+        if event.type == pygame.MOUSEMOTION and event.buttons[1]:
+            camera.pan(-event.rel[0], -event.rel[1])
+        if event.type == pygame.MOUSEBUTTONDOWN and event.button == SELECT_BUTTON:
+            drag_start = event.pos
+        if event.type == pygame.MOUSEMOTION and drag_start is not None:
+            if abs(event.pos[0] - drag_start[0]) + abs(event.pos[1] - drag_start[1]) >= DRAG_THRESHOLD:
+                selection_box.start, selection_box.end = drag_start, event.pos
+        # Clicks are handled (and recorded) in world coordinates
+        if event.type == pygame.MOUSEBUTTONUP and event.button == SELECT_BUTTON and drag_start is not None:
+            position = camera.screen_to_world(drag_start)
+            end = camera.screen_to_world(event.pos) if selection_box.start is not None else None
+            recorder.record_click(SELECT_BUTTON, position, end)
+            selection = handle_click(selection, picker, SELECT_BUTTON, position, end)
+            drag_start = selection_box.start = selection_box.end = None
+            if len(selection) == 1:
+                log.info("Selected Simling at (%s, %s)", selection[0].x, selection[0].y,
+                         extra={"data": {"x": selection[0].x, "y": selection[0].y}})
+            elif selection:
+                log.info("Selected %d Simlings", len(selection), extra={"data": {"count": len(selection)}})
+        if event.type == pygame.MOUSEBUTTONDOWN and event.button == COMMAND_BUTTON:
+            position = camera.screen_to_world(event.pos)
+            recorder.record_click(COMMAND_BUTTON, position)
+            selection = handle_click(selection, picker, COMMAND_BUTTON, position)
+            if selection:
+                log.info("Commanding %d selected Simling(s) to %s", len(selection), position,
+                         extra={"data": {"count": len(selection), "target": position}})
+
+    keys = pygame.key.get_pressed()
+    pan = PAN_SPEED * time_delta_seconds
+    camera.pan((keys[pygame.K_RIGHT] - keys[pygame.K_LEFT]) * pan, (keys[pygame.K_DOWN] - keys[pygame.K_UP]) * pan)
+
+    profiler.lap("events")
 
     # Update Phase
-    for simling in simlings:
-        simling.update(time_delta_seconds, world_objects)
+    if lod is not None:
+        lod.view = camera.view_rect()
+        lod.focus = selection
+    world.step(time_delta_seconds)  # All simlings in one batched step
+    recorder.end_frame(time_delta_seconds, world, selection)
+    if telemetry is not None:
+        telemetry.publish(world, time_delta_seconds)  # At most TELEMETRY_RATE times a second, see telemetry.py
+    profiler.lap("update", agents=len(simlings))
 
     # Draw Phase
-    # Fill the screen with white
-    screen.fill((255, 255, 255))
-
-    # Draw objects
-    for food in food_sources:
-        food.draw(screen)
-    for bed in beds:
-        bed.draw(screen)
-
-    # Draw Simlings
-    for simling in simlings:
-        simling.draw(screen) # Original draw
-        if simling == selected_simling:
-            pygame.draw.rect(screen, (255, 0, 0), (simling.x - 2, simling.y - 2, simling.size + 4, simling.size + 4), 2) # Draw red border
-
-    # UI Rendering for Selected Simling
-    if selected_simling is not None:
-        # Define starting Y position for the first line of text
-        ui_start_y = 10
-        ui_line_height = 25 # Pixels between lines of text
-        ui_margin_x = 10
-
-        # Helper function to render and blit text (optional, can be inline)
-        def draw_text(text, x, y, color=(0,0,0)): # Black text by default
-            text_surface = ui_font.render(text, True, color)
-            screen.blit(text_surface, (x, y))
-
-        # Display selected Simling's needs
-        draw_text(f"Selected Simling:", ui_margin_x, ui_start_y)
-        draw_text(f" - Hunger: {selected_simling.hunger:.1f}", ui_margin_x, ui_start_y + ui_line_height)
-        draw_text(f" - Sleep: {selected_simling.sleep:.1f}", ui_margin_x, ui_start_y + 2 * ui_line_height)
-        draw_text(f" - Social: {selected_simling.social:.1f}", ui_margin_x, ui_start_y + 3 * ui_line_height)
-        draw_text(f" - Fun: {selected_simling.fun:.1f}", ui_margin_x, ui_start_y + 4 * ui_line_height)
-        draw_text(f" - Action: {selected_simling.current_action}", ui_margin_x, ui_start_y + 5 * ui_line_height)
-
-    # Update the display
-    pygame.display.flip()
+    # Only the parts of the screen that changed are redrawn and pushed
+    # The panel follows the cursor over a simling, or shows the (first) selected one
+    picker.sync()
+    hovered = picker.at(*camera.screen_to_world(pygame.mouse.get_pos()))
+    if hovered is not None and hovered not in selection:
+        panel.simling, panel.title = hovered, "Hovered Simling:"
+    else:
+        panel.simling = selection[0] if selection else None
+        panel.title = "Selected Simling:" if len(selection) <= 1 else f"Selected Simlings ({len(selection)}):"
+    renderer.draw(selection, overlays=(panel, selection_box, profiler_overlay))
+    profiler.end_frame()
+
+if "SIMLING_PROFILE_EXPORT" in os.environ:
+    profiler.export(profile_export_path)
+profiler.print_last_profile()
+
+if lod is not None:
+    lod.sync()
+snapshot_writer.save(Snapshot.capture(world), snapshot_path)
+snapshot_writer.close()
+recorder.close()
+if telemetry is not None:
+    telemetry.close()
+log_listener.stop()
 
 # Uninitialize Pygame
 pygame.quit()
@@ -0,0 +1,393 @@
+import heapq
+import math
+import numpy as np
+
+from cache import LRUCache
+from population import move_towards_targets
+
+SQRT2 = math.sqrt(2)
+# 8-connected neighbourhood: (d_col, d_row, cost)
+NEIGHBOURS = ((1, 0, 1.0), (-1, 0, 1.0), (0, 1, 1.0), (0, -1, 1.0),
+              (1, 1, SQRT2), (1, -1, SQRT2), (-1, 1, SQRT2), (-1, -1, SQRT2))
+LINE_CHUNK = 32  # Samples per line checked at once by clear_lines
+
+
+class OccupancyGrid:
+    """Which cells of the world a simling can stand in, given the walls.
+
+    Cells are in the same coordinates as simling positions, which are the
+    top-left corner of the sprite: a cell is blocked when a simling of
+    clearance x clearance pixels placed anywhere in it could overlap a wall.
+    """
+
+    def __init__(self, width, height, cell_size=20, clearance=20):
+        self.cell_size = cell_size
+        self.clearance = clearance
+        self.columns = math.ceil(width / cell_size)
+        self.rows = math.ceil(height / cell_size)
+        self.blocked = np.zeros((self.columns, self.rows), dtype=bool)
+
+    def rebuild(self, walls):
+        """Recompute blocked cells from walls. Returns the mask of cells that changed."""
+        blocked = np.zeros_like(self.blocked)
+        size = self.cell_size
+        for wall in walls:
+            width, height = wall.size
+            left = math.floor((wall.x - self.clearance) / size)
+            top = math.floor((wall.y - self.clearance) / size)
+            right = math.ceil((wall.x + width) / size)
+            bottom = math.ceil((wall.y + height) / size)
+            blocked[max(left, 0):max(right, 0), max(top, 0):max(bottom, 0)] = True
+        changed = blocked != self.blocked
+        self.blocked = blocked
+        return changed
+
+    def clear_lines(self, xs, ys, target_xs, target_ys):
+        """Whether the straight lines from (xs, ys) to the targets cross no blocked cell.
+
+        The lines are sampled every quarter cell, which is enough given
+        that blocked cells already keep a clearance around the walls. Each
+        line gets as many samples as its own length needs, taken a chunk at
+        a time, and a line stops being sampled once it hits a blocked cell.
+        """
+        xs = np.asarray(xs, dtype=np.float64)
+        ys = np.asarray(ys, dtype=np.float64)
+        dx = np.asarray(target_xs) - xs
+        dy = np.asarray(target_ys) - ys
+        clear = np.ones(len(xs), dtype=bool)
+        if not len(xs) or not self.blocked.any():
+            return clear
+        intervals = np.maximum(np.ceil(np.sqrt(dx * dx + dy * dy) / (self.cell_size / 4)), 1.0)
+        active = np.arange(len(xs))
+        start = 0
+        while len(active):
+            # Samples start .. start + LINE_CHUNK - 1 of every line still going, the last one at the target
+            t = np.minimum((start + np.arange(LINE_CHUNK)) / intervals[active, None], 1.0)
+            columns, rows, _ = self.cells_of(xs[active, None] + dx[active, None] * t,
+                                             ys[active, None] + dy[active, None] * t)
+            hit = self.blocked[columns, rows].any(axis=1)
+            clear[active[hit]] = False
+            start += LINE_CHUNK
+            active = active[~hit & (intervals[active] >= start)]
+        return clear
+
+    def cells_of(self, xs, ys):
+        """(columns, rows, inside) of positions. Cells of outside positions are clipped."""
+        columns = np.floor(np.asarray(xs) / self.cell_size).astype(np.int64)
+        rows = np.floor(np.asarray(ys) / self.cell_size).astype(np.int64)
+        inside = (columns >= 0) & (columns < self.columns) & (rows >= 0) & (rows < self.rows)
+        return np.clip(columns, 0, self.columns - 1), np.clip(rows, 0, self.rows - 1), inside
+
+
+class DistanceSearch:
+    """Dijkstra from goal over the free cells, that can be run a few cells at a time."""
+
+    def __init__(self, blocked, goal):
+        self.blocked = blocked
+        self.goal = goal
+        self._free = (~blocked).tolist()
+        self._done = np.zeros(blocked.shape, dtype=bool).tolist()
+        distance = np.full(blocked.shape, np.inf)
+        distance[goal] = 0.0
+        self._dist = distance.tolist()
+        self._queue = [(0.0, goal[0], goal[1])]
+        self.settled = 0
+
+    def run(self, cells=math.inf):
+        """Settle up to cells more cells. Returns whether the search is finished."""
+        columns, rows = self.blocked.shape
+        free, done, dist, queue = self._free, self._done, self._dist, self._queue
+        settled = 0
+        while queue and settled < cells:
+            d, col, row = heapq.heappop(queue)
+            if done[col][row]:
+                continue
+            done[col][row] = True
+            settled += 1
+            for d_col, d_row, cost in NEIGHBOURS:
+                c = col + d_col
+                r = row + d_row
+                if not (0 <= c < columns and 0 <= r < rows) or not free[c][r]:
+                    continue
+                if d_col and d_row and not (free[col + d_col][row] and free[col][row + d_row]):
+                    continue  # Don't cut corners
+                nd = d + cost
+                if nd < dist[c][r]:
+                    dist[c][r] = nd
+                    heapq.heappush(queue, (nd, c, r))
+        self.settled += settled
+        return not queue
+
+    def distance(self):
+        return np.array(self._dist)
+
+
+class FlowField:
+    """Distance to one goal cell from every cell, and the next cell to step to.
+
+    Built with Dijkstra over the free cells (diagonal steps may not cut a
+    blocked corner). Blocked cells get a next cell too, pointing at their
+    best free neighbour, so a simling that ended up in one can walk out.
+    Pass the distance of a finished DistanceSearch to skip the search.
+    """
+
+    def __init__(self, blocked, goal, distance=None):
+        self.goal = goal
+        if distance is None:
+            search = DistanceSearch(blocked, goal)
+            search.run()
+            distance = search.distance()
+        self.distance = distance
+        self.next_column, self.next_row = self._next_cells(blocked)
+
+    def _next_cells(self, blocked):
+        columns, rows = blocked.shape
+        padded = np.full((columns + 2, rows + 2), np.inf)
+        padded[1:-1, 1:-1] = self.distance
+        free = np.zeros((columns + 2, rows + 2), dtype=bool)
+        free[1:-1, 1:-1] = ~blocked
+        best = np.full((columns, rows), np.inf)
+        base_column, base_row = np.indices((columns, rows))
+        next_column = base_column.copy()
+        next_row = base_row.copy()
+        for d_col, d_row, cost in NEIGHBOURS:
+            candidate = padded[1 + d_col:columns + 1 + d_col, 1 + d_row:rows + 1 + d_row] + cost
+            if d_col and d_row:
+                corner_free = (free[1 + d_col:columns + 1 + d_col, 1:-1] &
+                               free[1:-1, 1 + d_row:rows + 1 + d_row])
+                candidate = np.where(corner_free | blocked, candidate, np.inf)
+            better = candidate < best
+            best[better] = candidate[better]
+            next_column[better] = base_column[better] + d_col
+            next_row[better] = base_row[better] + d_row
+        return next_column, next_row
+
+    def affected_by(self, newly_blocked, newly_freed):
+        """Whether a change of the occupancy grid can change this field."""
+        reached = np.isfinite(self.distance)
+        if (newly_blocked & reached).any():
+            return True
+        if not newly_freed.any():
+            return False
+        # A freed cell matters if it touches a cell the field already reaches
+        near = reached.copy()
+        near[1:, :] |= reached[:-1, :]
+        near[:-1, :] |= reached[1:, :]
+        across = near.copy()
+        near[:, 1:] |= across[:, :-1]
+        near[:, :-1] |= across[:, 1:]
+        return bool((newly_freed & near).any())
+
+
+class Navigation:
+    """Steers simlings around walls with flow fields shared per goal cell.
+
+    All simlings heading for the same cell (the same FoodSource or Bed, or
+    player commands to nearby spots) share one FlowField, kept in an LRU
+    cache keyed by goal cell, so popular destinations are only computed
+    once. When walls change, only the cached fields the change can affect
+    are dropped.
+
+    Each step a simling with a clear line to its target walks straight at
+    it. Otherwise it heads for the centre of the next cell on its field,
+    and straight for its target once the target's cell is next. Simlings
+    outside the grid, or whose target can't be reached, keep moving in a
+    straight line.
+
+    move() remembers every slot's line check, and only checks again once
+    the simling's target or cell changed (or the walls did): walking
+    straight along a clear line keeps it clear. New fields are searched
+    for at most cells_per_step cells per step, the goals most simlings
+    are waiting on first, so a search too big for one step carries on in
+    the next ones instead of stalling the frame. The simlings whose field
+    isn't there yet stay put until it is.
+    """
+
+    def __init__(self, walls, width, height, cell_size=20, clearance=20, max_fields=64, cells_per_step=4096):
+        self.walls = walls
+        self.grid = OccupancyGrid(width, height, cell_size, clearance)
+        self.fields = LRUCache(max_fields)
+        self.cells_per_step = cells_per_step
+        self._searches = {}  # Goal -> DistanceSearch of a field still being built
+        self._walls_version = None
+        self.fields_built = 0
+        self.fields_invalidated = 0
+        self.fields_deferred = 0  # Times a goal's simlings waited a step for its field
+        self.lines_checked = 0
+        # Last line check per slot: for which simling (serial, 0 for none), from which cell, to where
+        self._line_serial = np.zeros(0, dtype=np.int64)
+        self._line_cell = np.zeros(0, dtype=np.int64)
+        self._line_target_x = np.zeros(0)
+        self._line_target_y = np.zeros(0)
+        self._line_clear = np.zeros(0, dtype=bool)
+
+    def sync(self):
+        """Pick up wall changes, dropping the cached fields they affect."""
+        version = getattr(self.walls, "version", None)
+        if version is not None and version == self._walls_version:
+            return
+        self._walls_version = version
+        before = self.grid.blocked
+        changed = self.grid.rebuild(self.walls)
+        if not changed.any():
+            return
+        self._line_serial[:] = 0  # Every line needs checking again
+        self._searches.clear()
+        newly_blocked = changed & self.grid.blocked
+        newly_freed = changed & before
+        for goal, field in self.fields.items():
+            if field.affected_by(newly_blocked, newly_freed):
+                self.fields.pop(goal)
+                self.fields_invalidated += 1
+
+    def field(self, goal):
+        field = self.fields.get(goal)
+        if field is None:
+            field = FlowField(self.grid.blocked, goal)
+            self.fields.put(goal, field)
+            self.fields_built += 1
+        return field
+
+    def waypoints(self, xs, ys, target_xs, target_ys, slots=None, serials=None):
+        """Where simlings at (xs, ys) going to (target_xs, target_ys) should head next.
+
+        With their slots and serials, line checks are reused from the last
+        call for the simlings whose target and cell are the same.
+        """
+        self.sync()
+        waypoint_x = np.array(target_xs, dtype=np.float64)
+        waypoint_y = np.array(target_ys, dtype=np.float64)
+        columns, rows, inside = self.grid.cells_of(xs, ys)
+        goal_columns, goal_rows, goal_inside = self.grid.cells_of(target_xs, target_ys)
+        steer = inside & goal_inside & ((columns != goal_columns) | (rows != goal_rows))
+        if not steer.any():
+            return waypoint_x, waypoint_y
+        steered = np.flatnonzero(steer)
+        # Nothing in the way: straight at the target, no field needed
+        xs = np.asarray(xs, dtype=np.float64)
+        ys = np.asarray(ys, dtype=np.float64)
+        if slots is None:
+            clear = self.grid.clear_lines(xs[steered], ys[steered], waypoint_x[steered], waypoint_y[steered])
+            self.lines_checked += len(steered)
+        else:
+            clear = self._cached_clear_lines(
+                xs[steered], ys[steered], waypoint_x[steered], waypoint_y[steered],
+                columns[steered] * self.grid.rows + rows[steered],
+                np.asarray(slots)[steered], np.asarray(serials)[steered])
+        steered = steered[~clear]
+        if not len(steered):
+            return waypoint_x, waypoint_y
+        keys = goal_columns[steered] * self.grid.rows + goal_rows[steered]
+        unique_keys, group, counts = np.unique(keys, return_inverse=True, return_counts=True)
+        goals = [divmod(key, self.grid.rows) for key in unique_keys.tolist()]
+        self._build_fields([goals[i] for i in np.argsort(-counts, kind="stable").tolist()])
+        size = self.grid.cell_size
+        for i, goal in enumerate(goals):
+            members = steered[group == i]
+            field = self.fields.get(goal) if goal in self.fields else None
+            if field is None:
+                waypoint_x[members] = xs[members]  # Wait where they are for the field
+                waypoint_y[members] = ys[members]
+                self.fields_deferred += 1
+                continue
+            column = columns[members]
+            row = rows[members]
+            next_column = field.next_column[column, row]
+            next_row = field.next_row[column, row]
+            # Reachable and not about to enter the goal cell: follow the field
+            follow = (np.isfinite(field.distance[next_column, next_row]) &
+                      ((next_column != column) | (next_row != row)) &
+                      (field.distance[next_column, next_row] > 0))
+            members = members[follow]
+            waypoint_x[members] = (next_column[follow] + 0.5) * size
+            waypoint_y[members] = (next_row[follow] + 0.5) * size
+        return waypoint_x, waypoint_y
+
+    def _build_fields(self, goals):
+        # Go on with the searches of the goals without a field, in order, within cells_per_step
+        budget = self.cells_per_step
+        for goal in goals:
+            if goal in self.fields:
+                continue
+            if budget <= 0:
+                break
+            search = self._searches.get(goal)
+            if search is None:
+                search = self._searches[goal] = DistanceSearch(self.grid.blocked, goal)
+            settled = search.settled
+            if search.run(budget):
+                del self._searches[goal]
+                self.fields.put(goal, FlowField(self.grid.blocked, goal, search.distance()))
+                self.fields_built += 1
+            budget -= search.settled - settled
+        while len(self._searches) > (self.fields.max_entries or math.inf):  # Searches nobody came back for
+            del self._searches[next(iter(self._searches))]
+
+    def _cached_clear_lines(self, xs, ys, target_xs, target_ys, cells, slots, serials):
+        # clear_lines, only run for the slots whose simling, cell or target changed since their last check
+        if len(slots) and slots.max() >= len(self._line_serial):
+            grow = slots.max() + 1 - len(self._line_serial)
+            self._line_serial = np.concatenate([self._line_serial, np.zeros(grow, dtype=np.int64)])
+            self._line_cell = np.concatenate([self._line_cell, np.zeros(grow, dtype=np.int64)])
+            self._line_target_x = np.concatenate([self._line_target_x, np.zeros(grow)])
+            self._line_target_y = np.concatenate([self._line_target_y, np.zeros(grow)])
+            self._line_clear = np.concatenate([self._line_clear, np.zeros(grow, dtype=bool)])
+        stale = ((self._line_serial[slots] != serials) | (self._line_cell[slots] != cells) |
+                 (self._line_target_x[slots] != target_xs) | (self._line_target_y[slots] != target_ys))
+        if stale.any():
+            changed = slots[stale]
+            self._line_clear[changed] = self.grid.clear_lines(xs[stale], ys[stale], target_xs[stale],
+                                                              target_ys[stale])
+            self._line_serial[changed] = serials[stale]
+            self._line_cell[changed] = cells[stale]
+            self._line_target_x[changed] = target_xs[stale]
+            self._line_target_y[changed] = target_ys[stale]
+            self.lines_checked += int(stale.sum())
+        return self._line_clear[slots]
+
+    def move(self, population, indices, time_delta_seconds):
+        """Navigating version of population.move_towards_targets."""
+        target_x = population.target_x[indices]
+        target_y = population.target_y[indices]
+        has_target = ~(np.isnan(target_x) | np.isnan(target_y))
+        moving = indices[has_target]
+        waypoint_x, waypoint_y = self.waypoints(population.x[moving], population.y[moving],
+                                                target_x[has_target], target_y[has_target],
+                                                slots=moving, serials=population.serial[moving])
+        detour = (waypoint_x != target_x[has_target]) | (waypoint_y != target_y[has_target])
+        detouring = np.zeros(len(indices), dtype=bool)
+        detouring[np.flatnonzero(has_target)[detour]] = True
+        if np.ndim(time_delta_seconds):
+            dt_detour = time_delta_seconds[detouring]
+            dt_rest = time_delta_seconds[~detouring]
+        else:
+            dt_detour = dt_rest = time_delta_seconds
+        move_towards_waypoints(population, indices[detouring], waypoint_x[detour], waypoint_y[detour], dt_detour)
+        move_towards_targets(population, indices[~detouring], dt_rest)
+
+    def stats(self):
+        stats = self.fields.stats()
+        stats["built"] = self.fields_built
+        stats["invalidated"] = self.fields_invalidated
+        stats["deferred"] = self.fields_deferred
+        stats["lines_checked"] = self.lines_checked
+        return stats
+
+
+def move_towards_waypoints(population, indices, waypoint_x, waypoint_y, time_delta_seconds):
+    """Move slots speed * dt towards intermediate waypoints, stopping on them.
+
+    Targets are left alone: reaching a waypoint is not arriving.
+    """
+    if not len(indices):
+        return
+    x = population.x[indices]
+    y = population.y[indices]
+    dx = waypoint_x - x
+    dy = waypoint_y - y
+    distance = np.sqrt(dx * dx + dy * dy)
+    move_amount = population.speed[indices] * time_delta_seconds
+    reach = distance <= move_amount
+    scale = np.where(reach, 1.0, move_amount / np.where(distance > 0, distance, 1.0))
+    population.x[indices] = x + dx * scale
+    population.y[indices] = y + dy * scale
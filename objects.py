@@ -1,21 +1,25 @@
 import pygame
-import os
+import assets
 
 class FoodSource:
+    # Only the position is per instance (no __dict__), everything else is
+    # shared by all food sources, surfaces included
+    __slots__ = ("x", "y", "reservations")
+    original_image = assets.Sprite("food_source.png", original=True)
+    image = assets.Sprite("food_source.png")
+    size = 30
+    color = (0, 255, 0)  # Green
+    capacity = 2  # Simlings eating at once
+    use_duration = 2.0  # Seconds a use keeps its spot taken, see resources.Reservations
+
     def __init__(self, x, y):
         self.x = x
         self.y = y
-        self.size = 30
-        self.color = (0, 255, 0)  # Green
-
-        image_path = os.path.join("assets", "images", "food_source.png")
-        try:
-            self.original_image = pygame.image.load(image_path).convert_alpha()
-            self.image = pygame.transform.scale(self.original_image, (self.size, self.size))
-        except pygame.error as e:
-            print(f"Error loading food_source image: {e}")
-            self.image = pygame.Surface((self.size, self.size))
-            self.image.fill(self.color)
+        self.reservations = None  # The Reservations serving it, if any
+
+    @property
+    def center(self):
+        return (self.x + self.size / 2, self.y + self.size / 2)
 
     def draw(self, surface):
         surface.blit(self.image, (self.x, self.y))
@@ -26,20 +30,22 @@ class FoodSource:
             simling.hunger = 0.0
 
 class Bed:
+    __slots__ = ("x", "y", "reservations")
+    original_image = assets.Sprite("bed.png", original=True)
+    image = assets.Sprite("bed.png")
+    size = (60, 30)  # Width, Height
+    color = (139, 69, 19)  # Brown
+    capacity = 1
+    use_duration = 5.0
+
     def __init__(self, x, y):
         self.x = x
         self.y = y
-        self.size = (60, 30)  # Width, Height
-        self.color = (139, 69, 19)  # Brown
-
-        image_path = os.path.join("assets", "images", "bed.png")
-        try:
-            self.original_image = pygame.image.load(image_path).convert_alpha()
-            self.image = pygame.transform.scale(self.original_image, self.size)
-        except pygame.error as e:
-            print(f"Error loading bed image: {e}")
-            self.image = pygame.Surface(self.size)
-            self.image.fill(self.color)
+        self.reservations = None
+
+    @property
+    def center(self):
+        return (self.x + self.size[0] / 2, self.y + self.size[1] / 2)
 
     def draw(self, surface):
         surface.blit(self.image, (self.x, self.y))
@@ -48,3 +54,51 @@ class Bed:
         simling.sleep -= 70
         if simling.sleep < 0:
             simling.sleep = 0.0
+
+class Television:
+    __slots__ = ("x", "y", "reservations")
+    original_image = assets.Sprite("television.png", original=True)
+    image = assets.Sprite("television.png")
+    size = (40, 30)
+    color = (128, 0, 160)  # Purple
+    capacity = 3  # Simlings watching at once
+    use_duration = 4.0
+
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+        self.reservations = None
+
+    @property
+    def center(self):
+        return (self.x + self.size[0] / 2, self.y + self.size[1] / 2)
+
+    def draw(self, surface):
+        surface.blit(self.image, (self.x, self.y))
+
+    def use(self, simling):
+        simling.fun -= 60
+        if simling.fun < 0:
+            simling.fun = 0.0
+
+class Wall:
+    """Impassable rectangle. Simlings path around walls, see navigation.py."""
+
+    __slots__ = ("x", "y", "size")
+    color = (110, 110, 110)  # Grey
+
+    def __init__(self, x, y, width, height):
+        self.x = x
+        self.y = y
+        self.size = (width, height)
+
+    @property
+    def center(self):
+        return (self.x + self.size[0] / 2, self.y + self.size[1] / 2)
+
+    @property
+    def rect(self):
+        return pygame.Rect(self.x, self.y, *self.size)
+
+    def draw(self, surface):
+        pygame.draw.rect(surface, self.color, self.rect)
@@ -0,0 +1,243 @@
+import multiprocessing
+import os
+from multiprocessing import shared_memory
+from types import SimpleNamespace
+import numpy as np
+
+from population import Population, COLUMNS, IDLE, decay_needs, move_towards_targets
+from simling import Simling
+from spatial import ObjectGrid
+from world import World
+
+# Shared populations carry one extra column: which region steps each slot
+SHARED_COLUMNS = COLUMNS + (("region", np.int16),)
+
+
+def column_layout(capacity):
+    """Byte offset of every column in a shared block, and the block size."""
+    layout = []
+    offset = 0
+    for name, dtype in SHARED_COLUMNS:
+        layout.append((name, dtype, offset))
+        nbytes = np.dtype(dtype).itemsize * capacity
+        offset += (nbytes + 7) // 8 * 8  # Keep every column 8-byte aligned
+    return layout, offset
+
+
+def map_columns(buffer, capacity):
+    layout, _ = column_layout(capacity)
+    return {name: np.ndarray(capacity, dtype=dtype, buffer=buffer, offset=offset)
+            for name, dtype, offset in layout}
+
+
+class SharedPopulation(Population):
+    """Population whose columns live in one shared memory block.
+
+    Worker processes attach to the block by name, so simling state is never
+    pickled. Growing the population moves it to a new, bigger block.
+    """
+
+    def __init__(self, capacity=1024):
+        self.block = None
+        self._retired = []
+        super().__init__(capacity)
+
+    def _allocate_columns(self, capacity):
+        _, nbytes = column_layout(capacity)
+        block = shared_memory.SharedMemory(create=True, size=max(nbytes, 1))
+        if self.block is not None:
+            # The old mapping stays readable for the copy in _grow, but no
+            # worker can attach to it any more.
+            self.block.unlink()
+            self._retired.append(self.block)
+        self.block = block
+        columns = map_columns(block.buf, capacity)
+        columns["region"][:] = -1
+        return columns
+
+    def close(self):
+        """Release the shared memory. The population can't be used afterwards."""
+        for name, _ in SHARED_COLUMNS:
+            setattr(self, name, None)
+        if self.block is not None:
+            self.block.unlink()
+            self._retired.append(self.block)
+            self.block = None
+        for block in self._retired:
+            try:
+                block.close()
+            except BufferError:
+                pass  # Someone still holds an array view, the mapping goes with it
+        self._retired = []
+
+
+# Worker side: blocks this process has attached to, by name
+_attached = {}
+
+
+def _attach(name):
+    block = _attached.get(name)
+    if block is None:
+        for old in _attached.values():
+            old.close()
+        _attached.clear()
+        # Pool workers share the parent's resource tracker, so the parent's
+        # unlink() also covers the registration made by attaching here.
+        block = shared_memory.SharedMemory(name=name)
+        _attached[name] = block
+    return block
+
+
+class _Landmark:
+    # Stand-in for a world object in a worker: the AI only needs its center
+    __slots__ = ("center",)
+    size = 0
+
+    def __init__(self, center):
+        self.center = center
+
+
+class _Owners:
+    # Behavior.score only reads the simling size from population.owners
+    def __getitem__(self, index):
+        return Simling
+
+
+# Worker side: the (key, ai, world_objects) of the last decide plan seen
+_plan = None
+
+
+def _unpack_plan(plan):
+    # Rebuild the objects the AI scores against only when they changed
+    global _plan
+    key, ai, centers = plan
+    if _plan is None or _plan[0] != key:
+        world_objects = {name: ObjectGrid(_Landmark(center) for center in points.tolist())
+                         for name, points in centers.items()}
+        _plan = (key, ai, world_objects)
+    return _plan[1], _plan[2]
+
+
+def step_region(block_name, capacity, count, region, time_delta_seconds, rates, plan):
+    """Needs decay, movement and AI decisions for the slots of one region. Runs in a worker.
+
+    Returns the idle slots that want to think with what the AI chose for
+    them, and the busy slots that want to think, for the parent to act on.
+    """
+    block = _attach(block_name)
+    columns = SimpleNamespace(owners=_Owners(), **map_columns(block.buf, capacity))
+    indices = np.flatnonzero(columns.region[:count] == region)
+    decay_needs(columns, indices, time_delta_seconds, rates)
+    move_towards_targets(columns, indices, time_delta_seconds)
+    ai, world_objects = _unpack_plan(plan)
+    thinking = indices[Simling._wants_to_think(columns, indices, world_objects, ai)]
+    idle = columns.action[thinking] == IDLE
+    deciding = thinking[idle]
+    choice = ai.decide(columns, deciding, world_objects) if len(deciding) else np.zeros(0, dtype=np.int64)
+    return deciding, choice, thinking[~idle]
+
+
+class ParallelWorld(World):
+    """World whose simlings are stepped by a pool of worker processes.
+
+    The world is cut into fixed vertical strips, by default twice as many
+    as there are workers so a crowded strip doesn't hold up the rest, and
+    every step each live simling is stepped by the strip its x is in. A
+    simling that crossed a border is simply stepped by the neighbouring
+    region next time. Workers do the per-agent needs decay and movement in
+    place in shared memory, and score what the idle simlings of their strip
+    should do. Acting on those choices, where simlings compete for the same
+    FoodSource or Bed, then runs in this process in slot order, so results
+    are deterministic and identical to a single-process World with the
+    same seed. Workers move simlings in
+    straight lines and step every simling every time, so walls, level of
+    detail and conversations are not supported: asking for them raises
+    ValueError instead of being silently ignored.
+
+    Call close() (or use it as a context manager) to stop the workers and
+    free the shared memory.
+    """
+
+    def __init__(self, fixed_dt=1 / 60, seed=None, workers=None, regions=None, social=False, **options):
+        if social:
+            raise ValueError("ParallelWorld needs social=False: workers don't start conversations")
+        self._lod = None
+        super().__init__(fixed_dt, seed=seed, population=SharedPopulation(), social=False, **options)
+        self.workers = workers or os.cpu_count() or 1
+        self.regions = regions or 2 * self.workers
+        self._pool = None
+        self._plan = None  # (key, plan) last sent to the workers, see _decide_plan()
+
+    @property
+    def lod(self):
+        return self._lod
+
+    @lod.setter
+    def lod(self, lod):
+        if lod is not None:
+            raise ValueError("ParallelWorld steps every simling every time, it has no level of detail")
+        self._lod = lod
+
+    def add_wall(self, x, y, width, height):
+        raise ValueError("ParallelWorld moves simlings in straight lines, it has no walls")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _get_pool(self):
+        if self._pool is None:
+            # Spawned rather than forked: forking a process that has SDL (or
+            # any other threads) running can deadlock the children.
+            self._pool = multiprocessing.get_context("spawn").Pool(self.workers)
+        return self._pool
+
+    def assign_regions(self, indices):
+        """Put each of indices in the strip of the world its x is in. Off-world simlings go to the edge strips."""
+        population = self.population
+        population.region[:population.count] = -1
+        strips = np.floor(population.x[indices] * (self.regions / self.size[0]))
+        population.region[indices] = np.clip(strips, 0, self.regions - 1)
+
+    def _decide_plan(self):
+        # What workers need to decide like Simling.think_many would here:
+        # the AI, and the centers of the objects its behaviors go for
+        ai = self.world_objects.get("ai", Simling.ai)
+        names = sorted({behavior.objects for behavior in ai.behaviors
+                        if behavior.objects and self.world_objects.get(behavior.objects)})
+        key = (id(ai),) + tuple((name, id(self.world_objects[name]), self.world_objects[name].version)
+                                for name in names)
+        if self._plan is None or self._plan[0] != key:
+            centers = {name: np.array([obj.center for obj in self.world_objects[name]],
+                                      dtype=np.float64).reshape(-1, 2)
+                       for name in names}
+            self._plan = (key, (key, ai, centers))
+        return self._plan[1]
+
+    def step(self, time_delta_seconds=None):
+        if time_delta_seconds is None:
+            time_delta_seconds = self.fixed_dt
+        self.serve_queues()
+        population = self.population
+        indices = population.indices()
+        if len(indices):
+            self.assign_regions(indices)
+            plan = self._decide_plan()
+            tasks = [(population.block.name, population.capacity, population.count,
+                      region, time_delta_seconds, Simling.rates(), plan)
+                     for region in range(self.regions)]
+            results = self._get_pool().starmap(step_region, tasks, chunksize=1)
+            deciding, choice, busy = (np.concatenate(parts) for parts in zip(*results))
+            order = np.argsort(deciding, kind="stable")
+            Simling.act_on_choices(self.world_objects, population, deciding[order], choice[order], np.sort(busy))
+        self.time += time_delta_seconds
+        self.tick += 1
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+        self.population.close()
@@ -0,0 +1,114 @@
+import itertools
+import math
+import numpy as np
+from simling import Simling
+
+
+class SimlingPicker:
+    """Spatial hash over the simlings of a population, for mouse picking and neighbor queries.
+
+    Simlings are bucketed by the cell_size cell their top left corner is
+    in. sync() re-buckets only the ones that crossed into another cell
+    (and picks up added and removed ones) since the last call, so keeping
+    it current costs a vectorized pass plus work for the few that moved
+    cells. Point, hover and rectangle queries then only look at the cells
+    around the query.
+
+    Positions are world coordinates. Where sprites overlap, the simling in
+    the lowest slot wins, which is the world.simlings order unless slots
+    were reused.
+    """
+
+    def __init__(self, population, cell_size=64, sprite_size=Simling.size):
+        self.population = population
+        self.cell_size = cell_size
+        self.sprite_size = sprite_size  # Largest simling size, how far back from a point to look
+        self._cells = {}  # (col, row) -> set of slots
+        self._col = np.zeros(0, dtype=np.int64)
+        self._row = np.zeros(0, dtype=np.int64)
+        self._serial = np.zeros(0, dtype=np.int64)  # Serial bucketed per slot, 0 for none
+        self.rebucketed = 0  # Slots moved between buckets by the last sync()
+
+    def _sync_capacity(self):
+        grow = self.population.capacity - len(self._serial)
+        if grow > 0:
+            self._col = np.concatenate([self._col, np.zeros(grow, dtype=np.int64)])
+            self._row = np.concatenate([self._row, np.zeros(grow, dtype=np.int64)])
+            self._serial = np.concatenate([self._serial, np.zeros(grow, dtype=np.int64)])
+
+    def sync(self):
+        """Catch the hash up with simlings that moved, appeared or were removed."""
+        self._sync_capacity()
+        population = self.population
+        count = population.count
+        alive = population.alive[:count]
+        serial = np.where(alive, population.serial[:count], 0)
+        col = np.floor(population.x[:count] / self.cell_size).astype(np.int64)
+        row = np.floor(population.y[:count] / self.cell_size).astype(np.int64)
+        known = self._serial[:count]
+        stale = (known != serial) | (alive & ((col != self._col[:count]) | (row != self._row[:count])))
+        changed = np.flatnonzero(stale)
+        for slot in changed[known[changed] != 0].tolist():
+            cell = (int(self._col[slot]), int(self._row[slot]))
+            bucket = self._cells[cell]
+            bucket.discard(slot)
+            if not bucket:
+                del self._cells[cell]
+        for slot in changed[alive[changed]].tolist():
+            self._cells.setdefault((int(col[slot]), int(row[slot])), set()).add(slot)
+        self._col[:count] = col
+        self._row[:count] = row
+        self._serial[:count] = serial
+        self.rebucketed = len(changed)
+
+    def _slots_in_cells(self, left, top, right, bottom):
+        # Slots whose corner cell overlaps [left, right] x [top, bottom], in
+        # no particular order: callers filter first and sort what is left
+        cell_size = self.cell_size
+        min_col, max_col = math.floor(left / cell_size), math.floor(right / cell_size)
+        min_row, max_row = math.floor(top / cell_size), math.floor(bottom / cell_size)
+        cells = self._cells
+        if (max_col - min_col + 1) * (max_row - min_row + 1) > len(cells):
+            buckets = [bucket for (col, row), bucket in cells.items()
+                       if min_col <= col <= max_col and min_row <= row <= max_row]
+        else:
+            buckets = [cells[(col, row)] for col in range(min_col, max_col + 1)
+                       for row in range(min_row, max_row + 1) if (col, row) in cells]
+        return np.fromiter(itertools.chain.from_iterable(buckets), dtype=np.int64)
+
+    def at(self, x, y):
+        """Simling whose sprite contains the point x, y, or None. Also what the cursor hovers."""
+        slots = np.sort(self._slots_in_cells(x - self.sprite_size, y - self.sprite_size, x, y))
+        owners = self.population.owners
+        for slot in slots.tolist():
+            simling = owners[slot]
+            if simling.x <= x < simling.x + simling.size and simling.y <= y < simling.y + simling.size:
+                return simling
+        return None
+
+    def in_rect(self, left, top, width, height):
+        """Simlings whose sprite overlaps the rectangle (e.g. a drag selection box), in slot order."""
+        slots = self._slots_in_cells(left - self.sprite_size, top - self.sprite_size, left + width, top + height)
+        population = self.population
+        x = population.x[slots]
+        y = population.y[slots]
+        sizes = np.array([population.owners[slot].size for slot in slots.tolist()], dtype=np.float64)
+        inside = (x < left + width) & (x + sizes > left) & (y < top + height) & (y + sizes > top)
+        return [population.owners[slot] for slot in np.sort(slots[inside]).tolist()]
+
+    def corners_in(self, left, top, right, bottom):
+        """Slots of the simlings whose top left corner is strictly inside left..right x top..bottom, in slot order."""
+        slots = self._slots_in_cells(left, top, right, bottom)
+        x = self.population.x[slots]
+        y = self.population.y[slots]
+        return np.sort(slots[(x > left) & (x < right) & (y > top) & (y < bottom)])
+
+    def within(self, x, y, radius):
+        """Slots of the simlings whose top left corner is within radius of x, y, in slot order.
+
+        With cell_size at least radius that is the 3 x 3 cells around the point.
+        """
+        slots = self._slots_in_cells(x - radius, y - radius, x + radius, y + radius)
+        dx = self.population.x[slots] - x
+        dy = self.population.y[slots] - y
+        return np.sort(slots[dx * dx + dy * dy <= radius * radius])
@@ -0,0 +1,175 @@
+from enum import IntEnum
+import numpy as np
+
+
+class Action(IntEnum):
+    """Action states, stored in the int8 action column."""
+    IDLE = 0
+    SEEKING_FOOD = 1
+    SEEKING_SLEEP = 2
+    PLAYER_COMMANDED = 3
+    WAITING = 4  # Queued at a busy food source, bed or television, see resources.py
+    SEEKING_FUN = 5
+    SEEKING_SOCIAL = 6  # Walking to meet a conversation partner, see social.py
+    TALKING = 7
+
+
+# Simling.current_action is the lower case name, index into this tuple
+ACTIONS = tuple(action.name.lower() for action in Action)
+ACTION_CODES = {name: code for code, name in enumerate(ACTIONS)}
+# Plain ints for the hot paths: numpy looks up a lot of attributes on an
+# enum member before treating it as a number
+IDLE = Action.IDLE.value
+WAITING = Action.WAITING.value
+TALKING = Action.TALKING.value
+SEEKING_SOCIAL = Action.SEEKING_SOCIAL.value
+NO_PARTNER = -1
+
+NEEDS = ("hunger", "sleep", "social", "fun")
+NEED_MIN = 0.0
+NEED_MAX = 100.0
+
+# Structure-of-arrays layout, one entry per simling slot.
+# Missing targets are stored as NaN (target_x/target_y of None).
+COLUMNS = (
+    ("x", np.float64),
+    ("y", np.float64),
+    ("target_x", np.float64),
+    ("target_y", np.float64),
+    ("speed", np.float64),
+    ("hunger", np.float64),
+    ("sleep", np.float64),
+    ("social", np.float64),
+    ("fun", np.float64),
+    ("action", np.int8),
+    ("partner", np.int64),  # Slot of the conversation partner, NO_PARTNER for none
+    ("talk_until", np.float64),  # World time the current conversation ends
+    ("alive", np.bool_),
+    ("serial", np.int64),  # Unique per allocation, tells a reused slot from its old owner
+)
+
+
+class Population:
+    """Column storage for a group of simlings.
+
+    Every Simling owns one slot; its attributes are views into the arrays
+    kept here so the whole group can be advanced in one batched step.
+    Slots of released simlings are reused by later allocations.
+    """
+
+    def __init__(self, capacity=64):
+        self.capacity = 0
+        self.count = 0  # High-water mark, slots >= count have never been used
+        self.owners = []  # Slot -> Simling (or None for free slots)
+        self.target_objects = []  # Slot -> autonomous target object
+        self._free = []
+        self._next_serial = 1
+        self._grow(max(1, capacity))
+
+    def __len__(self):
+        return self.count - len(self._free)
+
+    def _allocate_columns(self, capacity):
+        return {name: np.zeros(capacity, dtype=dtype) for name, dtype in COLUMNS}
+
+    def _grow(self, capacity):
+        for name, column in self._allocate_columns(capacity).items():
+            if self.capacity:
+                column[:self.capacity] = getattr(self, name)
+            setattr(self, name, column)
+        self.owners.extend([None] * (capacity - self.capacity))
+        self.target_objects.extend([None] * (capacity - self.capacity))
+        self.capacity = capacity
+
+    def allocate(self, owner):
+        if self._free:
+            index = self._free.pop()
+        else:
+            if self.count == self.capacity:
+                self._grow(self.capacity * 2)
+            index = self.count
+            self.count += 1
+        for name, dtype in COLUMNS:
+            getattr(self, name)[index] = 0
+        self.target_x[index] = np.nan
+        self.target_y[index] = np.nan
+        self.action[index] = IDLE
+        self.partner[index] = NO_PARTNER
+        self.alive[index] = True
+        self.serial[index] = self._next_serial
+        self._next_serial += 1
+        self.owners[index] = owner
+        self.target_objects[index] = None
+        return index
+
+    def release(self, index):
+        self.alive[index] = False
+        self.owners[index] = None
+        self.target_objects[index] = None
+        self._free.append(index)
+
+    def indices(self):
+        """Slots of all live simlings, in allocation order."""
+        return np.flatnonzero(self.alive[:self.count])
+
+
+def decay_needs(population, indices, time_delta_seconds, rates):
+    """Apply linear need decay (rates in NEEDS order) and clamp to [0, 100]."""
+    for name, rate in zip(NEEDS, rates):
+        column = getattr(population, name)
+        values = column[indices] + rate * time_delta_seconds
+        np.maximum(values, NEED_MIN, out=values)  # Same as clip, minus its wrapper overhead
+        np.minimum(values, NEED_MAX, out=values)
+        column[indices] = values
+
+
+def move_towards_targets(population, indices, time_delta_seconds):
+    """Vectorized Simling.move_towards_target.
+
+    Moves every slot in indices that has a target speed * dt along the
+    straight line to it, snapping onto the target (and clearing it) when
+    the simling starts within 1 unit, ends within 1 unit, or overshoots.
+    """
+    target_x = population.target_x[indices]
+    target_y = population.target_y[indices]
+    has_target = ~(np.isnan(target_x) | np.isnan(target_y))
+    if not has_target.any():
+        return
+    indices = indices[has_target]
+    target_x = target_x[has_target]
+    target_y = target_y[has_target]
+    if np.ndim(time_delta_seconds):
+        time_delta_seconds = time_delta_seconds[has_target]
+
+    x = population.x[indices]
+    y = population.y[indices]
+    dx = target_x - x
+    dy = target_y - y
+    distance = np.sqrt(dx * dx + dy * dy)
+
+    arrived = distance < 1.0  # Close enough, snap to target
+    moving = ~arrived
+    if moving.any():
+        dist = distance[moving]
+        mdx = dx[moving]
+        mdy = dy[moving]
+        move_amount = population.speed[indices[moving]] * (
+            time_delta_seconds[moving] if np.ndim(time_delta_seconds) else time_delta_seconds)
+        new_x = x[moving] + mdx / dist * move_amount
+        new_y = y[moving] + mdy / dist * move_amount
+        x[moving] = new_x
+        y[moving] = new_y
+
+        # Overshot or very close after the move, snap
+        new_dx = target_x[moving] - new_x
+        new_dy = target_y[moving] - new_y
+        arrived[moving] = ((new_dx * mdx < 0) | (new_dy * mdy < 0) |
+                           (np.sqrt(new_dx * new_dx + new_dy * new_dy) < 1.0))
+
+    x[arrived] = target_x[arrived]
+    y[arrived] = target_y[arrived]
+    population.x[indices] = x
+    population.y[indices] = y
+    snapped = indices[arrived]
+    population.target_x[snapped] = np.nan
+    population.target_y[snapped] = np.nan
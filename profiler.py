@@ -0,0 +1,198 @@
+import cProfile
+import csv
+import json
+import logging
+import os
+import pstats
+import time
+from collections import deque
+import numpy as np
+
+PERCENTILES = (50, 95, 99)
+
+log = logging.getLogger("simling.profiler")
+
+
+class FrameProfiler:
+    """Per-phase frame timings over a rolling window of frames.
+
+    The game loop calls begin_frame(), then lap(phase) after each phase
+    (the time since the previous lap is charged to that phase) and finally
+    end_frame(). Anything between the last lap and end_frame() is charged
+    to "other". While disabled every call returns straight away, so the
+    instrumentation can stay in the loop.
+
+    capture(frames) additionally runs cProfile over the next frames and
+    writes the stats to a .prof file when done. That only logs where the
+    file went; print_last_profile() shows the top entries, e.g. on exit,
+    away from the frame loop.
+    """
+
+    def __init__(self, history=600, enabled=False):
+        self.enabled = enabled
+        self.frames = deque(maxlen=history)
+        self.phases = []  # In first-seen order, for display and export
+        self.frame_count = 0
+        self._start = None
+        self._last = None
+        self._current = None
+        self._profile = None
+        self._profile_frames = 0
+        self.profile_path = None
+        self.last_profile = None  # Path of the last finished capture
+
+    @classmethod
+    def from_env(cls, environ=None):
+        """Profiler configured from SIMLING_PROFILE (enable) and SIMLING_CPROFILE (frames to capture)."""
+        environ = os.environ if environ is None else environ
+        profiler = cls(enabled=environ.get("SIMLING_PROFILE", "") not in ("", "0"))
+        capture_frames = int(environ.get("SIMLING_CPROFILE", "0") or 0)
+        if capture_frames > 0:
+            profiler.capture(capture_frames)
+        return profiler
+
+    def toggle(self):
+        self.enabled = not self.enabled
+        self._start = None
+        return self.enabled
+
+    def begin_frame(self):
+        if not self.enabled:
+            return
+        self._start = self._last = time.perf_counter()
+        self._current = {}
+
+    def lap(self, phase, agents=None):
+        """Charge the time since the previous lap to phase.
+
+        Pass agents (how many simlings the phase handled) to also record
+        the per-agent cost of this phase.
+        """
+        if self._start is None:
+            return
+        now = time.perf_counter()
+        current = self._current
+        current[phase] = current.get(phase, 0.0) + now - self._last
+        if agents:
+            current["agents"] = agents
+            current["per_agent"] = current[phase] / agents
+        self._last = now
+
+    def end_frame(self):
+        if self._start is None:
+            self._finish_capture_frame()
+            return
+        now = time.perf_counter()
+        current = self._current
+        current["other"] = current.get("other", 0.0) + now - self._last
+        current["total"] = now - self._start
+        for phase in current:
+            if phase not in self.phases and phase not in ("total", "agents", "per_agent"):
+                self.phases.append(phase)
+        current["frame"] = self.frame_count
+        self.frames.append(current)
+        self.frame_count += 1
+        self._start = None
+        self._finish_capture_frame()
+
+    # cProfile capture
+
+    def capture(self, frames=120, path=None):
+        """Run cProfile over the next frames, then write the stats to path."""
+        if self._profile is not None:
+            return
+        self.profile_path = path or time.strftime("frame-profile-%Y%m%d-%H%M%S.prof")
+        self._profile_frames = frames
+        self._profile = cProfile.Profile()
+        self._profile.enable()
+
+    @property
+    def capturing(self):
+        return self._profile is not None
+
+    def _finish_capture_frame(self):
+        if self._profile is None:
+            return
+        self._profile_frames -= 1
+        if self._profile_frames > 0:
+            return
+        self._profile.disable()
+        self._profile.dump_stats(self.profile_path)
+        log.info("Wrote profile of the last frames to %s", self.profile_path,
+                 extra={"data": {"path": self.profile_path}})
+        self.last_profile = self.profile_path
+        self._profile = None
+
+    def print_last_profile(self, limit=15, stream=None):
+        """Print the top limit entries, by cumulative time, of the last finished capture if there is one."""
+        if self.last_profile is None:
+            return
+        print(f"Profile of the frames captured in {self.last_profile}:", file=stream)
+        pstats.Stats(self.last_profile, stream=stream).sort_stats("cumulative").print_stats(limit)
+
+    # Statistics
+
+    def values(self, phase="total"):
+        return np.array([frame.get(phase, 0.0) for frame in self.frames])
+
+    def percentiles(self, phase="total", percentiles=PERCENTILES):
+        """{"p50": seconds, ...} of phase over the window, or None without data."""
+        values = self.values(phase)
+        if not len(values):
+            return None
+        return {f"p{p}": value for p, value in zip(percentiles, np.percentile(values, percentiles))}
+
+    def per_agent_cost_histogram(self, bins=10):
+        """Histogram (counts, bin edges in seconds) over frames of the per-agent cost of the window.
+
+        Each frame adds one value, the time of the phase lapped with agents
+        divided by how many there were: the average per agent that frame.
+        It shows how that average varies from frame to frame, not how the
+        cost is spread across agents, which isn't measured per agent.
+        """
+        costs = np.array([frame["per_agent"] for frame in self.frames if "per_agent" in frame])
+        return np.histogram(costs, bins=bins)
+
+    def summary(self):
+        """Percentiles of every phase and of the whole frame."""
+        return {phase: self.percentiles(phase) for phase in self.phases + ["total"]}
+
+    # Export
+
+    def export_csv(self, path):
+        columns = ["frame", "total"] + self.phases + ["agents", "per_agent"]
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=columns, restval="")
+            writer.writeheader()
+            for frame in self.frames:
+                writer.writerow(frame)
+
+    def export_json(self, path):
+        counts, edges = self.per_agent_cost_histogram()
+        data = {
+            "summary": self.summary(),
+            "per_agent_cost_histogram": {"counts": counts.tolist(), "edges": edges.tolist()},
+            "frames": list(self.frames),
+        }
+        with open(path, "w") as f:
+            json.dump(data, f, indent=2)
+
+    def export(self, path, writer=None):
+        """Write CSV or JSON, depending on the extension of path, and log where it went.
+
+        With a writer (a snapshot.SnapshotWriter, or anything else with
+        submit(function, *args)) only a copy of the window is made here,
+        and the summary and file are written on the writer's thread, so
+        the frame loop doesn't wait on them.
+        """
+        if writer is not None:
+            copy = FrameProfiler(history=self.frames.maxlen)
+            copy.frames.extend(self.frames)
+            copy.phases = list(self.phases)
+            writer.submit(copy.export, path)
+            return
+        if path.endswith(".csv"):
+            self.export_csv(path)
+        else:
+            self.export_json(path)
+        log.info("Exported frame timings to %s", path, extra={"data": {"path": path}})
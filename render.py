@@ -0,0 +1,265 @@
+import numpy as np
+import pygame
+from camera import Camera
+
+BORDER_COLOR = (255, 0, 0)  # Red selection border
+DIRTY_CELL = 64  # Granularity of the coarse "is anything dirty here" mask
+FULL_REDRAW_AREA = 0.5  # Redraw everything once sprites would dirty this much of the screen
+CULL_MARGIN = 100  # World units around the view in which simlings still count as visible, beats any sprite size
+
+
+class Renderer:
+    """Dirty-rectangle renderer for a World.
+
+    The background and the (static) food sources, beds, televisions and walls are drawn
+    once into a cached layer. Each frame only the areas touched by simlings
+    that moved, the selection borders and the overlays (e.g. the UI panel)
+    are restored from that layer, redrawn and pushed with display.update(),
+    so frame time follows the number of moving simlings rather than the
+    screen size. The static layer is rebuilt whenever an object is
+    added, removed or moved, the camera moved, or after invalidate().
+
+    Only what the camera (a camera.Camera, by default one showing the
+    world from its top left corner) sees is drawn: objects come from a
+    query of their ObjectGrid, simlings outside the view are skipped, and
+    sprites are scaled to the zoom once and shared through the asset cache.
+    With a picking.SimlingPicker over the world's population, the visible
+    simlings come from a query of its cells as well (sync() it every frame
+    before draw(), as for hovering); without one every simling is checked.
+    So draw cost follows what is visible, not the world population.
+    """
+
+    def __init__(self, screen, world, background=(255, 255, 255), profiler=None, camera=None, picker=None):
+        self.screen = screen
+        self.world = world
+        self.camera = camera if camera is not None else Camera(screen.get_size(), world.size)
+        self.picker = picker
+        self.profiler = profiler  # Optional FrameProfiler, gets "ui", "draw" and "present" laps
+        self.background = background
+        self.static_layer = None
+        self._static_key = None
+        self._full_redraw = True
+        self._prev_x = np.zeros(0, dtype=np.int64)
+        self._prev_y = np.zeros(0, dtype=np.int64)
+        self._prev_drawn = np.zeros(0, dtype=bool)
+        self._prev_slots = np.zeros(0, dtype=np.int64)  # Where _prev_drawn is set
+        self._prev_borders = {}  # Slot -> selection border rect, last frame
+        self._prev_overlays = []  # Rect (or None) per overlay, last frame
+        self.simling_size = 0  # Largest sprite seen on screen, used for overlap tests
+        self.visible = 0  # Simlings drawn (or considered for drawing) last frame
+        self._sprites = {}  # (entity class, size) -> sprite scaled to the current zoom
+
+    def invalidate(self):
+        """Force a full redraw (and static layer rebuild) on the next frame."""
+        self._static_key = None
+        self._full_redraw = True
+
+    def _build_static_layer(self):
+        self.static_layer = pygame.Surface(self.screen.get_size()).convert()
+        self.static_layer.fill(self.background)
+        view = self.camera.view_rect()
+        for objects in (self.world.food_sources, self.world.beds, self.world.televisions, self.world.walls):
+            for obj in objects.query_overlapping(*view):
+                self._draw_object(obj)
+
+    def _draw_object(self, obj):
+        x, y = self.camera.world_to_screen(obj.x, obj.y)
+        if getattr(type(obj), "image", None) is None:  # Walls are plain rectangles
+            width, height = obj.size
+            pygame.draw.rect(self.static_layer, obj.color,
+                             (x, y, self.camera.scaled(width), self.camera.scaled(height)))
+        else:
+            self.static_layer.blit(self._sprite(obj), (x, y))
+
+    def _sprite(self, entity):
+        key = (type(entity), entity.size)
+        sprite = self._sprites.get(key)
+        if sprite is None:
+            sprite = self._sprites[key] = type(entity).image.scaled(entity, self.camera.zoom)
+        return sprite
+
+    def _sync_capacity(self, capacity):
+        if len(self._prev_drawn) < capacity:
+            grow = capacity - len(self._prev_drawn)
+            self._prev_x = np.concatenate([self._prev_x, np.zeros(grow, dtype=np.int64)])
+            self._prev_y = np.concatenate([self._prev_y, np.zeros(grow, dtype=np.int64)])
+            self._prev_drawn = np.concatenate([self._prev_drawn, np.zeros(grow, dtype=bool)])
+
+    def _sprite_rect(self, slot, x, y):
+        size = self.camera.scaled(self.world.population.owners[slot].size)
+        self.simling_size = max(self.simling_size, size)
+        return pygame.Rect(x, y, size, size)
+
+    def _border_rect(self, simling):
+        x, y = self.camera.world_to_screen(simling.x, simling.y)
+        size = self.camera.scaled(simling.size)
+        return pygame.Rect(x - 2, y - 2, size + 4, size + 4)
+
+    def _draw_simling(self, slot, x, y, borders):
+        simling = self.world.population.owners[slot]
+        self.screen.blit(self._sprite(simling), (x, y))
+        if slot in borders:
+            pygame.draw.rect(self.screen, BORDER_COLOR, borders[slot], 2)
+
+    def draw(self, selected=None, overlays=()):
+        """Draw one frame and push it to the display. Returns the updated rects.
+
+        selected is the selected simling, or a list of them, each drawn with a border.
+        """
+        camera = self.camera
+        static_key = (self.world.food_sources.version, self.world.beds.version, self.world.televisions.version,
+                      self.world.walls.version, camera.state())
+        if static_key != self._static_key:
+            if self._static_key is None or static_key[-1][2] != self._static_key[-1][2]:  # Zoom changed
+                self._sprites.clear()
+                self.simling_size = 0
+            self._build_static_layer()
+            self._static_key = static_key
+            self._full_redraw = True
+
+        population = self.world.population
+        self._sync_capacity(population.capacity)
+        view_x, view_y, view_width, view_height = camera.view_rect()
+        if self.picker is not None:
+            slots = self.picker.corners_in(view_x - CULL_MARGIN, view_y - CULL_MARGIN,
+                                           view_x + view_width, view_y + view_height)
+        else:
+            slots = population.indices()
+            xs = population.x[slots]
+            ys = population.y[slots]
+            slots = slots[(xs > view_x - CULL_MARGIN) & (xs < view_x + view_width) &
+                          (ys > view_y - CULL_MARGIN) & (ys < view_y + view_height)]
+        xs = np.floor((population.x[slots] - camera.x) * camera.zoom).astype(np.int64)
+        ys = np.floor((population.y[slots] - camera.y) * camera.zoom).astype(np.int64)
+        self.visible = len(slots)
+        overlay_rects = [overlay.layout() for overlay in overlays]
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.lap("ui")
+        if len(overlay_rects) != len(self._prev_overlays):
+            self._full_redraw = True
+        if selected is None:
+            selected = ()
+        elif not isinstance(selected, (list, tuple)):  # A single simling
+            selected = (selected,)
+        borders = {simling.index: self._border_rect(simling) for simling in selected}
+
+        if self._full_redraw:
+            dirty = self._draw_full(slots, xs, ys, borders, overlays)
+        else:
+            dirty = self._draw_dirty(slots, xs, ys, borders, overlays, overlay_rects)
+        if profiler is not None:
+            profiler.lap("draw")
+        if dirty == [self.screen.get_rect()]:
+            pygame.display.flip()
+        elif dirty:
+            pygame.display.update(dirty)
+        if profiler is not None:
+            profiler.lap("present")
+
+        self._prev_drawn[self._prev_slots] = False
+        self._prev_drawn[slots] = True
+        self._prev_slots = slots
+        self._prev_x[slots] = xs
+        self._prev_y[slots] = ys
+        self._prev_borders = borders
+        self._prev_overlays = overlay_rects
+        return dirty
+
+    def _draw_full(self, slots, xs, ys, borders, overlays):
+        self.screen.blit(self.static_layer, (0, 0))
+        for slot, x, y in zip(slots.tolist(), xs.tolist(), ys.tolist()):
+            self._sprite_rect(slot, x, y)
+            self._draw_simling(slot, x, y, borders)
+        for overlay in overlays:
+            overlay.draw(self.screen)
+        self._full_redraw = False
+        return [self.screen.get_rect()]
+
+    def _draw_dirty(self, slots, xs, ys, borders, overlays, overlay_rects):
+        screen_rect = self.screen.get_rect()
+        dirty = []
+
+        # Sprites that moved, appeared or disappeared: old and new rects
+        was_drawn = self._prev_drawn[slots]
+        moved = ~was_drawn | (xs != self._prev_x[slots]) | (ys != self._prev_y[slots])
+        previous = self._prev_slots
+        gone = previous[~np.isin(previous, slots, assume_unique=True)]
+        size = self.simling_size
+        estimate = (2 * np.count_nonzero(moved) + len(gone)) * max(size, 1) ** 2
+        if estimate > FULL_REDRAW_AREA * screen_rect.width * screen_rect.height:
+            # Crowds: blitting everything once beats restoring a huge pile of overlapping rects
+            return self._draw_full(slots, xs, ys, borders, overlays)
+        for slot, x, y, had in zip(slots[moved].tolist(), xs[moved].tolist(), ys[moved].tolist(),
+                                   was_drawn[moved].tolist()):
+            rect = self._sprite_rect(slot, x, y)
+            dirty.append(rect)
+            if had:
+                dirty.append(rect.move(int(self._prev_x[slot]) - x, int(self._prev_y[slot]) - y))
+        for slot in gone.tolist():
+            dirty.append(pygame.Rect(int(self._prev_x[slot]), int(self._prev_y[slot]), size, size))
+
+        prev_borders = self._prev_borders
+        for slot in borders.keys() | prev_borders.keys():
+            border, prev = borders.get(slot), prev_borders.get(slot)
+            if border != prev:
+                dirty.extend(rect for rect in (border, prev) if rect is not None)
+            elif border.collidelist(dirty) != -1:
+                dirty.append(border)  # Someone walked over the border, it has to be redrawn whole
+        # Overlays only need their area refreshed when their content changed
+        for overlay, rect, prev in zip(overlays, overlay_rects, self._prev_overlays):
+            if getattr(overlay, "changed", True) or rect != prev:
+                dirty.extend(r for r in (rect, prev) if r is not None)
+
+        dirty = [rect.clip(screen_rect) for rect in dirty]
+        dirty = [rect for rect in dirty if rect.width and rect.height]
+        if not dirty:
+            return []
+
+        # Every sprite touching a dirty rect gets redrawn, clipped to it
+        near = self._near_dirty(dirty, slots, xs, ys)
+        for rect in dirty:
+            self.screen.set_clip(rect)
+            self.screen.blit(self.static_layer, rect, rect)
+            touching = set()
+            for col in range(rect.left // DIRTY_CELL, (rect.right - 1) // DIRTY_CELL + 1):
+                for row in range(rect.top // DIRTY_CELL, (rect.bottom - 1) // DIRTY_CELL + 1):
+                    touching.update(near.get((col, row), ()))
+            for slot, x, y in sorted(touching):
+                if rect.colliderect((x, y, size, size)) or (slot in borders and rect.colliderect(borders[slot])):
+                    self._draw_simling(slot, x, y, borders)
+            for overlay, overlay_rect in zip(overlays, overlay_rects):
+                if overlay_rect is not None and rect.colliderect(overlay_rect):
+                    overlay.draw(self.screen)
+        self.screen.set_clip(None)
+        return dirty
+
+    def _near_dirty(self, dirty, slots, xs, ys):
+        """(slot, x, y) of sprites that might touch a dirty rect, bucketed by DIRTY_CELL cell."""
+        width, height = self.screen.get_size()
+        columns = width // DIRTY_CELL + 1
+        rows = height // DIRTY_CELL + 1
+        mask = np.zeros((columns, rows), dtype=bool)
+        for rect in dirty:
+            mask[rect.left // DIRTY_CELL:(rect.right - 1) // DIRTY_CELL + 1,
+                 rect.top // DIRTY_CELL:(rect.bottom - 1) // DIRTY_CELL + 1] = True
+
+        # Border is 2 pixels outside the sprite, pad the sprite box to cover it
+        pad = 2
+        extent = self.simling_size + 2 * pad
+        on_screen = (xs - pad < width) & (xs - pad + extent > 0) & (ys - pad < height) & (ys - pad + extent > 0)
+        near = np.zeros(len(slots), dtype=bool)
+        for dx in (0, extent - 1):
+            for dy in (0, extent - 1):
+                col = np.clip((xs - pad + dx) // DIRTY_CELL, 0, columns - 1)
+                row = np.clip((ys - pad + dy) // DIRTY_CELL, 0, rows - 1)
+                near |= mask[col, row]
+        near &= on_screen
+
+        # Bucket the survivors by every cell their (padded) box touches
+        buckets = {}
+        for slot, x, y in zip(slots[near].tolist(), xs[near].tolist(), ys[near].tolist()):
+            for col in {(x - pad) // DIRTY_CELL, (x - pad + extent - 1) // DIRTY_CELL}:
+                for row in {(y - pad) // DIRTY_CELL, (y - pad + extent - 1) // DIRTY_CELL}:
+                    buckets.setdefault((col, row), []).append((slot, x, y))
+        return buckets
@@ -0,0 +1,246 @@
+"""Record the input of a session and replay it headlessly.
+
+    SIMLING_RECORD=session.rec python main.py   # Play, recording frame times and clicks
+    python replay.py session.rec                # Replay at full speed, checking every state hash
+    python replay.py session.rec --from 1200    # Start from the last checkpoint before frame 1200
+    python replay.py session.rec --bisect       # Find the first frame that no longer matches
+
+A recording is a JSON lines log plus a snapshot file per checkpoint next
+to it. Every frame logs its dt and the clicks and drags handled before
+the step (in world coordinates, so the camera doesn't matter). Every
+hash_interval-th frame also logs a hash of the world state after it, and
+so does every checkpoint. A replay is checked against all of them.
+"""
+import argparse
+import hashlib
+import json
+import os
+import struct
+import sys
+import numpy as np
+
+from controls import handle_click
+from picking import SimlingPicker
+from snapshot import Snapshot, SnapshotWriter
+
+# Columns left out of the state hash: serials are handed out afresh when a
+# snapshot is restored, so they differ between a session and its replay.
+UNHASHED_COLUMNS = ("serial",)
+
+
+def state_hash(world, selection=()):
+    """Hash of everything that decides how the world carries on."""
+    return _snapshot_hash(Snapshot.capture(world), _selected_rows(world, selection))
+
+
+def _snapshot_hash(snapshot, rows):
+    # state_hash of a captured world, given the selection as snapshot rows
+    digest = hashlib.blake2b(digest_size=16)
+    header = snapshot.header
+    digest.update(struct.pack(f"<qdq{len(rows)}q", header["tick"], header["time"], len(rows), *rows))
+    for name, column in snapshot.columns.items():
+        if name not in UNHASHED_COLUMNS:
+            digest.update(name.encode())
+            digest.update(column.tobytes())
+    return digest.hexdigest()
+
+
+def _selected_rows(world, selection):
+    # Rows of the selected simlings in a snapshot (their rank among the live
+    # slots), which a restored world gives back as its slots
+    slots = world.population.indices()
+    return np.searchsorted(slots, [simling.index for simling in selection]).tolist()
+
+
+class InputRecorder:
+    """Writes a recording of a session for Replay.
+
+    record_click() logs a click (or drag) as it is handled, end_frame()
+    logs the frame's dt and, every hash_interval frames, the state hash
+    after the step. Every checkpoint_interval frames the whole world is
+    saved as a snapshot. The frame loop only captures the world; hashing,
+    saving and writing the log happen on a background thread. A replay
+    pins a mismatch down to the first hashed frame after it, so a smaller
+    hash_interval costs more captures for a more precise answer. A
+    recorder made without a path records nothing.
+    """
+
+    def __init__(self, path, world, selection=(), checkpoint_interval=600, hash_interval=30):
+        self.path = path
+        self.checkpoint_interval = checkpoint_interval
+        self.hash_interval = hash_interval
+        self.frame = 0
+        self._clicks = []
+        self._file = None
+        self._writer = None
+        if path is not None:
+            self._file = open(path, "w")
+            self._writer = SnapshotWriter()
+            self._checkpoint(world, selection)
+
+    @classmethod
+    def from_env(cls, world, environ=None):
+        """Recorder writing to SIMLING_RECORD, or an inactive one if that isn't set."""
+        environ = os.environ if environ is None else environ
+        return cls(environ.get("SIMLING_RECORD") or None, world)
+
+    def _write(self, record, snapshot=None, rows=None):
+        # Runs on the writer thread, in submission order, so the log stays in frame order
+        if snapshot is not None:
+            record["hash"] = _snapshot_hash(snapshot, rows)
+        self._file.write(json.dumps(record, separators=(",", ":")) + "\n")
+
+    def _checkpoint(self, world, selection):
+        name = f"{os.path.basename(self.path)}.{self.frame:08d}.snap"
+        snapshot = Snapshot.capture(world)
+        rows = _selected_rows(world, selection)
+        self._writer.save(snapshot, os.path.join(os.path.dirname(self.path), name))
+        self._writer.submit(self._write, {"checkpoint": self.frame, "snapshot": name, "selected": rows},
+                            snapshot, rows)
+
+    def record_click(self, button, position, end=None):
+        if self._file is not None:
+            self._clicks.append([button, list(position)] + ([list(end)] if end is not None else []))
+
+    def end_frame(self, time_delta_seconds, world, selection):
+        if self._file is None:
+            return
+        record = {"dt": time_delta_seconds, "clicks": self._clicks}
+        if self.frame % self.hash_interval == 0:
+            self._writer.submit(self._write, record, Snapshot.capture(world), _selected_rows(world, selection))
+        else:
+            self._writer.submit(self._write, record)
+        self._clicks = []
+        self.frame += 1
+        if self.frame % self.checkpoint_interval == 0:
+            self._checkpoint(world, selection)
+
+    def close(self):
+        if self._file is not None:
+            try:
+                self._writer.close()  # Writes what is still queued
+            finally:
+                self._file.close()
+                self._file = None
+
+
+class ReplayMismatch(Exception):
+    def __init__(self, frame, expected, actual):
+        super().__init__(f"State after frame {frame} doesn't match the recording ({actual} != {expected})")
+        self.frame = frame
+        self.expected = expected
+        self.actual = actual
+
+
+class Replay:
+    """Feeds a recording back into a fresh World, as fast as it will go."""
+
+    def __init__(self, path):
+        self.path = path
+        self.frames = []  # (dt, clicks, hash or None) per frame
+        self.checkpoints = {}  # Frame -> checkpoint record, state before that frame
+        with open(path) as f:
+            for line in f:
+                record = json.loads(line)
+                if "checkpoint" in record:
+                    self.checkpoints[record["checkpoint"]] = record
+                else:
+                    self.frames.append((record["dt"], record["clicks"], record.get("hash")))
+
+    def __len__(self):
+        return len(self.frames)
+
+    def restore(self, frame):
+        """World and selection at the last checkpoint at or before frame."""
+        start = max(checkpoint for checkpoint in self.checkpoints if checkpoint <= frame)
+        record = self.checkpoints[start]
+        snapshot = Snapshot.load(os.path.join(os.path.dirname(self.path), record["snapshot"]))
+        world = snapshot.restore()
+        snapshot.close()
+        slots = world.population.indices()[np.array(record["selected"], dtype=np.int64)]
+        selection = [world.population.owners[slot] for slot in slots.tolist()]
+        actual = state_hash(world, selection)
+        if actual != record["hash"]:
+            raise ReplayMismatch(start, record["hash"], actual)
+        return start, world, selection
+
+    def run(self, start=0, stop=None, verify=True):
+        """Replay frames start to stop (default: to the end). Returns the world and selection.
+
+        Raises ReplayMismatch at the first frame whose state hash differs
+        from the recording, when verify is set.
+        """
+        stop = len(self.frames) if stop is None else min(stop, len(self.frames))
+        frame, world, selection = self.restore(start)
+        picker = SimlingPicker(world.population)
+        for frame in range(frame, stop):
+            time_delta_seconds, clicks, expected = self.frames[frame]
+            if expected is None and frame + 1 in self.checkpoints:  # Its state is the one after this frame
+                expected = self.checkpoints[frame + 1]["hash"]
+            for button, position, *end in clicks:
+                selection = handle_click(selection, picker, button, tuple(position), tuple(end[0]) if end else None)
+            world.step(time_delta_seconds)
+            if verify and expected is not None and frame >= start:
+                actual = state_hash(world, selection)
+                if actual != expected:
+                    raise ReplayMismatch(frame, expected, actual)
+        return world, selection
+
+    def bisect(self):
+        """First frame that no longer replays as recorded, or None if all of them do.
+
+        Each stretch between two checkpoints starts from its own saved state,
+        so the stretches can be checked independently. They are binary
+        searched for the first bad one, which assumes that once a replay
+        goes wrong it stays wrong.
+        """
+        starts = sorted(self.checkpoints)
+        stretches = [(start, end) for start, end in zip(starts, starts[1:] + [len(self.frames)]) if start < end]
+
+        def first_mismatch(stretch):
+            try:
+                self.run(*stretch)
+            except ReplayMismatch as mismatch:
+                return mismatch.frame
+            return None
+
+        low, high = 0, len(stretches)
+        found = None
+        while low < high:
+            middle = (low + high) // 2
+            mismatch = first_mismatch(stretches[middle])
+            if mismatch is None:
+                low = middle + 1
+            else:
+                found = mismatch
+                high = middle
+        return found
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("recording")
+    parser.add_argument("--from", dest="start", type=int, default=0, help="first frame to replay")
+    parser.add_argument("--to", dest="stop", type=int, help="replay up to (not including) this frame")
+    parser.add_argument("--bisect", action="store_true", help="binary search for the first mismatching frame")
+    args = parser.parse_args(argv)
+
+    replay = Replay(args.recording)
+    if args.bisect:
+        frame = replay.bisect()
+        if frame is None:
+            print(f"All {len(replay)} frames replay as recorded")
+            return 0
+        print(f"First mismatch after frame {frame}")
+        return 1
+    try:
+        world, _ = replay.run(args.start, args.stop)
+    except ReplayMismatch as mismatch:
+        print(mismatch)
+        return 1
+    print(f"Replayed up to tick {world.tick}, {len(world.simlings)} simlings, state matches the recording")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
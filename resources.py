@@ -0,0 +1,283 @@
+import math
+from collections import deque
+import numpy as np
+
+CANDIDATES = 8  # Closest objects considered per simling
+EXACT = 64  # Up to this many objects candidates come from comparing with all of them, else from the grid
+CHUNK_ENTRIES = 1 << 20  # Cap on seekers x objects distances computed at once
+
+
+class _Station:
+    """Contention state of one object."""
+
+    def __init__(self, obj, now):
+        self.obj = obj
+        self.capacity = getattr(obj, "capacity", 1)
+        self.use_duration = getattr(obj, "use_duration", 0.0)
+        self.busy_until = [-math.inf] * self.capacity  # World time each slot frees up
+        self.reserved = set()  # Simlings heading here or queued, not yet served
+        self.queue = deque()  # (simling, arrival time), waiting for a free slot
+        self.created = now
+        self.uses = 0
+        self.busy_seconds = 0.0
+        self.wait_seconds = 0.0
+        self.max_queue = 0
+
+    def free_slot(self, now):
+        for slot, until in enumerate(self.busy_until):
+            if until <= now:
+                return slot
+        return None
+
+    def occupy(self, slot, simling, now, arrived):
+        self.busy_until[slot] = now + self.use_duration
+        self.busy_seconds += self.use_duration
+        self.wait_seconds += now - arrived
+        self.uses += 1
+        self.reserved.discard(simling)
+
+    def purge(self):
+        # Simlings that went elsewhere without release(), e.g. a target_object set by hand
+        self.reserved = {simling for simling in self.reserved if simling.target_object is self.obj}
+
+
+class _Waits:
+    """Expected waits at some stations as a function of how many simlings are ahead."""
+
+    def __init__(self, stations, now):
+        self.capacity = np.array([station.capacity for station in stations], dtype=np.int64)
+        self.duration = np.array([station.use_duration for station in stations], dtype=np.float64)
+        self.ahead = np.array([len(station.reserved) for station in stations], dtype=np.int64)
+        self.busy = np.zeros((len(stations), int(self.capacity.max(initial=1))))
+        for row, station in enumerate(stations):
+            self.busy[row, :station.capacity] = sorted(max(until - now, 0.0) for until in station.busy_until)
+
+    def __call__(self, stations, ahead):
+        # Slots free up in order of busy; everyone ahead takes the next free
+        # one for use_duration. The newcomer gets the slot after them.
+        capacity = self.capacity[stations]
+        return self.busy[stations, ahead % capacity] + ahead // capacity * self.duration[stations]
+
+
+class Reservations:
+    """Capacity, reservations and queues for one kind of object (food sources or beds).
+
+    Every object serves up to obj.capacity simlings at a time, each use
+    keeping its slot busy for obj.use_duration seconds. A simling reserves
+    the object it picks and, if it arrives while all slots are busy, waits
+    in a first come, first served queue until advance() frees one.
+
+    choose() picks targets for a whole batch of simlings at once, by the
+    later of walking time and expected wait, so crowds spread over the
+    objects instead of piling onto the closest one. Without contention
+    that is simply the closest object, as before.
+
+    Attach it to the ObjectGrid holding the objects (World does), Simling
+    looks it up there as objects.reservations.
+    """
+
+    def __init__(self, objects):
+        self.objects = objects
+        self.time = 0.0
+        self._stations = {}
+
+    def station(self, obj):
+        station = self._stations.get(obj)
+        if station is None:
+            station = self._stations[obj] = _Station(obj, self.time)
+            obj.reservations = self  # So a simling giving up on obj can find us
+        return station
+
+    def advance(self, now):
+        """Move the clock to world time now and serve queued simlings whose slot freed up."""
+        self.time = now
+        for station in self._stations.values():
+            queue = station.queue
+            while queue:
+                simling, arrived = queue[0]
+                if simling.target_object is not station.obj or simling.current_action != "waiting":
+                    queue.popleft()  # Left the queue (player command, removed)
+                    continue
+                slot = station.free_slot(now)
+                if slot is None:
+                    break
+                queue.popleft()
+                station.occupy(slot, simling, now, arrived)
+                simling.use_target()
+
+    def reserve(self, obj, simling):
+        self.station(obj).reserved.add(simling)
+
+    def release(self, obj, simling):
+        """Drop simling's reservation of obj and its place in the queue, it is going elsewhere."""
+        station = self.station(obj)
+        station.reserved.discard(simling)
+        if any(queued is simling for queued, _ in station.queue):
+            station.queue = deque(entry for entry in station.queue if entry[0] is not simling)
+
+    def cancel(self, simling):
+        """Drop simling's reservation and queue place, e.g. when it is removed from the world."""
+        for obj in self._stations:
+            self.release(obj, simling)
+
+    def arrive(self, obj, simling):
+        """simling reached obj. True if a slot is free and it can use obj now, else it is queued."""
+        station = self.station(obj)
+        slot = station.free_slot(self.time) if not station.queue else None
+        if slot is not None:
+            station.occupy(slot, simling, self.time, self.time)
+            return True
+        station.reserved.add(simling)
+        station.queue.append((simling, self.time))
+        station.max_queue = max(station.max_queue, len(station.queue))
+        return False
+
+    def queued(self):
+        """How many simlings are waiting in all the queues."""
+        return sum(len(station.queue) for station in self._stations.values())
+
+    def queue_positions(self, obj):
+        return [simling for simling, _ in self.station(obj).queue]
+
+    def expected_waits(self, objects):
+        """Seconds a newcomer would wait at each object, given who already reserved it."""
+        waits = np.zeros(len(objects))
+        for i, obj in enumerate(objects):
+            station = self.station(obj)
+            busy = sorted(max(until - self.time, 0.0) for until in station.busy_until)
+            waits[i] = self._wait(busy, len(station.reserved), station)
+        return waits
+
+    @staticmethod
+    def _wait(busy, ahead, station):
+        # Slots free up in order of busy; everyone ahead takes the next free
+        # one for use_duration. The newcomer gets the slot after them.
+        rounds, position = divmod(ahead, station.capacity)
+        return busy[position] + rounds * station.use_duration
+
+    def choose(self, xs, ys, speeds):
+        """Best object for each simling centred at (xs, ys), as positions into list(self.objects).
+
+        Each simling considers the CANDIDATES objects closest to it (from
+        the ObjectGrid's nearest_k() when there are more than EXACT) and
+        takes the one with the smallest max(walking time, expected wait),
+        where the wait counts the simlings that picked it before. Ties go to
+        the earlier object, like the nearest-object search.
+
+        Up to EXACT objects the simlings pick strictly in order, see
+        _choose_in_order(). Past that they pick in rounds, see
+        _choose_in_rounds(): the same idea, decided for the whole batch at
+        once, so a simling may end up where the strict order would have sent
+        it elsewhere.
+        """
+        xs = np.asarray(xs, dtype=np.float64)
+        ys = np.asarray(ys, dtype=np.float64)
+        speeds = np.maximum(np.asarray(speeds, dtype=np.float64), 1e-9)
+        listed = list(self.objects)
+        candidates = self._candidates(xs, ys)
+        objects, candidates = np.unique(candidates, return_inverse=True)  # Only the candidates matter
+        candidates = candidates.reshape(len(xs), -1)
+        centers = np.array([listed[i].center for i in objects.tolist()], dtype=np.float64)
+        dx = centers[candidates, 0] - xs[:, None]
+        dy = centers[candidates, 1] - ys[:, None]
+        travel = np.sqrt(dx * dx + dy * dy) / speeds[:, None]
+        waits = _Waits([self.station(listed[i]) for i in objects.tolist()], self.time)
+        if len(listed) <= EXACT:
+            choice = self._choose_in_order(candidates, travel, waits)
+        else:
+            choice = self._choose_in_rounds(candidates, travel, waits)
+        return objects[choice]
+
+    @staticmethod
+    def _choose_in_order(candidates, travel, waits):
+        # One by one, each simling counting the picks of those before it
+        choice = np.empty(len(candidates), dtype=np.int64)
+        ahead = waits.ahead.tolist()
+        busy, capacity, duration = waits.busy.tolist(), waits.capacity.tolist(), waits.duration.tolist()
+        for seeker, (options, times) in enumerate(zip(candidates.tolist(), travel.tolist())):
+            best = None
+            best_cost = math.inf
+            for o, walk in zip(options, times):
+                rounds, position = divmod(ahead[o], capacity[o])
+                cost = max(walk, busy[o][position] + rounds * duration[o])
+                if cost < best_cost:
+                    best, best_cost = o, cost
+            ahead[best] += 1
+            choice[seeker] = best
+        return choice
+
+    @staticmethod
+    def _choose_in_rounds(candidates, travel, waits):
+        # Every round the simlings still undecided pick their best option at
+        # the current counts. Each object then takes its pickers in order, as
+        # long as the wait behind the ones before them still leaves it no
+        # worse than their next best option would be with everyone who picked
+        # that one this round; the others pick again next round.
+        choice = np.full(len(candidates), -1, dtype=np.int64)
+        taken = np.zeros(len(waits.ahead), dtype=np.int64)
+        undecided = np.arange(len(candidates))
+        while len(undecided):
+            options = candidates[undecided]
+            walks = travel[undecided]
+            ahead = waits.ahead[options] + taken[options]
+            costs = np.maximum(walks, waits(options, ahead))
+            best = np.argmin(costs, axis=1)  # Candidates are in object order, so ties go to the earlier one
+            rows = np.arange(len(undecided))
+            picked = options[rows, best]
+            by_object = np.argsort(picked, kind="stable")  # Simling order within each object
+            rank = np.empty(len(picked), dtype=np.int64)
+            rank[by_object] = np.arange(len(picked)) - np.searchsorted(picked[by_object], picked[by_object])
+            cost = np.maximum(walks[rows, best], waits(picked, ahead[rows, best] + rank))
+            # The other options, once everyone who picked them this round is ahead too
+            pickers = np.bincount(picked, minlength=len(taken))
+            others = np.maximum(walks, waits(options, ahead + pickers[options]))
+            others[rows, best] = np.inf
+            accepted = cost <= others.min(axis=1)  # Always true for the first picker of each object
+            choice[undecided[accepted]] = picked[accepted]
+            taken += np.bincount(picked[accepted], minlength=len(taken))
+            undecided = undecided[~accepted]
+        return choice
+
+    def _candidates(self, xs, ys):
+        # Positions of the CANDIDATES closest objects per point, each row in object order
+        count = len(self.objects)
+        if count > EXACT and hasattr(self.objects, "nearest_k"):
+            return np.sort(self.objects.nearest_k(xs, ys, CANDIDATES), axis=1)
+        if count <= CANDIDATES:
+            return np.broadcast_to(np.arange(count), (len(xs), count))
+        centers = np.array([obj.center for obj in self.objects], dtype=np.float64)
+        result = np.empty((len(xs), CANDIDATES), dtype=np.int64)
+        chunk = max(1, CHUNK_ENTRIES // count)
+        for start in range(0, len(xs), chunk):
+            dx = centers[:, 0] - xs[start:start + chunk, None]
+            dy = centers[:, 1] - ys[start:start + chunk, None]
+            nearest = np.argsort(dx * dx + dy * dy, axis=1, kind="stable")[:, :CANDIDATES]
+            result[start:start + chunk] = np.sort(nearest, axis=1)
+        return result
+
+    def metrics(self):
+        """Utilization and queueing numbers per object, in object order.
+
+        Read-only: reservations of simlings that went elsewhere are left out
+        of "reserved" rather than purged, and objects nobody used yet get
+        the numbers of a fresh station without one being made.
+        """
+        now = self.time
+        result = []
+        for obj in self.objects:
+            station = self._stations.get(obj) or _Station(obj, now)
+            still_busy = sum(max(until - now, 0.0) for until in station.busy_until)
+            elapsed = now - station.created
+            busy = station.busy_seconds - still_busy
+            result.append({
+                "object": obj,
+                "capacity": station.capacity,
+                "in_use": sum(until > now for until in station.busy_until),
+                "reserved": sum(simling.target_object is obj for simling in station.reserved),
+                "queued": len(station.queue),
+                "max_queue": station.max_queue,
+                "uses": station.uses,
+                "utilization": busy / (elapsed * station.capacity) if elapsed > 0 else 0.0,
+                "mean_wait": station.wait_seconds / station.uses if station.uses else 0.0,
+            })
+        return result
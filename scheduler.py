@@ -0,0 +1,237 @@
+import heapq
+import math
+import numpy as np
+
+from population import IDLE, NEEDS, NEED_MIN, NEED_MAX, move_towards_targets
+from simling import Simling
+
+RATES = dict(zip(NEEDS, Simling.rates()))
+MANTISSA = 2 ** 53  # Units in the last place (ulps) per binade of float64, counting from its lower bound
+
+
+def accumulate(values, increment, counts):
+    """values after counts of repeated value += increment, rounded exactly as that loop rounds.
+
+    Stepping one tick at a time adds rate * dt to each need every tick,
+    and k of those additions round differently from adding k * rate * dt
+    once. Within a binade (between consecutive powers of two) every
+    addition of a positive increment moves a value by the same whole
+    number of ulps, so a run of them is one multiplication. Only the
+    addition that crosses into the next binade (or, when increment is an
+    odd number of half ulps, the first one from an odd value) is done as
+    it is, which leaves a loop over binades rather than over ticks.
+    """
+    values = np.array(values, dtype=np.float64)
+    counts = np.array(counts, dtype=np.int64)
+    if increment < 0:
+        return -accumulate(-values, -increment, counts)
+    todo = np.flatnonzero(counts > 0) if increment > 0 else np.zeros(0, dtype=np.int64)
+    while len(todo):
+        value = values[todo]
+        normal = value >= np.finfo(np.float64).tiny  # Zero and subnormals have no binade to speak of
+        _, exponent = np.frexp(np.where(normal, value, 1.0))
+        ulp = np.ldexp(1.0, exponent - 53)
+        ulps = increment / ulp  # Exact, ulp is a power of two
+        step = np.rint(ulps)
+        tie = ulps - np.floor(ulps) == 0.5
+        # Whole runs for values the increment doesn't carry out of the
+        # binade at once and, on a tie, that round the same way every time
+        run = normal & (ulps < MANTISSA // 2) & (step > 0) & (~tie | (value / ulp % 2 == 0))
+        if run.any():
+            slots = todo[run]
+            start = (value[run] / ulp[run]).astype(np.int64)
+            step_ulps = step[run].astype(np.int64)
+            # The m-th addition after this one stays in the binade while
+            # start + m * step + ulps < MANTISSA, with ulps' fraction rounded off
+            room = MANTISSA - start - np.floor(ulps[run]).astype(np.int64) - 1
+            inside = np.where(room >= 0, room // step_ulps + 1, 0)
+            taken = np.minimum(inside, counts[slots])
+            values[slots] = (start + taken * step_ulps) * ulp[run]
+            counts[slots] -= taken
+        # Additions that change binade (or can't be batched) one at a time
+        stuck = normal & (step == 0) & ~tie
+        counts[todo[stuck]] = 0  # Too small to ever change the value
+        single = todo[counts[todo] > 0]
+        values[single] += increment
+        counts[single] -= 1
+        todo = todo[counts[todo] > 0]
+    return values
+
+
+class EventScheduler:
+    """Event-driven fast-forward for a World on its fixed_dt tick grid.
+
+    Instead of touching every simling every tick, each simling's state in
+    the population arrays is kept as of the tick it was last evaluated
+    (its "base tick"). Needs grow linearly and movement is a straight line
+    at constant speed, so the tick of the next thing that can change a
+    simling's state - crossing a need threshold while idle (the floor of a
+    world.ai curve), or arriving at its target - is computed exactly and put in a priority queue. Only
+    those events are processed; everything else is evaluated lazily when
+    sync() brings the arrays up to the current tick.
+
+    Events are processed in tick order and, within a tick, in slot order,
+    which is the order World.step runs the AI in. Needs are brought
+    forward with accumulate(), which rounds exactly like k ticks of decay,
+    so thresholds are crossed on the same tick and the AI sees the same
+    values. Positions match up to floating point rounding, since k steps
+    of movement are computed as one step of k * dt.
+
+    Call sync() before reading simling attributes, and reschedule(simling)
+    after changing one from outside (e.g. set_player_commanded_target).
+    Arrival times assume straight-line movement, so worlds with walls
+    can't be fast-forwarded this way, and neither queues at busy objects
+    nor conversations are modelled: the world must be made with
+    contention=False and social=False.
+    """
+
+    def __init__(self, world):
+        if world.reservations() or world.interactions is not None:
+            raise ValueError("EventScheduler needs a World made with contention=False and social=False")
+        self.world = world
+        self.tick = world.tick
+        self._base_tick = np.zeros(0, dtype=np.int64)
+        self._version = np.zeros(0, dtype=np.int64)  # Invalidates queued events of a slot
+        self._known = np.zeros(0, dtype=np.int64)  # Serial of the simling each slot was scheduled for
+        self._queue = []
+        self.events_processed = 0
+        self.reschedule_all()
+
+    def _sync_capacity(self):
+        capacity = self.world.population.capacity
+        grow = capacity - len(self._known)
+        if grow > 0:
+            self._base_tick = np.concatenate([self._base_tick, np.zeros(grow, dtype=np.int64)])
+            self._version = np.concatenate([self._version, np.zeros(grow, dtype=np.int64)])
+            self._known = np.concatenate([self._known, np.zeros(grow, dtype=np.int64)])
+
+    def _adopt_new_simlings(self):
+        # Simlings added since the last call start from the current tick
+        self._sync_capacity()
+        population = self.world.population
+        serial = population.serial[:population.count]
+        new = np.flatnonzero(population.alive[:population.count] & (serial != self._known[:population.count]))
+        self._known[new] = serial[new]
+        for slot in new.tolist():
+            self._base_tick[slot] = self.tick
+            self._schedule(slot)
+
+    def reschedule_all(self):
+        """Recompute every simling's next event, e.g. after food sources or beds changed."""
+        self.sync()
+        population = self.world.population
+        for slot in population.indices().tolist():
+            self._schedule(slot)
+
+    def reschedule(self, simling):
+        """Recompute simling's next event after its state was changed from outside.
+
+        The simling must be up to date (sync()ed) before it is changed.
+        """
+        self._base_tick[simling.index] = self.tick
+        self._schedule(simling.index)
+
+    def sync(self, slots=None):
+        """Bring simlings (all of them by default) up to the current tick."""
+        self._adopt_new_simlings()
+        if slots is None:
+            slots = self.world.population.indices()
+        self._materialize(np.asarray(slots, dtype=np.int64), self.tick)
+
+    def _materialize(self, slots, tick):
+        elapsed_ticks = tick - self._base_tick[slots]
+        slots = slots[elapsed_ticks > 0]
+        if not len(slots):
+            return
+        ticks = tick - self._base_tick[slots]
+        elapsed = ticks * self.world.fixed_dt
+        # Needs exactly as that many ticks of decay would leave them, and
+        # one straight-line move over the whole span. No event is due
+        # before tick, so the move only snaps onto the target when tick is
+        # the arrival tick, exactly as the per-tick model does.
+        population = self.world.population
+        for need in NEEDS:
+            column = getattr(population, need)
+            column[slots] = np.clip(accumulate(column[slots], RATES[need] * self.world.fixed_dt, ticks),
+                                    NEED_MIN, NEED_MAX)
+        move_towards_targets(population, slots, elapsed)
+        self._base_tick[slots] = tick
+
+    def _ticks_until_over(self, value, rate, threshold):
+        """Smallest j >= 1 with value over threshold after j ticks of decay, or None."""
+        increment = rate * self.world.fixed_dt
+        if value > threshold:
+            return 1
+        if increment <= 0 or threshold >= NEED_MAX or value + increment == value:
+            return None
+
+        def over(j):
+            return accumulate([value], increment, [j])[0] > threshold
+        j = max(1, math.floor((threshold - value) / increment) + 1)
+        # Settle rounding with the same accumulation _materialize uses
+        while not over(j):
+            j += 1
+        while j > 1 and over(j - 1):
+            j -= 1
+        return j
+
+    def _ticks_until_arrival(self, slot):
+        population = self.world.population
+        dx = population.target_x[slot] - population.x[slot]
+        dy = population.target_y[slot] - population.y[slot]
+        distance = math.sqrt(dx*dx + dy*dy)
+        step = population.speed[slot] * self.world.fixed_dt
+        if distance < 1.0:
+            return 1
+        if step <= 0:
+            return None
+        # First tick whose move leaves less than one unit to go (or overshoots)
+        n = max(1, math.floor((distance - 1.0) / step) + 1)
+        while distance - n * step >= 1.0:
+            n += 1
+        while n > 1 and distance - (n - 1) * step < 1.0:
+            n -= 1
+        return n
+
+    def _schedule(self, slot):
+        population = self.world.population
+        self._version[slot] += 1
+        has_target = not (math.isnan(population.target_x[slot]) or math.isnan(population.target_y[slot]))
+        candidates = []
+        if has_target:
+            candidates.append(self._ticks_until_arrival(slot))
+        if population.action[slot] == IDLE:
+            for need, floor in self.world.ai.floors(self.world.world_objects):
+                candidates.append(self._ticks_until_over(getattr(population, need)[slot], RATES[need], floor))
+        elif not has_target:
+            candidates.append(1)  # Busy with no target left: think() wraps it up next tick
+        candidates = [c for c in candidates if c is not None]
+        if candidates:
+            due = int(self._base_tick[slot]) + min(candidates)
+            heapq.heappush(self._queue, (due, slot, int(self._version[slot])))
+
+    def _process(self, slot, tick):
+        self._materialize(np.array([slot]), tick)
+        self.world.population.owners[slot].think(self.world.world_objects)
+        self.events_processed += 1
+        self._schedule(slot)
+
+    def advance(self, duration_seconds, sync=True):
+        """Fast-forward the world by duration_seconds (rounded to whole ticks)."""
+        return self.advance_ticks(round(duration_seconds / self.world.fixed_dt), sync=sync)
+
+    def advance_ticks(self, ticks, sync=True):
+        self._adopt_new_simlings()
+        end = self.tick + ticks
+        queue = self._queue
+        while queue and queue[0][0] <= end:
+            due, slot, version = heapq.heappop(queue)
+            if version != self._version[slot] or not self.world.population.alive[slot]:
+                continue  # Superseded or released
+            self._process(slot, due)
+        self.tick = end
+        self.world.tick = end
+        self.world.time += ticks * self.world.fixed_dt
+        if sync:
+            self.sync()
+        return ticks
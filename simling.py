@@ -1,135 +1,278 @@
-import pygame
-import math
-import os # Added import os
-from objects import FoodSource, Bed
+import numpy as np
+import assets
+from spatial import closest_objects
+from utility import CLASSIC
+from population import (Population, Action, ACTIONS, ACTION_CODES, IDLE, WAITING, TALKING, NO_PARTNER,
+                        decay_needs, move_towards_targets)
+
+
+def _column(name):
+    def fget(self):
+        return getattr(self._population, name).item(self._index)
+
+    def fset(self, value):
+        getattr(self._population, name)[self._index] = value
+    return property(fget, fset)
+
+
+def _target_column(name):
+    # NaN in the array stands for "no target"
+    def fget(self):
+        value = getattr(self._population, name).item(self._index)
+        return None if value != value else value
+
+    def fset(self, value):
+        getattr(self._population, name)[self._index] = float("nan") if value is None else value
+    return property(fget, fset)
+
 
 class Simling:
+    # All per-simling state lives in a Population's arrays, the instance
+    # only knows its slot. Everything else is shared by all simlings.
+    __slots__ = ("_population", "_index")
+
     HUNGER_RATE = 0.5  # Units per second
     SLEEP_RATE = 0.3   # Units per second
     SOCIAL_RATE = 0.2  # Units per second
     FUN_RATE = 0.4     # Units per second (boredom increases)
 
-    def __init__(self, x, y):
+    # Loaded and scaled once per process on first draw, shared by every Simling
+    original_image = assets.Sprite("simling.png", original=True)
+    image = assets.Sprite("simling.png")
+    size = 20
+    color = (0, 128, 255)  # A shade of blue
+    ai = CLASSIC  # What idle simlings decide to do, unless world_objects["ai"] says otherwise (see utility.py)
+
+    def __init__(self, x, y, population=None):
+        # The attributes below are views onto this simling's slot. Without a
+        # population the simling gets one of its own, which goes away with it.
+        self._population = population if population is not None else Population(capacity=1)
+        self._index = self._population.allocate(self)
         self.x = x
         self.y = y
         self.hunger = 50.0
         self.sleep = 50.0
         self.social = 50.0
         self.fun = 50.0
-        self.color = (0, 128, 255)  # A shade of blue
-        self.size = 20
         self.speed = 50.0
         self.target_x = None
         self.target_y = None
         self.current_action = "idle"
         self.target_object = None
 
-        image_path = os.path.join("assets", "images", "simling.png")
-        try:
-            self.original_image = pygame.image.load(image_path).convert_alpha()
-            self.image = pygame.transform.scale(self.original_image, (self.size, self.size))
-        except pygame.error as e:
-            print(f"Error loading simling image: {e}")
-            # Fallback: create a placeholder surface if image loading fails
-            self.image = pygame.Surface((self.size, self.size))
-            self.image.fill(self.color)
+    x = _column("x")
+    y = _column("y")
+    speed = _column("speed")
+    hunger = _column("hunger")
+    sleep = _column("sleep")
+    social = _column("social")
+    fun = _column("fun")
+    target_x = _target_column("target_x")
+    target_y = _target_column("target_y")
+
+    @property
+    def current_action(self):
+        return ACTIONS[self._population.action[self._index]]
+
+    @current_action.setter
+    def current_action(self, value):
+        self._population.action[self._index] = ACTION_CODES[value]
+
+    @property
+    def action(self):
+        """current_action as an Action."""
+        return Action(self._population.action.item(self._index))
+
+    @property
+    def target_object(self):
+        return self._population.target_objects[self._index]
+
+    @target_object.setter
+    def target_object(self, value):
+        self._population.target_objects[self._index] = value
+
+    @property
+    def population(self):
+        return self._population
+
+    @property
+    def index(self):
+        return self._index
+
+    @classmethod
+    def rates(cls):
+        return (cls.HUNGER_RATE, cls.SLEEP_RATE, cls.SOCIAL_RATE, cls.FUN_RATE)
 
     def set_player_commanded_target(self, position):
         self.target_x = position[0]
         self.target_y = position[1]
         self.current_action = "player_commanded" # New action state
+        reservations = getattr(self.target_object, "reservations", None)
+        if reservations is not None:  # Give up any reserved or queued spot
+            reservations.release(self.target_object, self)
         self.target_object = None # Clear any autonomous target
+        self._population.partner[self._index] = NO_PARTNER  # Walk out of any conversation
 
     def draw(self, surface):
         surface.blit(self.image, (self.x, self.y))
 
+    def use_target(self):
+        """Use the object the simling went for and go back to idle."""
+        self.target_object.use(self)
+        self.current_action = "idle"
+        self.target_object = None
+
+    def _arrive(self, objects):
+        # Objects with reservations may be busy, then the simling queues up
+        reservations = getattr(objects, "reservations", None)
+        if reservations is None or reservations.arrive(self.target_object, self):
+            self.use_target()
+        else:
+            self.current_action = "waiting"
+
     def move_towards_target(self, time_delta_seconds):
-        if self.target_x is not None and self.target_y is not None:
-            dx = self.target_x - self.x
-            dy = self.target_y - self.y
-            distance = math.sqrt(dx*dx + dy*dy)
-
-            if distance < 1.0:  # Close enough, snap to target
-                self.x = self.target_x
-                self.y = self.target_y
-                self.target_x = None
-                self.target_y = None
-                return  # Arrived
-
-            normalized_dx = dx / distance
-            normalized_dy = dy / distance
-            move_amount = self.speed * time_delta_seconds
-            self.x += normalized_dx * move_amount
-            self.y += normalized_dy * move_amount
-
-            # Re-check distance after move, if overshot or very close, snap
-            new_dx = self.target_x - self.x
-            new_dy = self.target_y - self.y
-            if new_dx * dx < 0 or new_dy * dy < 0 or math.sqrt(new_dx*new_dx + new_dy*new_dy) < 1.0: # Overshot or very close
-                self.x = self.target_x
-                self.y = self.target_y
-                self.target_x = None
-                self.target_y = None
+        move_towards_targets(self._population, np.array([self._index]), time_delta_seconds)
 
     def update(self, time_delta_seconds, world_objects):
-        # Needs decay
-        self.hunger += Simling.HUNGER_RATE * time_delta_seconds
-        self.sleep += Simling.SLEEP_RATE * time_delta_seconds
-        self.social += Simling.SOCIAL_RATE * time_delta_seconds
-        self.fun += Simling.FUN_RATE * time_delta_seconds
-
-        # Clamp values between 0 and 100
-        self.hunger = max(0.0, min(100.0, self.hunger))
-        self.sleep = max(0.0, min(100.0, self.sleep))
-        self.social = max(0.0, min(100.0, self.social))
-        self.fun = max(0.0, min(100.0, self.fun))
-
+        indices = np.array([self._index])
+        # Needs decay, clamped between 0 and 100
+        decay_needs(self._population, indices, time_delta_seconds, self.rates())
         self.move_towards_target(time_delta_seconds)
+        self.think(world_objects)
+
+    @classmethod
+    def update_many(cls, time_delta_seconds, world_objects, population, indices=None, navigation=None):
+        """Advance every simling in population (or just the given slots) by one step.
+
+        Same result as calling update() on each simling in turn, but the needs
+        decay and movement are done for all of them at once and only the
+        simlings that can actually change state go through the AI logic.
+        With a navigation.Navigation, simlings path around walls instead of
+        walking straight at their targets.
+        """
+        if indices is None:
+            indices = population.indices()
+        decay_needs(population, indices, time_delta_seconds, cls.rates())
+        if navigation is not None:
+            navigation.move(population, indices, time_delta_seconds)
+        else:
+            move_towards_targets(population, indices, time_delta_seconds)
+        cls.think_many(world_objects, population, indices)
+
+    @classmethod
+    def think_many(cls, world_objects, population, indices):
+        """AI phase of update_many, for slots whose needs and positions are already advanced."""
+        ai = world_objects.get("ai", cls.ai)
+        thinking = indices[cls._wants_to_think(population, indices, world_objects, ai)]
+        idle = population.action[thinking] == IDLE
+        cls.act_on_choices(world_objects, population, thinking[idle], None, thinking[~idle])
+
+    @classmethod
+    def act_on_choices(cls, world_objects, population, deciding, choice, busy):
+        """Second half of think_many: act on what the AI chose for the idle deciding slots, then think() the busy ones.
+
+        choice is ai.decide() for deciding, worked out here if None. Both
+        deciding and busy must be in slot order to match think_many.
+        """
+        ai = world_objects.get("ai", cls.ai)
+        cls._decide_many(population, deciding, world_objects, ai, choice)
+        for index in busy:
+            population.owners[index].think(world_objects)
+
+    @classmethod
+    def _decide_many(cls, population, indices, world_objects, ai, choice=None):
+        # Batched version of the idle branch of think(): every idle simling
+        # is scored at once, then all that go for the same kind of object
+        # share one nearest-object (or reservations) query. Conversations
+        # come last, so partners are picked from who is still idle.
+        if not len(indices):
+            return
+        if choice is None:
+            choice = ai.decide(population, indices, world_objects)
+        social = []
+        for row, behavior in enumerate(ai.behaviors):
+            chosen = indices[choice == row]
+            if not len(chosen):
+                continue
+            if behavior.objects == "interactions":
+                social.append((behavior, chosen))
+            else:
+                cls._go_for_objects(population, chosen, behavior, world_objects)
+        for behavior, chosen in social:
+            cls._pair(population, chosen, behavior, world_objects, ai)
+
+    @staticmethod
+    def _go_for_objects(population, indices, behavior, world_objects):
+        objects = world_objects[behavior.objects]
+        simlings = [population.owners[index] for index in indices]
+        centers_x = [simling.x + simling.size / 2 for simling in simlings]
+        centers_y = [simling.y + simling.size / 2 for simling in simlings]
+        reservations = getattr(objects, "reservations", None)
+        if reservations is not None:
+            listed = list(objects)
+            chosen = [listed[i] for i in reservations.choose(centers_x, centers_y, population.speed[indices])]
+        else:
+            chosen = closest_objects(objects, centers_x, centers_y)
+        for simling, closest in zip(simlings, chosen):
+            center_x, center_y = closest.center
+            simling.current_action = behavior.action
+            simling.target_object = closest
+            simling.target_x = center_x - simling.size / 2
+            simling.target_y = center_y - simling.size / 2
+            if reservations is not None:
+                reservations.reserve(closest, simling)
+
+    @staticmethod
+    def _pair(population, indices, behavior, world_objects, ai):
+        # Anyone idle the AI has nothing else for makes a good partner
+        count = population.count
+        everyone = np.arange(count)
+        available = (population.alive[:count] & (population.action[:count] == IDLE) &
+                     ~ai.wants(population, everyone, world_objects, skip=behavior))
+        world_objects[behavior.objects].pair(indices, available)
+
+    @staticmethod
+    def _wants_to_think(population, indices, world_objects, ai):
+        # Superset of the simlings for which think() does anything: idle ones
+        # the AI might give something to do, and busy ones that have reached
+        # their target (except those queueing or talking, they are moved on
+        # by their Reservations or Interactions).
+        action = population.action[indices]
+        idle = action == IDLE
+        arrived = np.isnan(population.target_x[indices])
+        wants = (~idle & (action != WAITING) & (action != TALKING) & arrived)
+        if idle.any():
+            wants[idle] = ai.wants(population, indices[idle], world_objects)
+        return wants
 
+    def think(self, world_objects):
         # AI Logic
+        ai = world_objects.get("ai", self.ai)
         if self.current_action == "idle":
-            if self.hunger > 70 and world_objects.get("food_sources"): # Check for food if idle and hungry
-                closest_food = self.find_closest_object(world_objects["food_sources"])
-                if closest_food:
-                    self.current_action = "seeking_food"
-                    self.target_object = closest_food
-                    self.target_x = closest_food.x + closest_food.size / 2 - self.size / 2
-                    self.target_y = closest_food.y + closest_food.size / 2 - self.size / 2
-            elif self.sleep > 70 and world_objects.get("beds"): # Check for bed if idle and sleepy
-                closest_bed = self.find_closest_object(world_objects["beds"])
-                if closest_bed:
-                    self.current_action = "seeking_sleep"
-                    self.target_object = closest_bed
-                    self.target_x = closest_bed.x + closest_bed.size[0] / 2 - self.size / 2
-                    self.target_y = closest_bed.y + closest_bed.size[1] / 2 - self.size / 2
+            self._decide_many(self._population, np.array([self._index]), world_objects, ai)
         # Check for arrival at player-commanded destination
         elif self.current_action == "player_commanded" and self.target_x is None and self.target_y is None:
             self.current_action = "idle"
-        elif self.current_action == "seeking_food":
-            if self.target_x is None and self.target_object is not None and isinstance(self.target_object, FoodSource):
-                self.target_object.use(self)
-                self.current_action = "idle"
-                self.target_object = None
-        elif self.current_action == "seeking_sleep":
-            if self.target_x is None and self.target_object is not None and isinstance(self.target_object, Bed):
-                self.target_object.use(self)
-                self.current_action = "idle"
-                self.target_object = None
+        elif self.target_x is None:
+            behavior = ai.behavior_for(self.current_action)
+            if behavior is None:
+                return
+            if behavior.objects == "interactions":
+                if world_objects.get("interactions") is not None:
+                    world_objects["interactions"].arrive(self)
+            elif self.target_object is not None and isinstance(self.target_object, behavior.kind):
+                self._arrive(world_objects.get(behavior.objects))
 
     def find_closest_object(self, objects_list):
         if not objects_list:
             return None
+        if hasattr(objects_list, "nearest"):  # Spatially indexed, see spatial.ObjectGrid
+            return objects_list.nearest(self.x + self.size / 2, self.y + self.size / 2)
         closest_obj = None
         min_dist_sq = float('inf')
 
         for obj in objects_list:
-            if isinstance(obj, Bed):
-                obj_center_x = obj.x + obj.size[0] / 2
-                obj_center_y = obj.y + obj.size[1] / 2
-            else:  # Assuming FoodSource or similar with obj.size as a scalar
-                obj_center_x = obj.x + obj.size / 2
-                obj_center_y = obj.y + obj.size / 2
-            
+            obj_center_x, obj_center_y = obj.center
             dx = obj_center_x - (self.x + self.size / 2)
             dy = obj_center_y - (self.y + self.size / 2)
             dist_sq = dx*dx + dy*dy
@@ -0,0 +1,510 @@
+import mmap
+import operator
+import os
+import queue
+import struct
+import tempfile
+import threading
+import zlib
+import numpy as np
+
+from objects import FoodSource, Bed, Television
+from utility import CLASSIC, BALANCED
+from world import World
+
+# File layout: a fixed header, a table of sections, then every section as a
+# packed little-endian column starting on an 8-byte boundary. A loaded
+# snapshot's columns are numpy views straight onto the file's mapping.
+MAGIC = b"SIMSNAP1"
+HEADER = struct.Struct("<8sHHqdddddI")  # magic, version, flags, tick, time, fixed_dt, width, height, gauss_next, sections
+SECTION = struct.Struct("<16s8sQQ")  # name, numpy dtype string, offset, count
+VERSION = 3  # Files of version 1 may lack sections added since, see _upgrade()
+
+# The world's settings, packed into the header's flags since version 3.
+# Older files leave flags 0 and restore with World's defaults.
+CONTENTION = 0x1
+SOCIAL = 0x2
+AI_SHIFT = 8  # Position in AIS of the world's AI, in the high byte
+AIS = (CLASSIC, BALANCED)
+CUSTOM_AI = 0xFF  # Any other AI, which only restores into a world built with it
+
+# Per-simling columns copied from the Population, in file order. Target
+# objects are stored as target_kind (which table, see TARGET_KINDS) and
+# target_index (position in that table).
+SIMLING_COLUMNS = (
+    ("x", "<f8"), ("y", "<f8"), ("target_x", "<f8"), ("target_y", "<f8"), ("speed", "<f8"),
+    ("hunger", "<f8"), ("sleep", "<f8"), ("social", "<f8"), ("fun", "<f8"),
+    ("action", "<i1"), ("talk_until", "<f8"), ("serial", "<i8"),
+)
+TARGET_COLUMNS = (("target_kind", "<i1"), ("target_index", "<i4"))
+ORDER_COLUMNS = (("list_order", "<i4"),)  # Position of each simling in World.simlings
+# Conversation partner (see social.py) as a position in the snapshot's
+# simling order, -1 for none
+PARTNER_COLUMNS = (("partner_row", "<i4"),)
+# Contention state (see resources.py): per simling its place in its object's
+# queue (-1 if not queued) and since when it waits, per object kind the
+# time every slot frees up, capacity slots per object.
+QUEUE_COLUMNS = (("queue_position", "<i4"), ("queued_since", "<f8"))
+BUSY_COLUMNS = (("food_busy_until", "<f8"), ("bed_busy_until", "<f8"), ("tv_busy_until", "<f8"))
+OBJECT_COLUMNS = (
+    ("food_x", "<f8"), ("food_y", "<f8"),
+    ("bed_x", "<f8"), ("bed_y", "<f8"),
+    ("tv_x", "<f8"), ("tv_y", "<f8"),  # Televisions, section names have 16 bytes
+    ("wall_x", "<f8"), ("wall_y", "<f8"), ("wall_width", "<f8"), ("wall_height", "<f8"),
+)
+RNG_VERSION = 3  # What random.Random.getstate() reports
+TARGET_KINDS = (None, FoodSource, Bed, Television)  # target_kind code -> class
+
+
+def _grids(world):
+    # Object grids in target_kind order
+    return (None, world.food_sources, world.beds, world.televisions)
+
+
+def _align(offset):
+    return (offset + 7) // 8 * 8
+
+
+def _upgrade(columns):
+    """Columns of a version 1 snapshot with the sections it may lack filled in.
+
+    Version 1 was kept while list order, contention state, talk_until,
+    partners and televisions were added one at a time, so a version 1 file
+    has any prefix of them. What is missing gets what the world had then:
+    list order is slot order, nobody queues or talks and there are no
+    televisions. Missing busy times are left out, every slot starts free.
+    """
+    columns = dict(columns)
+    count = len(columns["x"])
+    defaults = {
+        "talk_until": np.zeros(count, dtype="<f8"),
+        "list_order": np.arange(count, dtype="<i4"),
+        "partner_row": np.full(count, -1, dtype="<i4"),
+        "queue_position": np.full(count, -1, dtype="<i4"),
+        "queued_since": np.zeros(count, dtype="<f8"),
+        "tv_x": np.zeros(0, dtype="<f8"),
+        "tv_y": np.zeros(0, dtype="<f8"),
+    }
+    for name, column in defaults.items():
+        columns.setdefault(name, column)
+    return columns
+
+
+class Snapshot:
+    """The whole state of a World as packed, fixed-width columns.
+
+    capture() copies the live simlings, food sources, beds, televisions,
+    walls and the RNG state out of a world (a handful of array copies,
+    fast enough to do in the frame loop). save() writes them out and load() maps a file back
+    without copying: columns are views onto the mapping until restore()
+    builds a World from them.
+    """
+
+    def __init__(self, header, columns, mapping=None):
+        # tick, time, fixed_dt, size, gauss_next (of the RNG state) and the
+        # contention, social and ai settings, ai as a position in AIS
+        self.header = header
+        self.columns = columns
+        self._mapping = mapping
+
+    @property
+    def tick(self):
+        return self.header["tick"]
+
+    def __len__(self):
+        return len(self.columns["x"])
+
+    @classmethod
+    def capture(cls, world):
+        # Slot order, which is the order World.step runs the AI in
+        population = world.population
+        slots = population.indices()
+        columns = {name: getattr(population, name)[slots].astype(dtype) for name, dtype in SIMLING_COLUMNS}
+        rank = np.zeros(population.capacity, dtype="<i4")
+        rank[np.fromiter(map(operator.attrgetter("index"), world.simlings), dtype=np.int64,
+                         count=len(world.simlings))] = np.arange(len(world.simlings))
+        columns["list_order"] = rank[slots]
+        row = np.full(population.capacity, -1, dtype="<i4")
+        row[slots] = np.arange(len(slots))
+        partner = population.partner[slots]
+        columns["partner_row"] = np.where(partner >= 0, row[np.maximum(partner, 0)], -1).astype("<i4")
+
+        food_sources = list(world.food_sources)
+        beds = list(world.beds)
+        televisions = list(world.televisions)
+        # Match target objects by identity, vectorized: a dict lookup per
+        # simling would dominate the capture time of big populations
+        target_kind = np.zeros(len(slots), dtype="<i1")
+        target_index = np.full(len(slots), -1, dtype="<i4")
+        table = food_sources + beds + televisions
+        if table:
+            target_ids = np.fromiter(map(id, population.target_objects), dtype=np.uint64,
+                                     count=len(population.target_objects))[slots]
+            table_ids = np.fromiter(map(id, table), dtype=np.uint64, count=len(table))
+            order = np.argsort(table_ids)
+            entry = order[np.clip(np.searchsorted(table_ids[order], target_ids), 0, len(table) - 1)]
+            found = table_ids[entry] == target_ids
+            kinds = np.array([1] * len(food_sources) + [2] * len(beds) + [3] * len(televisions))
+            positions = np.concatenate([np.arange(len(food_sources)), np.arange(len(beds)),
+                                        np.arange(len(televisions))])
+            target_kind[found] = kinds[entry[found]]
+            target_index[found] = positions[entry[found]]
+        columns["target_kind"] = target_kind
+        columns["target_index"] = target_index
+
+        walls = list(world.walls)
+        columns["food_x"] = np.array([food.x for food in food_sources], dtype="<f8")
+        columns["food_y"] = np.array([food.y for food in food_sources], dtype="<f8")
+        columns["bed_x"] = np.array([bed.x for bed in beds], dtype="<f8")
+        columns["bed_y"] = np.array([bed.y for bed in beds], dtype="<f8")
+        columns["tv_x"] = np.array([television.x for television in televisions], dtype="<f8")
+        columns["tv_y"] = np.array([television.y for television in televisions], dtype="<f8")
+        columns["wall_x"] = np.array([wall.x for wall in walls], dtype="<f8")
+        columns["wall_y"] = np.array([wall.y for wall in walls], dtype="<f8")
+        columns["wall_width"] = np.array([wall.size[0] for wall in walls], dtype="<f8")
+        columns["wall_height"] = np.array([wall.size[1] for wall in walls], dtype="<f8")
+
+        queue_position = np.full(population.capacity, -1, dtype="<i4")
+        queued_since = np.zeros(population.capacity, dtype="<f8")
+        for (name, _), objects in zip(BUSY_COLUMNS, _grids(world)[1:]):
+            busy_until = []
+            if objects.reservations is not None:
+                for obj in objects:
+                    station = objects.reservations.station(obj)
+                    busy_until.extend(station.busy_until)
+                    for position, (simling, since) in enumerate(station.queue):
+                        queue_position[simling.index] = position
+                        queued_since[simling.index] = since
+            columns[name] = np.array(busy_until, dtype="<f8")
+        columns["queue_position"] = queue_position[slots]
+        columns["queued_since"] = queued_since[slots]
+
+        _, state, gauss_next = world.rng.getstate()
+        columns["rng_state"] = np.array(state, dtype="<u4")
+        header = {
+            "tick": world.tick,
+            "time": world.time,
+            "fixed_dt": world.fixed_dt,
+            "size": tuple(world.size),
+            "gauss_next": gauss_next,
+            "contention": world.contention,
+            "social": world.interactions is not None,
+            "ai": next((code for code, ai in enumerate(AIS) if ai is world.world_objects["ai"]), CUSTOM_AI),
+        }
+        return cls(header, columns)
+
+    def rng_state(self):
+        """State tuple for random.Random.setstate()."""
+        return (RNG_VERSION, tuple(self.columns["rng_state"].tolist()), self.header["gauss_next"])
+
+    def restore(self, world=None):
+        """Build a World (or fill an empty one) with the snapshot's state.
+
+        A built world gets the contention, social and AI settings of the
+        captured one. Raises ValueError if that had an AI other than those
+        in AIS: pass an empty world made with it instead.
+        """
+        header = self.header
+        if world is None:
+            if header["ai"] >= len(AIS):
+                raise ValueError("The snapshot's world had its own AI, restore into a World built with it")
+            world = World(fixed_dt=header["fixed_dt"], size=header["size"], contention=header["contention"],
+                          social=header["social"], ai=AIS[header["ai"]])
+        columns = self.columns
+        food_sources = [world.add_food_source(x, y) for x, y in
+                        zip(columns["food_x"].tolist(), columns["food_y"].tolist())]
+        beds = [world.add_bed(x, y) for x, y in zip(columns["bed_x"].tolist(), columns["bed_y"].tolist())]
+        televisions = [world.add_television(x, y) for x, y in
+                       zip(columns["tv_x"].tolist(), columns["tv_y"].tolist())]
+        for x, y, width, height in zip(columns["wall_x"].tolist(), columns["wall_y"].tolist(),
+                                       columns["wall_width"].tolist(), columns["wall_height"].tolist()):
+            world.add_wall(x, y, width, height)
+
+        xs = columns["x"].tolist()
+        ys = columns["y"].tolist()
+        simlings = [world.add_simling(x, y) for x, y in zip(xs, ys)]
+        population = world.population
+        slots = np.array([simling.index for simling in simlings], dtype=np.int64)
+        for name, _ in SIMLING_COLUMNS:
+            if name != "serial":  # Slots get fresh serials
+                getattr(population, name)[slots] = columns[name]
+        partner_row = columns["partner_row"]
+        population.partner[slots] = np.where(partner_row >= 0, slots[np.maximum(partner_row, 0)], -1)
+        tables = (None, food_sources, beds, televisions)
+        for slot, kind, index in zip(slots.tolist(), columns["target_kind"].tolist(),
+                                     columns["target_index"].tolist()):
+            if kind:
+                population.target_objects[slot] = tables[kind][index]
+        if simlings:
+            ordered = [None] * len(simlings)
+            for simling, position in zip(simlings, columns["list_order"].tolist()):
+                ordered[position] = simling
+            world.simlings[-len(simlings):] = ordered
+
+        self._restore_contention(world, simlings, (food_sources, beds, televisions))
+        world.rng.setstate(self.rng_state())
+        world.tick = header["tick"]
+        world.time = header["time"]
+        return world
+
+    def _restore_contention(self, world, simlings, tables):
+        columns = self.columns
+        queued = []
+        for simling, kind, position, since in zip(simlings, columns["target_kind"].tolist(),
+                                                  columns["queue_position"].tolist(),
+                                                  columns["queued_since"].tolist()):
+            if kind:
+                grid = _grids(world)[kind]
+                if grid.reservations is not None:
+                    if position >= 0:
+                        queued.append((position, grid.reservations, simling, since))
+                    grid.reservations.reserve(simling.target_object, simling)
+        for _, reservations, simling, since in sorted(queued, key=lambda entry: entry[0]):
+            reservations.station(simling.target_object).queue.append((simling, since))
+        for (name, _), grid, objects in zip(BUSY_COLUMNS, _grids(world)[1:], tables):
+            if grid.reservations is None or name not in columns:  # Only upgraded snapshots lack them
+                continue
+            busy_until = columns[name].tolist()
+            for obj in objects:
+                station = grid.reservations.station(obj)
+                station.busy_until = busy_until[:station.capacity]
+                busy_until = busy_until[station.capacity:]
+
+    # Packing
+
+    def _layout(self):
+        offset = _align(HEADER.size + SECTION.size * len(self.columns))
+        layout = []
+        for name, column in self.columns.items():
+            layout.append((name, column.dtype.str, offset, len(column)))
+            offset = _align(offset + column.nbytes)
+        return layout, offset
+
+    def to_buffer(self):
+        """The snapshot as one packed uint8 array, the on-disk format."""
+        layout, size = self._layout()
+        buffer = np.zeros(size, dtype=np.uint8)
+        header = self.header
+        gauss_next = header["gauss_next"]
+        flags = (CONTENTION if header["contention"] else 0) | (SOCIAL if header["social"] else 0)
+        flags |= header["ai"] << AI_SHIFT
+        HEADER.pack_into(buffer, 0, MAGIC, VERSION, flags, header["tick"], header["time"], header["fixed_dt"],
+                         header["size"][0], header["size"][1],
+                         np.nan if gauss_next is None else gauss_next, len(layout))
+        for i, (name, dtype, offset, count) in enumerate(layout):
+            SECTION.pack_into(buffer, HEADER.size + i * SECTION.size,
+                              name.encode(), dtype.encode(), offset, count)
+            column = self.columns[name]
+            buffer[offset:offset + column.nbytes] = np.ascontiguousarray(column).view(np.uint8)
+        return buffer
+
+    @classmethod
+    def from_buffer(cls, buffer, mapping=None):
+        """Snapshot whose columns are views onto buffer (no copy)."""
+        (magic, version, flags, tick, time, fixed_dt, width, height,
+         gauss_next, sections) = HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC:
+            raise ValueError("Not a simling snapshot")
+        if not 1 <= version <= VERSION:
+            raise ValueError(f"Unsupported snapshot version {version}, this reads versions 1 to {VERSION}")
+        columns = {}
+        for i in range(sections):
+            name, dtype, offset, count = SECTION.unpack_from(buffer, HEADER.size + i * SECTION.size)
+            name = name.rstrip(b"\0").decode()
+            columns[name] = np.frombuffer(buffer, dtype=dtype.rstrip(b"\0").decode(), count=count, offset=offset)
+        if version < 2:
+            columns = _upgrade(columns)
+        header = {
+            "tick": tick,
+            "time": time,
+            "fixed_dt": fixed_dt,
+            "size": (width, height),
+            "gauss_next": None if np.isnan(gauss_next) else gauss_next,
+        }
+        if version < 3:
+            flags = CONTENTION | SOCIAL  # World's defaults, what restore() used to build for any file
+        header.update(contention=bool(flags & CONTENTION), social=bool(flags & SOCIAL), ai=flags >> AI_SHIFT)
+        return cls(header, columns, mapping)
+
+    def save(self, path):
+        """Write to path atomically: a crash mid-save leaves the old file, not half a new one."""
+        directory = os.path.dirname(os.path.abspath(path))
+        with tempfile.NamedTemporaryFile("wb", dir=directory, prefix=os.path.basename(path) + ".",
+                                         suffix=".tmp", delete=False) as f:
+            try:
+                f.write(self.to_buffer())
+            except BaseException:
+                f.close()
+                os.remove(f.name)
+                raise
+        os.replace(f.name, path)
+
+    @classmethod
+    def load(cls, path):
+        """Map path read-only; the columns stay views onto the file until close()."""
+        with open(path, "rb") as f:
+            mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls.from_buffer(mapping, mapping)
+
+    def close(self):
+        if self._mapping is not None:
+            self.columns = {}
+            self._mapping.close()
+            self._mapping = None
+
+
+# Streams: a file header followed by records. Every keyframe_interval-th
+# record, and any record whose layout differs from the previous one (e.g.
+# simlings were added), is a keyframe holding a whole packed snapshot.
+# The others hold the zlib-compressed XOR of their packed snapshot with the
+# previous one, which is mostly zero bytes from one tick to the next.
+STREAM_MAGIC = b"SIMSTRM1"
+RECORD = struct.Struct("<4sqQ")  # kind, tick, payload length
+KEYFRAME = b"KEYF"
+DELTA = b"DELT"
+
+
+class StreamWriter:
+    """Appends snapshots to a delta-encoded stream file.
+
+    With a SnapshotWriter, encoding and writing happen on its thread and
+    append() only queues the (already captured) snapshot.
+    """
+
+    def __init__(self, path, keyframe_interval=60, writer=None):
+        self.keyframe_interval = keyframe_interval
+        self.writer = writer
+        self._file = open(path, "wb")
+        self._file.write(STREAM_MAGIC)
+        self._previous = None
+        self._previous_layout = None
+        self._since_keyframe = 0
+
+    def append(self, snapshot):
+        if self.writer is not None:
+            self.writer.submit(self._write, snapshot)
+        else:
+            self._write(snapshot)
+
+    def _write(self, snapshot):
+        buffer = snapshot.to_buffer()
+        layout = snapshot._layout()
+        if (self._previous is None or layout != self._previous_layout
+                or self._since_keyframe >= self.keyframe_interval):
+            kind, payload = KEYFRAME, buffer
+            self._since_keyframe = 0
+        else:
+            kind, payload = DELTA, zlib.compress(np.bitwise_xor(buffer, self._previous), 1)
+        self._since_keyframe += 1
+        self._file.write(RECORD.pack(kind, snapshot.tick, len(payload)))
+        self._file.write(payload)
+        self._previous = buffer
+        self._previous_layout = layout
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.flush()
+        self._file.close()
+
+
+class StreamReader:
+    """Replays a stream written by StreamWriter, with seeking by tick.
+
+    Opening only reads the record headers. Keyframes are views onto the
+    mapped file; seek(tick) decodes forward from the nearest keyframe.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mapping[:len(STREAM_MAGIC)] != STREAM_MAGIC:
+            raise ValueError("Not a simling snapshot stream")
+        self.records = []  # (tick, kind, payload offset, payload length)
+        offset = len(STREAM_MAGIC)
+        while offset + RECORD.size <= len(self._mapping):
+            kind, tick, length = RECORD.unpack_from(self._mapping, offset)
+            offset += RECORD.size
+            self.records.append((tick, kind, offset, length))
+            offset += length
+        self.ticks = [record[0] for record in self.records]
+
+    def __len__(self):
+        return len(self.records)
+
+    def _keyframe_buffer(self, record):
+        _, _, offset, length = record
+        return np.frombuffer(self._mapping, dtype=np.uint8, count=length, offset=offset)
+
+    def _apply(self, buffer, record):
+        _, kind, offset, length = record
+        if kind == KEYFRAME:
+            return self._keyframe_buffer(record)
+        delta = np.frombuffer(zlib.decompress(self._mapping[offset:offset + length]), dtype=np.uint8)
+        return np.bitwise_xor(buffer, delta)
+
+    def __iter__(self):
+        buffer = None
+        for record in self.records:
+            buffer = self._apply(buffer, record)
+            yield Snapshot.from_buffer(buffer)
+
+    def seek(self, tick):
+        """Snapshot of the last record at or before tick."""
+        position = np.searchsorted(self.ticks, tick, side="right") - 1
+        if position < 0:
+            raise ValueError(f"Stream starts at tick {self.ticks[0] if self.ticks else None}")
+        start = position
+        while self.records[start][1] != KEYFRAME:
+            start -= 1
+        buffer = None
+        for record in self.records[start:position + 1]:
+            buffer = self._apply(buffer, record)
+        return Snapshot.from_buffer(buffer)
+
+    def close(self):
+        self._mapping.close()
+
+
+class SnapshotWriter:
+    """Background thread that saves snapshots so the frame loop doesn't wait on the disk.
+
+    Jobs run in submission order. At most max_pending wait in the queue,
+    after that submit() blocks rather than piling up copies of the world.
+    An error in a job is raised again from the next flush() or close().
+    """
+
+    def __init__(self, max_pending=4):
+        self._queue = queue.Queue(max_pending)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name="snapshot-writer", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            try:
+                if job is None:
+                    return
+                function, args = job
+                function(*args)
+            except Exception as error:
+                self._error = error
+            finally:
+                self._queue.task_done()
+
+    def submit(self, function, *args):
+        self._queue.put((function, args))
+
+    def save(self, snapshot, path):
+        self.submit(snapshot.save, path)
+
+    def flush(self):
+        self._queue.join()
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+        self.flush()
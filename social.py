@@ -0,0 +1,140 @@
+import math
+import numpy as np
+from picking import SimlingPicker
+from population import IDLE, SEEKING_SOCIAL, TALKING, NO_PARTNER, NEED_MIN
+from simling import Simling
+
+SOCIAL_RADIUS = 150  # How far a simling looks for someone to talk to
+CONVERSATION_SECONDS = 4.0
+CONVERSATION_RELIEF = 60  # Social need a finished conversation takes away, like FoodSource.use for hunger
+
+
+class Interactions:
+    """Conversations between simlings, which is what satisfies the social need.
+
+    An idle simling over the social threshold pairs up with the closest
+    idle simling within radius. Both walk to meet halfway, side by side,
+    and once both are there they talk for conversation_seconds. A
+    conversation that runs its course takes relief off both their social
+    needs; one cut short (a player command, a removed simling) gives
+    nothing.
+
+    Neighbors are found through a picking.SimlingPicker with radius sized
+    cells. Its sync() only re-buckets the simlings that changed cells, and
+    a query only looks at the 3 x 3 cells around the seeker, so pairing
+    stays linear in the population instead of comparing every pair.
+
+    World puts it in world_objects["interactions"], Simling looks it up
+    there. advance() moves its clock like Reservations.advance.
+    """
+
+    def __init__(self, population, radius=SOCIAL_RADIUS, conversation_seconds=CONVERSATION_SECONDS,
+                 relief=CONVERSATION_RELIEF):
+        self.population = population
+        self.radius = radius
+        self.conversation_seconds = conversation_seconds
+        self.relief = relief
+        self.neighbors = SimlingPicker(population, cell_size=radius)
+        self.time = 0.0
+        self.conversations = 0  # Started so far
+        self.finished = 0  # Of those, ran their course
+
+    def advance(self, now):
+        """Move the clock to world time now and end the conversations that are over."""
+        self.time = now
+        population = self.population
+        indices = population.indices()
+        talking = indices[population.action[indices] == TALKING]
+        if not len(talking):
+            return
+        over = population.talk_until[talking] <= now
+        left = ~self._paired(talking, (TALKING,))
+        done = talking[over & ~left]
+        social = population.social[done] - self.relief
+        population.social[done] = np.maximum(social, NEED_MIN)
+        ended = talking[over | left]
+        population.action[ended] = IDLE
+        population.partner[ended] = NO_PARTNER
+        self.finished += len(done) // 2
+
+    def _paired(self, slots, actions):
+        # Whether each slot's partner is alive, has it as partner too and is in one of actions
+        population = self.population
+        partner = population.partner[slots]
+        valid = partner != NO_PARTNER
+        other = np.where(valid, partner, 0)
+        return (valid & population.alive[other] & (population.partner[other] == slots)
+                & np.isin(population.action[other], actions))
+
+    def pair(self, indices, available=None):
+        """Find a partner for each idle simling in indices, in order. Returns the number of pairs made.
+
+        Partners are the simlings nearby that available (a mask over the
+        first population.count slots) allows, by default anyone idle. They
+        needn't want to talk themselves. Ties in distance go to the lower
+        slot.
+        """
+        population = self.population
+        if len(population) < 2:
+            return 0
+        self.neighbors.sync()
+        count = population.count
+        if available is None:
+            available = population.alive[:count] & (population.action[:count] == IDLE)
+        else:
+            available = available.copy()
+        pairs = 0
+        for slot in np.asarray(indices).tolist():
+            if population.action[slot] != IDLE:  # Picked as a partner earlier in this batch
+                continue
+            x = population.x[slot]
+            y = population.y[slot]
+            near = self.neighbors.within(x, y, self.radius)
+            near = near[available[near] & (near != slot)]
+            if not len(near):
+                continue
+            dx = population.x[near] - x
+            dy = population.y[near] - y
+            partner = int(near[np.argmin(dx * dx + dy * dy)])
+            self._meet(slot, partner)
+            available[[slot, partner]] = False
+            pairs += 1
+        self.conversations += pairs
+        return pairs
+
+    def _meet(self, slot, partner):
+        population = self.population
+        x, y = population.x[slot], population.y[slot]
+        dx = population.x[partner] - x
+        dy = population.y[partner] - y
+        distance = math.sqrt(dx * dx + dy * dy)
+        ux, uy = (dx / distance, dy / distance) if distance > 0 else (1.0, 0.0)
+        middle_x, middle_y = x + dx / 2, y + dy / 2
+        half = Simling.size / 2
+        for me, other, side in ((slot, partner, -half), (partner, slot, half)):
+            population.action[me] = SEEKING_SOCIAL
+            population.partner[me] = other
+            population.target_objects[me] = None
+            population.target_x[me] = middle_x + ux * side
+            population.target_y[me] = middle_y + uy * side
+
+    def arrive(self, simling):
+        """simling got to the meeting place. Starts talking if its partner is there too."""
+        population = self.population
+        slot = simling.index
+        if not self._paired(np.array([slot]), (SEEKING_SOCIAL,))[0]:
+            simling.current_action = "idle"  # Partner went elsewhere
+            population.partner[slot] = NO_PARTNER
+            return
+        partner = population.partner[slot]
+        if population.target_x[partner] == population.target_x[partner]:  # Not NaN, still walking
+            return
+        population.action[[slot, partner]] = TALKING
+        population.talk_until[[slot, partner]] = self.time + self.conversation_seconds
+
+    def partner_of(self, simling):
+        """The simling simling is meeting or talking with, or None."""
+        slot = simling.index
+        if not self._paired(np.array([slot]), (SEEKING_SOCIAL, TALKING))[0]:
+            return None
+        return self.population.owners[self.population.partner[slot]]
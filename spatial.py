@@ -0,0 +1,429 @@
+import math
+import numpy as np
+
+BRUTE_FORCE = 64  # Up to this many objects, nearest queries compare with all of them
+CHUNK_ROWS = 4096  # Points handled at once by k-nearest queries
+CHUNK_ENTRIES = 1 << 20  # Cap on points x candidate objects handled at once
+
+
+class ObjectGrid:
+    """Uniform grid over world objects, bucketed by object center.
+
+    Stands in for the plain lists in world_objects: it can be iterated,
+    len()'d and appended to, and keeps insertion order. On top of that it
+    answers rectangle queries from its cell_size cells, and nearest-center
+    queries from an index with cells sized to the objects (see
+    nearest_many()). Ties are broken by insertion order, so results match
+    a linear scan of the same list.
+
+    Objects that move must be reported with move(obj) to stay indexed.
+    """
+
+    def __init__(self, objects=(), cell_size=64):
+        self.cell_size = cell_size
+        self._cells = {}    # (col, row) -> list of objects
+        self._entries = {}  # obj -> (cell, seq, center_x, center_y), in insertion order
+        self._next_seq = 0
+        self.version = 0  # Bumped on every change, lets caches know they're stale
+        self.reservations = None  # Optional resources.Reservations for the objects
+        self.max_extent = 0  # Largest width or height of any object added, for overlap queries
+        self._index = None  # Arrays for nearest-center queries, see _nearest_index()
+        for obj in objects:
+            self.append(obj)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __iter__(self):
+        return iter(list(self._entries))
+
+    def __contains__(self, obj):
+        return obj in self._entries
+
+    def __getitem__(self, position):
+        return list(self._entries)[position]
+
+    def cell_of(self, x, y):
+        return (math.floor(x / self.cell_size), math.floor(y / self.cell_size))
+
+    def append(self, obj):
+        if obj in self._entries:
+            return
+        center_x, center_y = obj.center
+        cell = self.cell_of(center_x, center_y)
+        self._entries[obj] = (cell, self._next_seq, center_x, center_y)
+        self._next_seq += 1
+        self._cells.setdefault(cell, []).append(obj)
+        self.max_extent = max(self.max_extent, *_extent(obj))
+        self.version += 1
+
+    add = append
+
+    def extend(self, objects):
+        for obj in objects:
+            self.append(obj)
+
+    def remove(self, obj):
+        cell = self._entries.pop(obj)[0]
+        bucket = self._cells[cell]
+        bucket.remove(obj)
+        if not bucket:
+            del self._cells[cell]
+        self.version += 1
+
+    def move(self, obj):
+        """Re-index obj after its position changed. Keeps its place in the ordering."""
+        cell, seq, _, _ = self._entries[obj]
+        center_x, center_y = obj.center
+        new_cell = self.cell_of(center_x, center_y)
+        self._entries[obj] = (new_cell, seq, center_x, center_y)
+        if new_cell != cell:
+            bucket = self._cells[cell]
+            bucket.remove(obj)
+            if not bucket:
+                del self._cells[cell]
+            self._cells.setdefault(new_cell, []).append(obj)
+        self.max_extent = max(self.max_extent, *_extent(obj))
+        self.version += 1
+
+    def nearest(self, x, y):
+        """Object whose center is closest to (x, y), or None if the grid is empty."""
+        if len(self._entries) > BRUTE_FORCE:
+            return self._nearest_in_index(x, y)
+        best = None
+        best_distance = math.inf
+        for obj, (_, _, center_x, center_y) in self._entries.items():
+            dx = center_x - x
+            dy = center_y - y
+            distance = dx*dx + dy*dy
+            if distance < best_distance:  # Strictly, so ties stay with the first inserted
+                best, best_distance = obj, distance
+        return best
+
+    def nearest_many(self, xs, ys):
+        """Batched nearest(): one object (or None) per query point.
+
+        Up to BRUTE_FORCE objects every query is compared with all of them.
+        Past that the queries search a separate index whose cells are sized
+        to hold about one object each, all queries together ring by ring,
+        and stop once nothing further out can be closer than what they have.
+        """
+        xs = np.asarray(xs, dtype=np.float64)
+        ys = np.asarray(ys, dtype=np.float64)
+        if not self._entries or not len(xs):
+            return [None] * len(xs)
+        index = self._nearest_index()
+        objects = index["objects"]
+        if len(objects) <= BRUTE_FORCE:
+            winners = _closest_centers(index["centers"], xs, ys)
+        else:
+            winners = self._ring_search(index, xs, ys)
+        return [objects[i] for i in winners.tolist()]
+
+    def nearest_k(self, xs, ys, k):
+        """The k objects closest to each query point, as positions into list(self), closest first.
+
+        One row per point with min(k, len(self)) columns. Ties go to the
+        first inserted, as everywhere else.
+        """
+        xs = np.asarray(xs, dtype=np.float64)
+        ys = np.asarray(ys, dtype=np.float64)
+        k = min(k, len(self._entries))
+        if not k or not len(xs):
+            return np.zeros((len(xs), k), dtype=np.int64)
+        index = self._nearest_index()
+        if len(index["objects"]) > BRUTE_FORCE:
+            return self._window_search(index, xs, ys, k)
+        centers = index["centers"]
+        result = np.empty((len(xs), k), dtype=np.int64)
+        chunk = max(1, 1_000_000 // len(centers))
+        for start in range(0, len(xs), chunk):
+            dx = centers[None, :, 0] - xs[start:start + chunk, None]
+            dy = centers[None, :, 1] - ys[start:start + chunk, None]
+            result[start:start + chunk] = np.argsort(dx*dx + dy*dy, axis=1, kind="stable")[:, :k]
+        return result
+
+    def _nearest_index(self):
+        # Objects in insertion order and a CSR layout of them over cells sized
+        # from their count and extent, rebuilt when the grid changes
+        index = self._index
+        if index is not None and index["version"] == self.version:
+            return index
+        objects = list(self._entries)
+        centers = np.array([entry[2:] for entry in self._entries.values()], dtype=np.float64)
+        index = {"version": self.version, "objects": objects, "centers": centers}
+        if len(objects) > BRUTE_FORCE:
+            low = centers.min(axis=0)
+            width, height = centers.max(axis=0) - low
+            cell = max(math.sqrt(width * height / len(objects)), max(width, height) / len(objects), 1.0)
+            cols, rows = np.floor((centers - low) / cell).astype(np.int64).T
+            columns = int(cols.max()) + 1
+            ids = rows * columns + cols
+            order = np.argsort(ids, kind="stable")  # Insertion order within a cell
+            row_count = int(rows.max()) + 1
+            starts = np.searchsorted(ids[order], np.arange(columns * row_count + 1))
+            # Summed-area table of objects per cell, for counting the objects in a window at once
+            table = np.zeros((row_count + 1, columns + 1), dtype=np.int64)
+            table[1:, 1:] = np.diff(starts).reshape(row_count, columns).cumsum(axis=0).cumsum(axis=1)
+            index.update(low=low, cell=cell, columns=columns, rows=row_count, order=order, starts=starts,
+                         table=table)
+        self._index = index
+        return index
+
+    def _nearest_in_index(self, x, y):
+        # nearest() for one point, the same rings as _ring_search() without numpy's per-call overhead
+        index = self._nearest_index()
+        if "lists" not in index:
+            index["lists"] = (index["starts"].tolist(), index["order"].tolist(),
+                              index["centers"][:, 0].tolist(), index["centers"][:, 1].tolist())
+        starts, order, centers_x, centers_y = index["lists"]
+        cell, columns, rows = index["cell"], index["columns"], index["rows"]
+        col = math.floor((x - index["low"][0]) / cell)
+        row = math.floor((y - index["low"][1]) / cell)
+        radius = max(0, -col, col - (columns - 1), -row, row - (rows - 1))
+        last = max(col, columns - 1 - col, row, rows - 1 - row)
+        best = None
+        best_key = (math.inf, 0)
+        while True:
+            if radius == 0:
+                cells = [row * columns + col]
+            else:
+                cells = []
+                first, end = max(col - radius, 0), min(col + radius, columns - 1)
+                for edge in (row - radius, row + radius):
+                    if 0 <= edge < rows:
+                        cells.extend(range(edge * columns + first, edge * columns + end + 1))
+                first, end = max(row - radius + 1, 0), min(row + radius - 1, rows - 1)
+                for edge in (col - radius, col + radius):
+                    if 0 <= edge < columns:
+                        cells.extend(range(first * columns + edge, end * columns + edge + 1, columns))
+            for cell_id in cells:
+                for position in range(starts[cell_id], starts[cell_id + 1]):
+                    i = order[position]
+                    dx = centers_x[i] - x
+                    dy = centers_y[i] - y
+                    key = (dx*dx + dy*dy, i)
+                    if key < best_key:
+                        best, best_key = i, key
+            reach = radius * cell
+            if best_key[0] < reach * reach or radius >= last:
+                return index["objects"][best]
+            radius += 1
+
+    @staticmethod
+    def _window_search(index, xs, ys, k):
+        # The k closest objects to each point, closest first: find the smallest
+        # square of cells around each point holding k objects, the kth closest
+        # of those bounds how far the real kth closest can be, and the square
+        # reaching that far holds all k.
+        cell, columns, rows = index["cell"], index["columns"], index["rows"]
+        query_cols = np.floor((xs - index["low"][0]) / cell).astype(np.int64)
+        query_rows = np.floor((ys - index["low"][1]) / cell).astype(np.int64)
+        low = np.maximum.reduce([np.zeros_like(query_cols), -query_cols, query_cols - (columns - 1),
+                                 -query_rows, query_rows - (rows - 1)])
+        last = np.maximum.reduce([query_cols, columns - 1 - query_cols, query_rows, rows - 1 - query_rows])
+        high = last.copy()
+        while (low < high).any():  # Binary search for the smallest square holding k
+            middle = (low + high) // 2
+            enough = _window_count(index, query_cols, query_rows, middle) >= k
+            high = np.where(enough, middle, high)
+            low = np.where(enough, low, middle + 1)
+        kth = _closest_in_windows(index, xs, ys, query_cols, query_rows, high, k, sort=False)
+        reach = np.minimum(np.floor(np.sqrt(kth) / cell).astype(np.int64) + 1, last)
+        return _closest_in_windows(index, xs, ys, query_cols, query_rows, reach, k, sort=True)
+
+    @staticmethod
+    def _ring_search(index, xs, ys):
+        # The closest object to each point: all points walk out ring by ring
+        # together, each until what it found is closer than the next ring
+        centers, cell, starts, order = index["centers"], index["cell"], index["starts"], index["order"]
+        columns, rows = index["columns"], index["rows"]
+        query_cols = np.floor((xs - index["low"][0]) / cell).astype(np.int64)
+        query_rows = np.floor((ys - index["low"][1]) / cell).astype(np.int64)
+        # Rings closer than the occupied cells are empty, start at the first one that isn't
+        radius = np.maximum.reduce([np.zeros_like(query_cols), -query_cols, query_cols - (columns - 1),
+                                    -query_rows, query_rows - (rows - 1)])
+        last = np.maximum.reduce([query_cols, columns - 1 - query_cols, query_rows, rows - 1 - query_rows])
+        best_distance = np.full(len(xs), np.inf)
+        best = np.full(len(xs), len(centers), dtype=np.int64)
+        active = np.arange(len(xs))
+        while len(active):
+            r = radius[active]
+            col, row = query_cols[active], query_rows[active]
+            # The ring's four sides as runs of cells, clipped to the occupied ones:
+            # top and bottom rows across, left and right columns between them
+            fixed = np.concatenate([row - r, row + r, col - r, col + r])
+            low = np.concatenate([col - r, col - r, row - r + 1, row - r + 1])
+            high = np.concatenate([col + r, col + r, row + r - 1, row + r - 1])
+            across = np.repeat([True, True, False, False], len(active))
+            fixed_limit = np.where(across, rows, columns)
+            low = np.maximum(low, 0)
+            high = np.minimum(high, np.where(across, columns, rows) - 1)
+            lengths = np.where((fixed >= 0) & (fixed < fixed_limit), np.maximum(high - low + 1, 0), 0)
+            lengths[len(active):] *= np.tile(r > 0, 3)  # A ring of radius 0 is the one cell
+            run = np.repeat(np.arange(len(lengths)), lengths)
+            step = np.arange(len(run)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+            along = low[run] + step
+            cells = np.where(across[run], fixed[run] * columns + along, along * columns + fixed[run])
+            # Every object in those cells, against its query
+            counts = starts[cells + 1] - starts[cells]
+            pair_run = np.repeat(run, counts)
+            first = np.repeat(starts[cells] - np.cumsum(counts) + counts, counts)
+            candidates = order[first + np.arange(len(first))]
+            queries = active[pair_run % len(active)]
+            dx = centers[candidates, 0] - xs[queries]
+            dy = centers[candidates, 1] - ys[queries]
+            distances = dx * dx + dy * dy
+            previous = best_distance.copy()
+            np.minimum.at(best_distance, queries, distances)
+            # Ties go to the first inserted, the lowest position in objects
+            tied = distances == best_distance[queries]
+            closest = np.full(len(xs), len(centers), dtype=np.int64)
+            np.minimum.at(closest, queries[tied], candidates[tied])
+            best = np.where(best_distance < previous, closest, np.minimum(best, closest))
+            # Anything in further rings is at least radius cells away
+            reach = radius[active] * cell
+            done = (best_distance[active] < reach * reach) | (radius[active] >= last[active])
+            radius[active] += 1
+            active = active[~done]
+        return best
+
+    def query_rect(self, left, top, width, height):
+        """Objects whose center lies inside the given rectangle."""
+        right = left + width
+        bottom = top + height
+        min_col, min_row = self.cell_of(left, top)
+        max_col, max_row = self.cell_of(right, bottom)
+        span = (max_col - min_col + 1) * (max_row - min_row + 1)
+        if span <= len(self._cells):
+            cells = ((c, r) for c in range(min_col, max_col + 1) for r in range(min_row, max_row + 1))
+        else:
+            cells = [cell for cell in self._cells
+                     if min_col <= cell[0] <= max_col and min_row <= cell[1] <= max_row]
+        found = []
+        for cell in cells:
+            for obj in self._cells.get(cell, ()):
+                _, _, center_x, center_y = self._entries[obj]
+                if left <= center_x < right and top <= center_y < bottom:
+                    found.append(obj)
+        return found
+
+    def query_overlapping(self, left, top, width, height):
+        """Objects whose box (x, y, size) overlaps the given rectangle, in insertion order.
+
+        E.g. what a camera view has to draw. Objects are indexed by center,
+        so the search reaches out by half the largest object seen.
+        """
+        pad = self.max_extent / 2
+        found = []
+        for obj in self.query_rect(left - pad, top - pad, width + 2 * pad, height + 2 * pad):
+            obj_width, obj_height = _extent(obj)
+            if obj.x < left + width and obj.x + obj_width > left and obj.y < top + height and obj.y + obj_height > top:
+                found.append(obj)
+        found.sort(key=lambda obj: self._entries[obj][1])
+        return found
+
+
+def _window_bounds(index, cols, rows, radius):
+    # Cells radius or fewer away from (cols, rows), clipped to the index: first and last column and row
+    col_low = np.maximum(cols - radius, 0)
+    col_high = np.minimum(cols + radius, index["columns"] - 1)
+    row_low = np.maximum(rows - radius, 0)
+    row_high = np.minimum(rows + radius, index["rows"] - 1)
+    return col_low, col_high, row_low, row_high
+
+
+def _window_count(index, cols, rows, radius):
+    col_low, col_high, row_low, row_high = _window_bounds(index, cols, rows, radius)
+    empty = (col_low > col_high) | (row_low > row_high)
+    col_high, row_high = np.maximum(col_high, col_low - 1), np.maximum(row_high, row_low - 1)
+    table = index["table"]
+    count = (table[row_high + 1, col_high + 1] - table[row_low, col_high + 1] -
+             table[row_high + 1, col_low] + table[row_low, col_low])
+    return np.where(empty, 0, count)
+
+
+def _closest_in_windows(index, xs, ys, cols, rows, radius, k, sort):
+    # The k closest objects in each point's window, closest first (sort), or
+    # just the kth smallest squared distance. Points are handled in groups of
+    # similar window sizes, each padded out to a matrix.
+    counts = _window_count(index, cols, rows, radius)
+    by_count = np.argsort(counts, kind="stable")
+    result = np.empty((len(xs), k), dtype=np.int64) if sort else np.empty(len(xs))
+    start = 0
+    while start < len(xs):
+        width = max(int(counts[by_count[min(start + CHUNK_ROWS, len(xs)) - 1]]), 1)
+        stop = start + max(1, min(CHUNK_ROWS, CHUNK_ENTRIES // width))
+        stop = min(stop, len(xs))
+        width = int(counts[by_count[stop - 1]])
+        queries = by_count[start:stop]
+        candidates = _window_objects(index, cols[queries], rows[queries], radius[queries], width)
+        centers = index["centers"]
+        padding = candidates == len(centers)
+        picked = np.minimum(candidates, len(centers) - 1)
+        dx = centers[picked, 0] - xs[queries, None]
+        dy = centers[picked, 1] - ys[queries, None]
+        distances = np.where(padding, np.inf, dx * dx + dy * dy)
+        if sort:
+            # By position first so the stable sort by distance leaves ties in insertion order
+            by_position = np.argsort(candidates, axis=1)
+            candidates = np.take_along_axis(candidates, by_position, axis=1)
+            distances = np.take_along_axis(distances, by_position, axis=1)
+            closest = np.argsort(distances, axis=1, kind="stable")[:, :k]
+            result[queries] = np.take_along_axis(candidates, closest, axis=1)
+        else:
+            result[queries] = np.partition(distances, k - 1, axis=1)[:, k - 1]
+        start = stop
+    return result
+
+
+def _window_objects(index, cols, rows, radius, width):
+    # Objects in each window as a row of positions, padded with len(objects)
+    col_low, col_high, row_low, row_high = _window_bounds(index, cols, rows, radius)
+    span = np.maximum(col_high - col_low + 1, 0)
+    cell_counts = span * np.maximum(row_high - row_low + 1, 0)
+    owner = np.repeat(np.arange(len(cols)), cell_counts)
+    step = np.arange(len(owner)) - np.repeat(np.cumsum(cell_counts) - cell_counts, cell_counts)
+    cells = (row_low[owner] + step // span[owner]) * index["columns"] + col_low[owner] + step % span[owner]
+    starts = index["starts"]
+    counts = starts[cells + 1] - starts[cells]
+    object_owner = np.repeat(owner, counts)
+    first = np.repeat(starts[cells] - np.cumsum(counts) + counts, counts)
+    found = index["order"][first + np.arange(len(first))]
+    per_row = np.bincount(object_owner, minlength=len(cols))
+    column = np.arange(len(found)) - np.repeat(np.cumsum(per_row) - per_row, per_row)
+    result = np.full((len(cols), max(width, 1)), len(index["centers"]), dtype=np.int64)
+    result[object_owner, column] = found
+    return result
+
+
+def _extent(obj):
+    # size is a number for square objects, (width, height) otherwise
+    return obj.size if isinstance(obj.size, tuple) else (obj.size, obj.size)
+
+
+def closest_objects(objects, xs, ys):
+    """Closest object to each query point, for a grid or a plain list.
+
+    Plain lists are handled with a brute-force vectorized scan that keeps
+    the first-in-list tie-break of Simling.find_closest_object.
+    """
+    if hasattr(objects, "nearest_many"):
+        return objects.nearest_many(xs, ys)
+    objects = list(objects)
+    if not objects:
+        return [None] * len(xs)
+    centers = np.array([obj.center for obj in objects], dtype=np.float64)
+    winners = _closest_centers(centers, np.asarray(xs, dtype=np.float64), np.asarray(ys, dtype=np.float64))
+    return [objects[i] for i in winners.tolist()]
+
+
+def _closest_centers(centers, xs, ys):
+    # Position in centers of the closest one to each point, first on ties
+    winners = np.empty(len(xs), dtype=np.int64)
+    chunk = max(1, 1_000_000 // len(centers))
+    for start in range(0, len(xs), chunk):
+        dx = centers[None, :, 0] - xs[start:start + chunk, None]
+        dy = centers[None, :, 1] - ys[start:start + chunk, None]
+        winners[start:start + chunk] = np.argmin(dx*dx + dy*dy, axis=1)
+    return winners
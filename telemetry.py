@@ -0,0 +1,390 @@
+"""Stream world state and per-tick metrics to external dashboards, and log without blocking.
+
+    SIMLING_TELEMETRY=8765 python main.py   # Serve on localhost:8765 while playing
+    python telemetry.py 8765                # Watch the metrics from another terminal
+
+Subscribers connect over TCP and get messages: "keyframe" with every
+simling, then "delta" with only the simlings whose (rounded) values
+changed and the ones that are gone, each with the tick's metrics. Every
+message is a line of JSON, followed by its "bytes" of raw little-endian
+arrays when it has any: the per-simling "columns" it lists, "count"
+values each, then the "removed" ids. read_message() reads one from a
+stream and apply_message() turns them back into the full state.
+
+The server runs an asyncio loop on its own thread. publish(), called by
+the frame loop, only copies a few columns and hands them over through a
+bounded queue that drops the oldest frame when full; encoding and
+sending happen on the server thread. Columns go out as the arrays they
+are rather than JSON, whose encoding holds the GIL long enough at 100k
+simlings to stall the frame loop. Every client has its own bounded
+queue as well: a client that can't keep up loses frames (and gets a
+fresh keyframe once it catches up) instead of holding anyone else up.
+"""
+import argparse
+import asyncio
+import collections
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import socket
+import sys
+import threading
+import time
+import numpy as np
+
+from population import ACTIONS, NEEDS
+
+# Sent per simling, keyed by serial, with the decimals they are rounded to
+# before comparing so a delta only carries what changed visibly.
+STATE_COLUMNS = (("x", 1), ("y", 1), ("action", None)) + tuple((need, 1) for need in NEEDS)
+
+
+def capture_frame(world, frame_seconds=None):
+    """The per-simling columns and metrics of world right now, as numpy copies and plain numbers.
+
+    This is the part of publishing that runs on the simulation thread, so
+    it only copies; rounding and comparing wait for DeltaEncoder.
+    """
+    population = world.population
+    slots = population.indices()
+    columns = {"id": population.serial[slots]}
+    for name, _ in STATE_COLUMNS:
+        columns[name] = getattr(population, name)[slots]
+    actions = np.bincount(columns["action"], minlength=len(ACTIONS))
+    metrics = {
+        "tick": world.tick,
+        "time": round(world.time, 3),
+        "simlings": len(slots),
+        "actions": {name: int(count) for name, count in zip(ACTIONS, actions.tolist()) if count},
+        "needs": {need: round(float(columns[need].mean()), 2) if len(slots) else 0.0 for need in NEEDS},
+        "queued": sum(reservations.queued() for reservations in world.reservations()),
+    }
+    if world.interactions is not None:
+        metrics["conversations"] = world.interactions.conversations
+    if frame_seconds is not None:
+        metrics["frame_ms"] = round(frame_seconds * 1000, 2)
+    return columns, metrics
+
+
+class DeltaEncoder:
+    """Turns a sequence of captured frames into keyframe and delta messages.
+
+    Messages hold the simlings as numpy columns sorted by id, actions as
+    their codes, and the removed ids as an array.
+    """
+
+    def __init__(self, keyframe_interval=300):
+        self.keyframe_interval = keyframe_interval
+        self._previous = None  # Columns of the last frame encoded, sorted by id
+        self._since_keyframe = 0
+
+    def encode(self, columns, metrics, keyframe=False):
+        order = np.argsort(columns["id"], kind="stable")
+        columns = {"id": columns["id"][order]} | {
+            name: columns[name][order] if decimals is None else np.round(columns[name][order], decimals)
+            for name, decimals in STATE_COLUMNS}
+        previous = self._previous
+        self._previous = columns
+        if keyframe or previous is None or self._since_keyframe >= self.keyframe_interval:
+            self._since_keyframe = 1
+            return {"type": "keyframe", "metrics": metrics, "simlings": columns}
+        self._since_keyframe += 1
+        return self.delta(previous, columns, metrics)
+
+    def keyframe(self, metrics):
+        """Keyframe of the last encoded frame, e.g. for a client that lost frames."""
+        return {"type": "keyframe", "metrics": metrics, "simlings": self._previous}
+
+    @staticmethod
+    def delta(previous, columns, metrics):
+        """Message with the simlings in columns that are new or differ from previous, both sorted by id."""
+        ids, previous_ids = columns["id"], previous["id"]
+        changed = np.ones(len(ids), dtype=bool)
+        if len(previous_ids):
+            position = np.minimum(np.searchsorted(previous_ids, ids), len(previous_ids) - 1)
+            changed = previous_ids[position] != ids
+            for name, _ in STATE_COLUMNS:
+                changed |= previous[name][position] != columns[name]
+        removed = np.setdiff1d(previous_ids, ids, assume_unique=True)
+        return {"type": "delta", "metrics": metrics,
+                "simlings": {name: column[changed] for name, column in columns.items()}, "removed": removed}
+
+
+def apply_message(state, message):
+    """Update state (id -> dict of values, actions by name) with a keyframe or delta message. Returns state."""
+    simlings = message["simlings"]
+    values = {name: [ACTIONS[code] for code in column.tolist()] if name == "action" else column.tolist()
+              for name, column in simlings.items() if name != "id"}
+    if message["type"] == "keyframe":
+        state.clear()
+    for i, simling_id in enumerate(simlings["id"].tolist()):
+        state[simling_id] = {name: column[i] for name, column in values.items()}
+    for simling_id in message.get("removed", np.zeros(0, dtype=np.int64)).tolist():
+        state.pop(simling_id, None)
+    return state
+
+
+def encode_message(message):
+    """message as sent: a JSON line, then the raw bytes of its columns and removed ids if it has them."""
+    if "simlings" not in message:
+        return (json.dumps(message, separators=(",", ":")) + "\n").encode()
+    arrays = [np.ascontiguousarray(column, dtype=column.dtype.newbyteorder("<"))
+              for column in message["simlings"].values()]
+    removed = np.ascontiguousarray(message.get("removed", np.zeros(0)), dtype="<i8")
+    header = {key: value for key, value in message.items() if key not in ("simlings", "removed")}
+    header.update(
+        count=len(arrays[0]) if arrays else 0,
+        columns=[[name, array.dtype.str] for name, array in zip(message["simlings"], arrays)],
+        removed=len(removed),
+        bytes=sum(array.nbytes for array in arrays) + removed.nbytes,
+    )
+    return b"".join([(json.dumps(header, separators=(",", ":")) + "\n").encode(),
+                     *(array.tobytes() for array in arrays), removed.tobytes()])
+
+
+def read_message(stream):
+    """Next message from a binary stream (e.g. socket.makefile("rb")), None once it ends."""
+    line = stream.readline()
+    if not line:
+        return None
+    message = json.loads(line)
+    if "bytes" not in message:
+        return message
+    payload = stream.read(message.pop("bytes"))
+    count = message.pop("count")
+    simlings = {}
+    offset = 0
+    for name, dtype in message.pop("columns"):
+        simlings[name] = np.frombuffer(payload, dtype=dtype, count=count, offset=offset)
+        offset += simlings[name].nbytes
+    message["simlings"] = simlings
+    message["removed"] = np.frombuffer(payload, dtype="<i8", count=message["removed"], offset=offset)
+    return message
+
+
+class _Client:
+
+    def __init__(self, writer, max_queued):
+        self.writer = writer
+        self.queue = asyncio.Queue(max_queued)
+        self.resync = True  # The next message it gets must be a keyframe
+        self.dropped = 0
+        self.task = asyncio.current_task()
+
+
+class TelemetryServer:
+    """Local TCP server streaming world state to subscribers, off the simulation thread.
+
+    publish() never blocks: frames wait in a queue of max_pending that
+    drops the oldest. Each client has a queue of client_queue encoded
+    messages; when it is full, what the client hasn't read yet is thrown
+    away and replaced with a keyframe, so its deltas always apply to the
+    state it has. Stats: published, dropped (frames the server thread
+    didn't get to) and client_dropped (messages clients missed). With
+    rate, at most that many frames a second are published, so a frame
+    loop can call publish() every frame and dashboards still get a few.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, max_pending=4, client_queue=16, keyframe_interval=300,
+                 every=1, rate=None):
+        self.host = host
+        self.every = every  # Publish every nth call only
+        self.rate = rate  # Frames per second at most, None for no limit
+        self._last_published = -np.inf
+        self.max_pending = max_pending
+        self.client_queue = client_queue
+        self._encoder = DeltaEncoder(keyframe_interval)
+        self._pending = collections.deque()
+        self._pending_lock = threading.Lock()
+        self._clients = set()
+        self._calls = 0
+        self.published = 0
+        self.dropped = 0
+        self.client_dropped = 0
+        self._loop = asyncio.new_event_loop()
+        self._wakeup = None
+        self._server = None
+        self._error = None  # Why the server couldn't start, e.g. the port is taken
+        started = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(port, started), name="telemetry", daemon=True)
+        self._thread.start()
+        started.wait()
+        if self._error is not None:
+            self._thread.join()
+            raise self._error
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    @classmethod
+    def from_env(cls, environ=None, **options):
+        """Server on the port in SIMLING_TELEMETRY, or None if that isn't set. options go to the constructor."""
+        environ = os.environ if environ is None else environ
+        port = environ.get("SIMLING_TELEMETRY")
+        return cls(port=int(port), **options) if port else None
+
+    @property
+    def clients(self):
+        return len(self._clients)
+
+    def publish(self, world, frame_seconds=None):
+        """Queue world's current state for the subscribers. Cheap when nobody is listening."""
+        self._calls += 1
+        if not self._clients or (self._calls - 1) % self.every:
+            return False
+        now = time.monotonic()
+        if self.rate is not None and now - self._last_published < 1 / self.rate:
+            return False
+        self._last_published = now
+        frame = capture_frame(world, frame_seconds)
+        with self._pending_lock:
+            self._pending.append(frame)
+            if len(self._pending) > self.max_pending:
+                self._pending.popleft()
+                self.dropped += 1
+        self.published += 1
+        self._loop.call_soon_threadsafe(self._wakeup.set)
+        return True
+
+    def close(self):
+        if self._thread.is_alive():
+            self._loop.call_soon_threadsafe(self._stop.set)
+            self._thread.join()
+
+    # Server thread
+
+    def _run(self, port, started):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_until_complete(self._serve(port, started))
+        self._loop.close()
+
+    async def _serve(self, port, started):
+        self._wakeup = asyncio.Event()
+        self._stop = asyncio.Event()
+        try:
+            self._server = await asyncio.start_server(self._handle, self.host, port)
+        except Exception as error:
+            self._error = error
+            return
+        finally:
+            started.set()
+        encoder = asyncio.ensure_future(self._encode_loop())
+        await self._stop.wait()
+        encoder.cancel()
+        self._server.close()
+        tasks = [client.task for client in self._clients]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(encoder, *tasks, return_exceptions=True)
+        await self._server.wait_closed()
+
+    async def _encode_loop(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while True:
+                with self._pending_lock:
+                    if not self._pending:
+                        break
+                    columns, metrics = self._pending.popleft()
+                message = self._encoder.encode(columns, metrics)
+                data = encode_message(message)
+                keyframe = data if message["type"] == "keyframe" else None
+                for client in self._clients:
+                    if not client.resync and not client.queue.full():
+                        client.queue.put_nowait(data)
+                        continue
+                    # New, or fell behind: skip what it hasn't read to a keyframe of now
+                    if keyframe is None:
+                        keyframe = encode_message(self._encoder.keyframe(metrics))
+                    skipped = client.queue.qsize()
+                    while not client.queue.empty():
+                        client.queue.get_nowait()
+                    client.dropped += skipped
+                    self.client_dropped += skipped
+                    client.resync = False
+                    client.queue.put_nowait(keyframe)
+                await asyncio.sleep(0)  # Let the writers run between frames
+
+    async def _handle(self, reader, writer):
+        client = _Client(writer, self.client_queue)
+        self._clients.add(client)
+        try:
+            writer.write(encode_message({"type": "hello", "keys": [name for name, _ in STATE_COLUMNS],
+                                         "actions": list(ACTIONS)}))
+            while True:
+                data = await client.queue.get()
+                writer.write(data)
+                await writer.drain()  # Only this client waits on its socket
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self._clients.discard(client)
+            writer.close()
+
+
+# Logging
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, message and the record's data (extra={"data": {...}})."""
+
+    def format(self, record):
+        entry = {
+            "time": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update(getattr(record, "data", {}))
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def start_logging(logger="simling", stream=None, level=logging.INFO):
+    """Send logger's records through a queue to a JSON lines handler on stream (stderr by default).
+
+    Logging calls only put the record in the queue; formatting and writing
+    happen on the listener's thread. Returns the QueueListener, stop() it
+    on exit to flush what is left.
+    """
+    records = queue.SimpleQueue()
+    handler = logging.StreamHandler(stream if stream is not None else sys.stderr)
+    handler.setFormatter(JsonFormatter())
+    listener = logging.handlers.QueueListener(records, handler)
+    target = logging.getLogger(logger)
+    target.setLevel(level)
+    target.addHandler(logging.handlers.QueueHandler(records))
+    target.propagate = False
+    listener.start()
+    return listener
+
+
+def watch(host, port):
+    """Print the metrics of a running server, one line per message."""
+    with socket.create_connection((host, port)) as connection:
+        state = {}
+        stream = connection.makefile("rb")
+        while (message := read_message(stream)) is not None:
+            if message["type"] == "hello":
+                continue
+            apply_message(state, message)
+            metrics = message["metrics"]
+            print(f"tick {metrics['tick']:>8}  simlings {len(state):>6}  "
+                  f"{time.strftime('%H:%M:%S')}  {json.dumps(metrics['actions'])}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("port", type=int)
+    parser.add_argument("--host", default="127.0.0.1")
+    args = parser.parse_args(argv)
+    try:
+        watch(args.host, args.port)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+import unittest
+import os
+import pygame
+import assets
+from assets import AssetCache
+from simling import Simling
+from objects import FoodSource, Bed
+
+
+class TestAssetCache(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        # convert_alpha() needs a video mode, same as in test_simling.py
+        try:
+            pygame.display.init()
+            pygame.display.set_mode((1, 1))
+        except pygame.error:
+            os.environ['SDL_VIDEODRIVER'] = 'dummy'
+            pygame.display.init()
+            pygame.display.set_mode((1, 1))
+
+    def setUp(self):
+        self.cache = AssetCache(max_scaled=2)
+        self.path = assets.image_path("simling.png")
+
+    def test_same_size_is_shared(self):
+        """Test that repeated requests for the same (path, size) return one surface."""
+        first = self.cache.get(self.path, (20, 20))
+        second = self.cache.get(self.path, (20, 20))
+        self.assertIs(first, second)
+        self.assertEqual(first.get_size(), (20, 20))
+        self.assertEqual(self.cache.stats()["hits"], 1)
+        self.assertEqual(self.cache.stats()["misses"], 1)
+        self.assertEqual(self.cache.stats()["disk_loads"], 1)
+
+    def test_new_size_does_not_reload_from_disk(self):
+        """Test that a second size is scaled from the cached original."""
+        self.cache.get(self.path, (20, 20))
+        self.cache.get(self.path, (40, 40))
+        self.assertEqual(self.cache.stats()["disk_loads"], 1)
+
+    def test_lru_eviction(self):
+        """Test that the least recently used size is evicted first."""
+        small = self.cache.get(self.path, (10, 10))
+        self.cache.get(self.path, (20, 20))
+        self.cache.get(self.path, (10, 10))  # Touch, (20, 20) is now oldest
+        self.cache.get(self.path, (30, 30))
+        self.assertEqual(self.cache.stats()["evictions"], 1)
+        self.assertIs(self.cache.get(self.path, (10, 10)), small)
+        self.assertNotIn((self.path, (20, 20)), self.cache._scaled)
+
+    def test_missing_image_falls_back_once(self):
+        """Test that a missing image produces a cached solid fallback surface."""
+        missing = os.path.join("assets", "images", "does_not_exist.png")
+        surface = self.cache.get(missing, (5, 5), (1, 2, 3))
+        self.assertEqual(surface.get_size(), (5, 5))
+        self.assertEqual(tuple(surface.get_at((0, 0)))[:3], (1, 2, 3))
+        self.cache.get(missing, (5, 5), (1, 2, 3))
+        self.assertEqual(self.cache.stats()["disk_loads"], 1)
+
+    def test_preload(self):
+        """Test that preloading warms the cache."""
+        self.cache.preload([(self.path, (20, 20))])
+        self.cache.get(self.path, (20, 20))
+        self.assertEqual(self.cache.stats()["hits"], 1)
+
+    def test_entities_share_surfaces(self):
+        """Test that Simling, FoodSource and Bed instances share their images."""
+        self.assertIs(Simling(x=0, y=0).image, Simling(x=5, y=5).image)
+        self.assertIs(FoodSource(x=0, y=0).image, FoodSource(x=5, y=5).image)
+        self.assertIs(Bed(x=0, y=0).image, Bed(x=5, y=5).image)
+
+    def test_sprites_go_through_the_cache(self):
+        """Test that entity images are counted by the shared cache and dropped by its evict()."""
+        before = assets.stats()
+        image = Bed(x=0, y=0).image
+        self.assertEqual(assets.stats()["hits"] + assets.stats()["misses"], before["hits"] + before["misses"] + 1)
+        self.assertIs(Bed(x=5, y=5).image, image)
+        assets.default_cache.evict(assets.image_path("bed.png"))
+        self.assertIsNot(Bed(x=0, y=0).image, image)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+import os
+import unittest
+import pygame
+from camera import Camera, ZOOM_LEVELS
+from picking import SimlingPicker
+from render import Renderer
+from world import World
+
+
+class TestCamera(unittest.TestCase):
+
+    def setUp(self):
+        self.camera = Camera((800, 600), (3200, 2400))
+
+    def test_screen_and_world_round_trip(self):
+        """Test that screen positions map to world positions and back at any zoom and pan."""
+        self.camera.pan(1000, 700)
+        for steps in (0, 3, -5):
+            self.camera.zoom_by(steps)
+            world_x, world_y = self.camera.screen_to_world((123.5, 456.5))  # Pixel centre, clear of rounding
+            self.assertEqual(self.camera.world_to_screen(world_x, world_y), (123, 456))
+
+    def test_zoom_keeps_anchor_in_place(self):
+        """Test that zooming at the cursor keeps the world point under it there."""
+        self.camera.center_on(1600, 1200)
+        before = self.camera.screen_to_world((200, 150))
+        self.camera.zoom_by(2, anchor=(200, 150))
+        self.assertEqual(self.camera.zoom, ZOOM_LEVELS[ZOOM_LEVELS.index(1.0) + 2])
+        after = self.camera.screen_to_world((200, 150))
+        self.assertAlmostEqual(before[0], after[0])
+        self.assertAlmostEqual(before[1], after[1])
+
+    def test_view_stays_inside_world(self):
+        """Test that panning stops at the world edge and a small world is centred."""
+        self.camera.pan(-500, 10_000)
+        self.assertEqual(self.camera.view_rect(), (0.0, 1800.0, 800, 600))
+        self.camera.zoom_by(-100)
+        x, y, width, height = self.camera.view_rect()
+        self.assertEqual((width, height), (3200, 2400))
+        self.assertEqual((x, y), (0.0, 0.0))
+        small = Camera((800, 600), (400, 600))
+        self.assertEqual(small.view_rect()[:2], (-200.0, 0.0))
+
+
+class TestCulledRenderer(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+        pygame.display.init()
+        cls.screen = pygame.display.set_mode((800, 600))
+
+    def setUp(self):
+        self.world = World(fixed_dt=1 / 10, seed=5, size=(3200, 2400))
+        self.world.spawn_simlings(400, 3200, 2400)
+        for x in range(0, 3200, 400):
+            self.world.add_food_source(x=x + 50, y=100)
+            self.world.add_bed(x=x + 100, y=2000)
+        for simling in self.world.simlings[::2]:
+            simling.set_player_commanded_target((self.world.rng.uniform(0, 3200), self.world.rng.uniform(0, 2400)))
+        self.camera = Camera((800, 600), self.world.size)
+        self.renderer = Renderer(self.screen, self.world, camera=self.camera)
+
+    def test_only_visible_simlings_are_drawn(self):
+        """Test that simlings outside the view are culled."""
+        self.renderer.draw()
+        self.assertLess(self.renderer.visible, len(self.world.simlings) / 8)
+        self.camera.zoom_by(-100)
+        self.renderer.draw()
+        self.assertEqual(self.renderer.visible, len(self.world.simlings))
+
+    def test_dirty_frames_match_full_redraw_when_zoomed(self):
+        """Test that incremental frames through a panned, zoomed camera match a full redraw."""
+        self.camera.zoom_by(2)
+        selected = self.world.simlings[0]
+        self.camera.center_on(selected.x, selected.y)
+        self.renderer.draw(selected)
+        for _ in range(20):
+            self.world.step()
+            self.renderer.draw(selected)
+        incremental = pygame.image.tostring(self.screen, "RGB")
+        self.renderer.invalidate()
+        self.renderer.draw(selected)
+        self.assertEqual(incremental, pygame.image.tostring(self.screen, "RGB"))
+
+    def test_picker_culls_like_the_full_scan(self):
+        """Test that culling through a SimlingPicker's cells draws exactly what checking every simling does."""
+        picker = SimlingPicker(self.world.population)
+        picked = Renderer(self.screen, self.world, camera=self.camera, picker=picker)
+        self.camera.zoom_by(2)
+        self.camera.center_on(1600, 1200)
+        for frame in range(20):
+            self.world.step()
+            if frame == 10:
+                self.world.remove_simling(self.world.simlings[1])
+                self.camera.pan(120, -80)
+            picker.sync()
+            picked.draw()
+            frame_picked = pygame.image.tostring(self.screen, "RGB")
+            self.renderer.draw()
+            self.assertEqual(picked.visible, self.renderer.visible)
+            self.assertEqual(frame_picked, pygame.image.tostring(self.screen, "RGB"))
+        self.assertLess(picked.visible, len(self.world.simlings) / 8)
+
+    def test_panning_redraws_everything(self):
+        """Test that moving the camera rebuilds the static layer."""
+        self.renderer.draw()
+        self.assertNotEqual(self.renderer.draw(), [self.screen.get_rect()])
+        self.camera.pan(50, 0)
+        self.assertEqual(self.renderer.draw(), [self.screen.get_rect()])
+
+
+if __name__ == "__main__":
+    unittest.main()
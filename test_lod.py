@@ -0,0 +1,74 @@
+import unittest
+from lod import LODScheduler
+from world import World
+
+
+def spread_world(lod=True, **options):
+    # One simling in view, the rest at growing distances to the right
+    world = World(fixed_dt=0.1, size=(5000, 600))
+    positions = [100, 900, 1300, 1700, 2500, 4000]
+    for x in positions:
+        simling = world.add_simling(x=x, y=300)
+        simling.hunger = 10
+        simling.sleep = 10
+    if lod:
+        world.lod = LODScheduler(world, view=(0, 0, 800, 600), **options)
+    return world
+
+
+class TestLODScheduler(unittest.TestCase):
+
+    def test_levels_by_distance(self):
+        """Test that simlings in view and in focus are level 0 and farther ones get higher levels."""
+        world = spread_world()
+        indices = world.population.indices()
+        self.assertEqual(world.lod.levels_of(indices).tolist(), [0, 1, 2, 3, 3, 3])
+        world.step()
+        self.assertAlmostEqual(world.lod.behind(world.simlings[4]), 0.1)
+        world.lod.focus = [world.simlings[4]]
+        world.step()
+        self.assertEqual(world.lod.behind(world.simlings[4]), 0.0)
+
+    def test_skipped_time_is_caught_up(self):
+        """Test that deferred simlings end up where full-rate simlings do once synced."""
+        reference = spread_world(lod=False)
+        world = spread_world()
+        for simlings in (reference.simlings, world.simlings):
+            for simling in simlings[1:]:
+                simling.set_player_commanded_target((simling.x - 200, 300))
+        reference.run(2.8)
+        world.run(2.8)
+        self.assertEqual(world.lod.behind(world.simlings[0]), 0.0)
+        self.assertAlmostEqual(world.lod.behind(world.simlings[-1]), 0.6)  # Last ran on step 21 of 28
+        world.lod.sync()
+        for simling, expected in zip(world.simlings, reference.simlings):
+            self.assertEqual(world.lod.behind(simling), 0.0)
+            self.assertAlmostEqual(simling.hunger, expected.hunger)
+            self.assertAlmostEqual(simling.x, expected.x)
+            self.assertEqual(simling.current_action, expected.current_action)
+
+    def test_budget_defers_far_levels(self):
+        """Test that an exhausted budget only runs the full-rate group and simlings max_lag behind."""
+        world = spread_world(budget_seconds=-1.0, max_lag=0.45)
+        for _ in range(4):
+            world.step()
+        self.assertEqual(world.lod.last_updated, 1)
+        self.assertAlmostEqual(world.lod.behind(world.simlings[1]), 0.4)
+        world.step()  # Slot 4's turn, 0.5 s behind by now, past max_lag
+        self.assertEqual(world.lod.last_updated, 2)
+        self.assertEqual(world.lod.behind(world.simlings[4]), 0.0)
+        self.assertAlmostEqual(world.simlings[4].hunger, world.simlings[0].hunger)
+
+    def test_new_simlings_start_up_to_date(self):
+        """Test that a simling added into a reused slot doesn't inherit its pending time."""
+        world = spread_world(budget_seconds=-1.0)
+        world.run(0.5)
+        far = world.simlings[-1]
+        world.remove_simling(far)
+        newcomer = world.add_simling(x=4000, y=300)
+        self.assertEqual(newcomer.index, far.index)
+        self.assertEqual(world.lod.behind(newcomer), 0.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,153 @@
+import unittest
+import numpy as np
+from navigation import FlowField, Navigation
+from population import Population, move_towards_targets
+from simling import Simling
+from spatial import ObjectGrid
+from world import World
+
+
+class TestNavigation(unittest.TestCase):
+
+    def test_walks_around_wall(self):
+        """Test that a commanded simling reaches a target behind a wall without touching it."""
+        world = World(fixed_dt=1 / 20, seed=1)
+        wall = world.add_wall(x=300, y=100, width=40, height=400)
+        simling = world.add_simling(x=200, y=290)
+        simling.set_player_commanded_target((450, 290))
+        for _ in range(600):
+            world.step()
+            self.assertFalse(wall.rect.colliderect((simling.x, simling.y, simling.size, simling.size)))
+            if simling.current_action == "idle":
+                break
+        self.assertEqual((simling.x, simling.y), (450, 290))
+
+    def test_no_walls_moves_in_straight_lines(self):
+        """Test that without walls navigation moves exactly like move_towards_targets."""
+        rng = np.random.default_rng(2)
+        populations = []
+        for _ in range(2):
+            population = Population()
+            for x, y, tx, ty in rng.uniform(0, 600, size=(50, 4)).tolist():
+                simling = Simling(x=x, y=y, population=population)
+                simling.target_x = tx
+                simling.target_y = ty
+            populations.append(population)
+            rng = np.random.default_rng(2)
+        navigation = Navigation(ObjectGrid(), 800, 600)
+        for _ in range(30):
+            navigation.move(populations[0], populations[0].indices(), 0.1)
+            move_towards_targets(populations[1], populations[1].indices(), 0.1)
+        for name in ("x", "y", "target_x", "target_y"):
+            np.testing.assert_array_equal(getattr(populations[0], name), getattr(populations[1], name))
+
+    def test_crowd_shares_one_field(self):
+        """Test that simlings heading for the same food source share a single flow field."""
+        world = World(fixed_dt=1 / 20, seed=3)
+        world.add_wall(x=380, y=0, width=40, height=450)
+        food = world.add_food_source(x=600, y=100)
+        for simling in world.spawn_simlings(100, 300, 600):
+            simling.hunger = 90
+        world.step()
+        self.assertTrue(all(simling.target_object is food for simling in world.simlings))
+        world.step()
+        self.assertEqual(world.navigation.stats()["built"], 1)
+        for _ in range(20):
+            world.step()
+        self.assertEqual(world.navigation.stats()["built"], 1)
+
+    def test_next_cells_step_downhill(self):
+        """Test that every reachable cell but the goal points at an adjacent cell with a lower distance."""
+        rng = np.random.default_rng(4)
+        for _ in range(5):
+            blocked = rng.random((30, 20)) < 0.25
+            blocked[3, 4] = False
+            field = FlowField(blocked, (3, 4))
+            for column, row in zip(*np.nonzero(np.isfinite(field.distance))):
+                if (column, row) == (3, 4):
+                    continue
+                next_column = field.next_column[column, row]
+                next_row = field.next_row[column, row]
+                self.assertLessEqual(max(abs(next_column - column), abs(next_row - row)), 1)
+                self.assertNotEqual((next_column, next_row), (column, row))
+                self.assertFalse(blocked[next_column, next_row])
+                self.assertLess(field.distance[next_column, next_row], field.distance[column, row])
+
+    def test_random_walls(self):
+        """Test that commanded simlings never walk into walls and reach every target that can be reached."""
+        rng = np.random.default_rng(6)
+        for _ in range(3):
+            world = World(fixed_dt=1 / 10, contention=False, social=False)
+            walls = [world.add_wall(*rng.uniform(0, 700, 2).tolist(), *rng.uniform(20, 200, 2).tolist())
+                     for _ in range(8)]
+            navigation = world.navigation
+            navigation.sync()
+            free = np.argwhere(~navigation.grid.blocked) * navigation.grid.cell_size + 5.0
+            simlings = []
+            for start, target in rng.choice(free, size=(10, 2)).tolist():
+                simling = world.add_simling(*start)
+                simling.set_player_commanded_target(tuple(target))
+                simlings.append((simling, tuple(target)))
+            for _ in range(900):
+                world.step()
+                for simling, _ in simlings:
+                    box = (simling.x, simling.y, simling.size, simling.size)
+                    self.assertEqual([wall for wall in walls if wall.rect.colliderect(box)], [])
+            for simling, target in simlings:
+                if simling.current_action == "idle":
+                    self.assertEqual((simling.x, simling.y), target)
+                    continue
+                # Still going: only allowed when walls cut it off from its target
+                goal = navigation.grid.cells_of(*target)[:2]
+                field = navigation.field((int(goal[0]), int(goal[1])))
+                column, row, _ = navigation.grid.cells_of(simling.x, simling.y)
+                self.assertTrue(np.isinf(field.distance[column, row]))
+
+    def test_only_affected_fields_are_invalidated(self):
+        """Test that a wall change drops the fields it can reach and keeps the rest."""
+        walls = ObjectGrid()
+        world = World()
+        # A closed room in the top-left corner
+        for x, y, width, height in ((0, 200, 200, 20), (200, 0, 20, 220)):
+            walls.append(world.add_wall(x, y, width, height))
+        navigation = Navigation(walls, 800, 600)
+        navigation.sync()
+        inside = navigation.field((2, 2))
+        outside = navigation.field((30, 20))
+        walls.append(world.add_wall(600, 300, 40, 40))
+        navigation.sync()
+        self.assertIs(navigation.field((2, 2)), inside)
+        self.assertIsNot(navigation.field((30, 20)), outside)
+        self.assertEqual(navigation.stats()["invalidated"], 1)
+
+    def test_lines_are_checked_again_only_after_a_change(self):
+        """Test that a simling walking straight isn't checked again until its cell or target changes."""
+        world = World(fixed_dt=1 / 20, seed=1)
+        world.add_wall(x=300, y=400, width=40, height=100)
+        simling = world.add_simling(x=100, y=100)
+        simling.set_player_commanded_target((700, 100))
+        world.step()
+        self.assertEqual(world.navigation.lines_checked, 1)
+        world.step(0.01)  # Half a pixel: same cell
+        self.assertEqual(world.navigation.lines_checked, 1)
+        simling.set_player_commanded_target((700, 120))
+        world.step(0.01)
+        self.assertEqual(world.navigation.lines_checked, 2)
+
+    def test_fields_are_built_within_a_budget(self):
+        """Test that a field too big for one step is searched over several while its simlings wait."""
+        world = World(fixed_dt=1 / 20, seed=1)
+        world.navigation.cells_per_step = 200  # The 40 x 30 grid takes 6 steps
+        world.add_wall(x=300, y=100, width=40, height=400)
+        simling = world.add_simling(x=200, y=290)
+        simling.set_player_commanded_target((450, 290))
+        for _ in range(5):
+            world.step()
+            self.assertEqual((simling.x, simling.y), (200, 290))
+        world.step()
+        self.assertEqual(world.navigation.stats()["built"], 1)
+        self.assertNotEqual((simling.x, simling.y), (200, 290))
+
+
+if __name__ == '__main__':
+    unittest.main()
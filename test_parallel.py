@@ -0,0 +1,94 @@
+import unittest
+import numpy as np
+from lod import LODScheduler
+from parallel import ParallelWorld
+from population import COLUMNS
+from utility import BALANCED
+from world import World
+
+
+def build(world):
+    world.spawn_simlings(300, 800, 600)
+    for simling in world.simlings:
+        simling.hunger = world.rng.uniform(40, 90)
+        simling.sleep = world.rng.uniform(40, 90)
+    world.add_food_source(x=50, y=50)
+    world.add_food_source(x=700, y=500)
+    world.add_bed(x=400, y=50)
+    world.add_bed(x=100, y=500)
+    return world
+
+
+class TestParallelWorld(unittest.TestCase):
+
+    def setUp(self):
+        self.serial = build(World(fixed_dt=1 / 30, seed=7, social=False))
+        self.parallel = build(ParallelWorld(fixed_dt=1 / 30, seed=7, workers=2, regions=3))
+        self.addCleanup(self.parallel.close)
+
+    def assertSameState(self):
+        count = self.serial.population.count
+        for name, _ in COLUMNS:
+            np.testing.assert_array_equal(getattr(self.serial.population, name)[:count],
+                                          getattr(self.parallel.population, name)[:count], err_msg=name)
+        for a, b in zip(self.serial.simlings, self.parallel.simlings):
+            self.assertEqual(a.current_action, b.current_action)
+            if a.target_object is None:
+                self.assertIsNone(b.target_object)
+            else:
+                self.assertEqual(a.target_object.center, b.target_object.center)
+
+    def test_matches_single_process(self):
+        """Test that parallel stepping gives bit-identical results to World.step."""
+        self.serial.run(20)
+        self.parallel.run(20)
+        self.assertSameState()
+
+    def test_growth_moves_to_new_block(self):
+        """Test that adding simlings mid-run (reallocating shared memory) keeps results identical."""
+        self.serial.run(2)
+        self.parallel.run(2)
+        old_block = self.parallel.population.block.name
+        for world in (self.serial, self.parallel):
+            world.spawn_simlings(2000, 800, 600)
+        self.assertNotEqual(self.parallel.population.block.name, old_block)
+        self.serial.run(2)
+        self.parallel.run(2)
+        self.assertSameState()
+
+    def test_matches_single_process_with_distance_curves(self):
+        """Test that decisions made in the workers match World's with BALANCED and many objects."""
+        for world in (self.serial, self.parallel):
+            world.world_objects["ai"] = BALANCED
+            for i in range(80):
+                world.add_television(x=(i * 97) % 780, y=(i * 61) % 580)
+            for simling in world.simlings:
+                simling.fun = world.rng.uniform(60, 100)
+        self.serial.run(30)
+        self.parallel.run(30)
+        self.assertSameState()
+
+    def test_regions_are_strips(self):
+        """Test that every simling is stepped by the vertical strip its x is in."""
+        population = self.parallel.population
+        population.x[0] = -40  # Off-world simlings go to the edge strips
+        population.x[1] = 900
+        indices = population.indices()
+        self.parallel.assign_regions(indices)
+        expected = np.clip(population.x[indices] // (800 / 3), 0, 2)
+        np.testing.assert_array_equal(population.region[indices], expected)
+
+    def test_rejects_what_workers_ignore(self):
+        """Test that walls, level of detail and conversations raise instead of being ignored."""
+        with self.assertRaises(ValueError):
+            ParallelWorld(social=True)
+        with self.assertRaises(ValueError):
+            self.parallel.add_wall(100, 100, 50, 50)
+        with self.assertRaises(ValueError):
+            self.parallel.lod = LODScheduler(self.parallel, view=(0, 0, 800, 600))
+        self.assertFalse(self.parallel.walls)
+        self.assertIsNone(self.parallel.lod)
+
+
+if __name__ == '__main__':
+    unittest.main()
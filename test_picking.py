@@ -0,0 +1,73 @@
+import random
+import unittest
+from controls import command_group, formation_offsets
+from picking import SimlingPicker
+from world import World
+
+
+def linear_at(simlings, x, y):
+    for simling in simlings:
+        if simling.x <= x < simling.x + simling.size and simling.y <= y < simling.y + simling.size:
+            return simling
+    return None
+
+
+class TestSimlingPicker(unittest.TestCase):
+
+    def setUp(self):
+        self.rng = random.Random(11)
+        self.world = World(fixed_dt=1 / 10, seed=11, size=(2000, 1500))
+        self.world.spawn_simlings(500, 2000, 1500)
+        for simling in self.world.simlings[::2]:
+            simling.set_player_commanded_target((self.rng.uniform(0, 2000), self.rng.uniform(0, 1500)))
+        self.picker = SimlingPicker(self.world.population)
+
+    def check_queries(self):
+        self.picker.sync()
+        for _ in range(200):
+            x, y = self.rng.uniform(-50, 2050), self.rng.uniform(-50, 1550)
+            self.assertIs(self.picker.at(x, y), linear_at(self.world.simlings, x, y))
+        for _ in range(20):
+            left, top = self.rng.uniform(0, 1800), self.rng.uniform(0, 1300)
+            expected = [simling for simling in self.world.simlings
+                        if simling.x < left + 200 and simling.x + simling.size > left
+                        and simling.y < top + 150 and simling.y + simling.size > top]
+            self.assertEqual(self.picker.in_rect(left, top, 200, 150), expected)
+
+    def test_queries_match_linear_scan(self):
+        """Test that point and box picks agree with scanning every simling, also after moving."""
+        self.check_queries()
+        self.world.run(3)
+        self.check_queries()
+
+    def test_sync_only_rebuckets_what_changed(self):
+        """Test that sync() touches simlings that changed cells, appeared or were removed."""
+        self.picker.sync()
+        self.assertEqual(self.picker.rebucketed, 500)
+        self.picker.sync()
+        self.assertEqual(self.picker.rebucketed, 0)
+        self.world.step()
+        self.picker.sync()
+        self.assertLess(self.picker.rebucketed, 50)
+        gone = self.world.simlings[0]
+        self.world.remove_simling(gone)
+        self.world.add_simling(x=gone.x, y=gone.y)
+        self.picker.sync()
+        self.assertEqual(self.picker.rebucketed, 1)
+        self.check_queries()
+
+    def test_group_command_in_formation(self):
+        """Test that a group is sent to distinct places in a grid around the target."""
+        self.assertEqual(formation_offsets(1), [(0.0, 0.0)])
+        group = self.world.simlings[:7]
+        command_group(group, (1000, 700))
+        targets = {(simling.target_x, simling.target_y) for simling in group}
+        self.assertEqual(len(targets), 7)
+        self.assertEqual(targets, {(1000 + dx, 700 + dy) for dx, dy in formation_offsets(7)})
+        self.assertTrue(all(simling.current_action == "player_commanded" for simling in group))
+        topmost = min(group, key=lambda simling: simling.y)
+        self.assertEqual(topmost.target_y, 700 + formation_offsets(7)[0][1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,134 @@
+import math
+import random
+import unittest
+import numpy as np
+from simling import Simling
+from objects import FoodSource, Bed
+from population import Population
+
+
+def reference_update(state, dt, food_centers, bed_centers):
+    """The original per-object Simling.update, on a plain dict, for comparison."""
+    for need, rate in (("hunger", Simling.HUNGER_RATE), ("sleep", Simling.SLEEP_RATE),
+                       ("social", Simling.SOCIAL_RATE), ("fun", Simling.FUN_RATE)):
+        state[need] = max(0.0, min(100.0, state[need] + rate * dt))
+
+    if state["tx"] is not None and state["ty"] is not None:
+        dx = state["tx"] - state["x"]
+        dy = state["ty"] - state["y"]
+        distance = math.sqrt(dx*dx + dy*dy)
+        if distance < 1.0:
+            state["x"], state["y"], state["tx"], state["ty"] = state["tx"], state["ty"], None, None
+        else:
+            move_amount = state["speed"] * dt
+            state["x"] += dx / distance * move_amount
+            state["y"] += dy / distance * move_amount
+            new_dx = state["tx"] - state["x"]
+            new_dy = state["ty"] - state["y"]
+            if new_dx * dx < 0 or new_dy * dy < 0 or math.sqrt(new_dx*new_dx + new_dy*new_dy) < 1.0:
+                state["x"], state["y"], state["tx"], state["ty"] = state["tx"], state["ty"], None, None
+
+    def closest(centers):
+        best, best_d = None, float('inf')
+        for i, (cx, cy) in enumerate(centers):
+            d = (cx - (state["x"] + 10)) ** 2 + (cy - (state["y"] + 10)) ** 2
+            if d < best_d:
+                best, best_d = i, d
+        return best
+
+    if state["action"] == "idle":
+        if state["hunger"] > 70:
+            i = closest(food_centers)
+            state["action"], state["obj"] = "seeking_food", i
+            state["tx"], state["ty"] = food_centers[i][0] - 10, food_centers[i][1] - 10
+        elif state["sleep"] > 70:
+            i = closest(bed_centers)
+            state["action"], state["obj"] = "seeking_sleep", i
+            state["tx"], state["ty"] = bed_centers[i][0] - 10, bed_centers[i][1] - 10
+    elif state["action"] == "player_commanded" and state["tx"] is None:
+        state["action"] = "idle"
+    elif state["action"] == "seeking_food" and state["tx"] is None:
+        state["hunger"] = max(0.0, state["hunger"] - 50)
+        state["action"], state["obj"] = "idle", None
+    elif state["action"] == "seeking_sleep" and state["tx"] is None:
+        state["sleep"] = max(0.0, state["sleep"] - 70)
+        state["action"], state["obj"] = "idle", None
+
+
+class TestBatchedUpdate(unittest.TestCase):
+
+    def setUp(self):
+        rng = random.Random(1234)
+        self.population = Population()
+        self.food = [FoodSource(x=50, y=50), FoodSource(x=700, y=500)]
+        self.beds = [Bed(x=400, y=50), Bed(x=100, y=500)]
+        self.world_objects = {"food_sources": self.food, "beds": self.beds}
+        self.simlings = []
+        self.states = []
+        for _ in range(200):
+            simling = Simling(x=rng.uniform(0, 800), y=rng.uniform(0, 600), population=self.population)
+            simling.hunger = rng.uniform(40, 90)
+            simling.sleep = rng.uniform(40, 90)
+            self.simlings.append(simling)
+            self.states.append({
+                "x": simling.x, "y": simling.y, "tx": None, "ty": None, "speed": simling.speed,
+                "hunger": simling.hunger, "sleep": simling.sleep, "social": 50.0, "fun": 50.0,
+                "action": "idle", "obj": None,
+            })
+        # A few simlings on a player command
+        for simling, state in zip(self.simlings[:20], self.states[:20]):
+            target = (rng.randint(0, 800), rng.randint(0, 600))
+            simling.set_player_commanded_target(target)
+            state["tx"], state["ty"], state["action"] = target[0], target[1], "player_commanded"
+
+    def test_matches_per_object_update(self):
+        """Test that update_many reproduces the original per-object update exactly."""
+        food_centers = [(f.x + f.size / 2, f.y + f.size / 2) for f in self.food]
+        bed_centers = [(b.x + b.size[0] / 2, b.y + b.size[1] / 2) for b in self.beds]
+        objects = {"seeking_food": self.food, "seeking_sleep": self.beds}
+        for step in range(600):
+            dt = 1 / 60 if step % 7 else 1 / 30  # Uneven frame times
+            Simling.update_many(dt, self.world_objects, population=self.population)
+            for state in self.states:
+                reference_update(state, dt, food_centers, bed_centers)
+
+        for simling, state in zip(self.simlings, self.states):
+            self.assertEqual(simling.x, state["x"])
+            self.assertEqual(simling.y, state["y"])
+            self.assertEqual(simling.target_x, state["tx"])
+            self.assertEqual(simling.target_y, state["ty"])
+            self.assertEqual(simling.hunger, state["hunger"])
+            self.assertEqual(simling.sleep, state["sleep"])
+            self.assertEqual(simling.fun, state["fun"])
+            self.assertEqual(simling.current_action, state["action"])
+            if state["obj"] is None:
+                self.assertIsNone(simling.target_object)
+            else:
+                self.assertIs(simling.target_object, objects[state["action"]][state["obj"]])
+
+    def test_update_many_subset(self):
+        """Test that only the requested slots are advanced."""
+        first, second = self.simlings[100], self.simlings[101]
+        Simling.update_many(1.0, {}, population=self.population, indices=np.array([first.index]))
+        self.assertAlmostEqual(first.fun, 50.0 + Simling.FUN_RATE)
+        self.assertAlmostEqual(second.fun, 50.0)
+
+    def test_released_slot_is_reused(self):
+        """Test that a released slot is handed to the next simling."""
+        index = self.simlings[5].index
+        self.population.release(index)
+        self.assertEqual(len(self.population), 199)
+        newcomer = Simling(x=1, y=2, population=self.population)
+        self.assertEqual(newcomer.index, index)
+        self.assertEqual((newcomer.x, newcomer.y, newcomer.current_action), (1.0, 2.0, "idle"))
+
+    def test_population_grows(self):
+        """Test that views stay valid when the arrays are reallocated."""
+        population = Population(capacity=1)
+        simlings = [Simling(x=i, y=i, population=population) for i in range(10)]
+        self.assertGreaterEqual(population.capacity, 10)
+        self.assertEqual([s.x for s in simlings], [float(i) for i in range(10)])
+
+
+if __name__ == '__main__':
+    unittest.main()
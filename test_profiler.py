@@ -0,0 +1,141 @@
+import contextlib
+import csv
+import io
+import json
+import os
+import tempfile
+import time
+import unittest
+import pygame
+from profiler import FrameProfiler
+from snapshot import SnapshotWriter
+from ui import ProfilerOverlay, TextCache
+
+
+class TestFrameProfiler(unittest.TestCase):
+
+    def run_frames(self, profiler, frames=5):
+        for _ in range(frames):
+            profiler.begin_frame()
+            profiler.lap("events")
+            time.sleep(0.002)
+            profiler.lap("update", agents=4)
+            profiler.end_frame()
+
+    def test_disabled_records_nothing(self):
+        """Test that a disabled profiler keeps no frames."""
+        profiler = FrameProfiler()
+        self.run_frames(profiler)
+        self.assertEqual(len(profiler.frames), 0)
+        self.assertIsNone(profiler.percentiles())
+
+    def test_laps_are_charged_to_phases(self):
+        """Test that lap time goes to the phase it ends and frames add up."""
+        profiler = FrameProfiler(enabled=True)
+        self.run_frames(profiler)
+        self.assertEqual(profiler.phases, ["events", "update", "other"])
+        stats = profiler.percentiles("update")
+        self.assertGreaterEqual(stats["p50"], 0.002)
+        self.assertLessEqual(stats["p50"], stats["p95"])
+        self.assertLessEqual(stats["p95"], stats["p99"])
+        for frame in profiler.frames:
+            self.assertAlmostEqual(frame["total"], frame["events"] + frame["update"] + frame["other"])
+            self.assertAlmostEqual(frame["per_agent"], frame["update"] / 4)
+        counts, _ = profiler.per_agent_cost_histogram(bins=3)
+        self.assertEqual(counts.sum(), 5)
+
+    def test_history_is_bounded(self):
+        """Test that only the last history frames are kept."""
+        profiler = FrameProfiler(history=3, enabled=True)
+        self.run_frames(profiler, frames=5)
+        self.assertEqual([frame["frame"] for frame in profiler.frames], [2, 3, 4])
+
+    def test_export(self):
+        """Test that CSV and JSON exports contain every kept frame."""
+        profiler = FrameProfiler(enabled=True)
+        self.run_frames(profiler, frames=3)
+        with tempfile.TemporaryDirectory() as directory:
+            csv_path = os.path.join(directory, "frames.csv")
+            json_path = os.path.join(directory, "frames.json")
+            profiler.export(csv_path)
+            profiler.export(json_path)
+            with open(csv_path) as f:
+                rows = list(csv.DictReader(f))
+            with open(json_path) as f:
+                data = json.load(f)
+        self.assertEqual(len(rows), 3)
+        self.assertAlmostEqual(float(rows[1]["update"]), profiler.frames[1]["update"])
+        self.assertEqual(len(data["frames"]), 3)
+        self.assertEqual(set(data["summary"]["total"]), {"p50", "p95", "p99"})
+        self.assertEqual(sum(data["per_agent_cost_histogram"]["counts"]), 3)
+
+    def test_export_on_a_writer(self):
+        """Test that exporting through a writer thread writes the window as it was when asked."""
+        profiler = FrameProfiler(enabled=True)
+        self.run_frames(profiler, frames=3)
+        writer = SnapshotWriter()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "frames.csv")
+            with self.assertLogs("simling.profiler"):
+                profiler.export(path, writer=writer)
+                self.run_frames(profiler, frames=2)  # Not in the export
+                writer.close()
+            with open(path) as f:
+                rows = list(csv.DictReader(f))
+        self.assertEqual([int(row["frame"]) for row in rows], [0, 1, 2])
+
+    def test_capture_writes_profile(self):
+        """Test that a cProfile capture stops and writes its stats after the requested frames, only logging."""
+        profiler = FrameProfiler()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "capture.prof")
+            profiler.capture(frames=2, path=path)
+            self.run_frames(profiler, frames=1)
+            self.assertTrue(profiler.capturing)
+            printed = io.StringIO()
+            with self.assertLogs("simling.profiler") as logs, contextlib.redirect_stdout(printed):
+                self.run_frames(profiler, frames=1)
+            self.assertFalse(profiler.capturing)
+            self.assertTrue(os.path.exists(path))
+            self.assertIn(path, logs.output[0])
+            self.assertEqual(printed.getvalue(), "")  # Nothing printed from the frame loop
+            profiler.print_last_profile(stream=printed)
+            self.assertIn("cumulative", printed.getvalue())
+
+    def test_from_env(self):
+        """Test that the environment variables enable the profiler and start a capture."""
+        profiler = FrameProfiler.from_env({"SIMLING_PROFILE": "1", "SIMLING_CPROFILE": "0"})
+        self.assertTrue(profiler.enabled)
+        self.assertFalse(profiler.capturing)
+        self.assertFalse(FrameProfiler.from_env({}).enabled)
+
+
+class TestProfilerOverlay(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        pygame.font.init()
+
+    def test_shown_only_while_enabled(self):
+        """Test that the overlay hides with the profiler and refreshes its numbers periodically."""
+        profiler = FrameProfiler()
+        overlay = ProfilerOverlay(profiler, pygame.font.Font(None, 20), text_cache=TextCache(), refresh_frames=2)
+        self.assertIsNone(overlay.layout())
+        profiler.toggle()
+        profiler.begin_frame()
+        profiler.end_frame()
+        self.assertIsNotNone(overlay.layout())
+        lines = overlay.lines()
+        profiler.begin_frame()
+        profiler.end_frame()
+        self.assertIs(overlay.lines(), lines)  # Not due for a refresh yet
+        profiler.begin_frame()
+        profiler.end_frame()
+        self.assertIsNot(overlay.lines(), lines)
+        profiler.toggle()
+        self.assertIsNone(overlay.layout())
+        self.assertTrue(overlay.changed)
+
+
+if __name__ == '__main__':
+    unittest.main()
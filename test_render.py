@@ -0,0 +1,120 @@
+import os
+import unittest
+import pygame
+from render import Renderer
+from ui import SelectedSimlingPanel, TextCache
+from world import World
+
+
+class TestDirtyRenderer(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+        pygame.display.init()
+        pygame.font.init()
+        cls.screen = pygame.display.set_mode((800, 600))
+
+    def setUp(self):
+        self.world = World(fixed_dt=1 / 10, seed=3)
+        self.world.spawn_simlings(60, 800, 600)
+        self.world.add_food_source(x=50, y=50)
+        self.world.add_food_source(x=700, y=500)
+        self.world.add_bed(x=400, y=50)
+        self.world.add_bed(x=100, y=500)
+        for simling in self.world.simlings[::3]:
+            simling.set_player_commanded_target((self.world.rng.uniform(0, 800), self.world.rng.uniform(0, 600)))
+        self.renderer = Renderer(self.screen, self.world)
+        self.panel = SelectedSimlingPanel(pygame.font.Font(None, 28))
+
+    def full_frame(self, selected):
+        self.renderer.invalidate()
+        self.renderer.draw(selected, overlays=(self.panel,))
+        return pygame.image.tostring(self.screen, "RGB")
+
+    def test_dirty_frames_match_full_redraw(self):
+        """Test that incremental frames leave the screen exactly as a full redraw would."""
+        selected = self.world.simlings[0]
+        self.renderer.draw(None, overlays=(self.panel,))
+        for frame in range(40):
+            self.world.step()
+            if frame == 10:
+                self.panel.simling = selected
+            if frame == 30:
+                self.world.remove_simling(self.world.simlings[5])
+            current = selected if frame >= 10 else None
+            self.renderer.draw(current, overlays=(self.panel,))
+        incremental = pygame.image.tostring(self.screen, "RGB")
+        self.assertEqual(incremental, self.full_frame(selected))
+
+    def test_group_selection_borders(self):
+        """Test that borders of a changing multi-selection are drawn and erased like a full redraw."""
+        self.renderer.draw()
+        for frame in range(20):
+            self.world.step()
+            selection = self.world.simlings[frame % 5:frame % 5 + 8]
+            self.renderer.draw(selection, overlays=(self.panel,))
+        incremental = pygame.image.tostring(self.screen, "RGB")
+        self.assertEqual(incremental, self.full_frame(selection))
+
+    def test_still_world_updates_nothing(self):
+        """Test that a frame with no movement and no overlays pushes no rects."""
+        for simling in self.world.simlings:
+            simling.target_x = simling.target_y = None
+        self.renderer.draw()
+        self.assertEqual(self.renderer.draw(), [])
+
+    def test_crowd_falls_back_to_full_redraw(self):
+        """Test that when most of the screen would be dirty the whole screen is redrawn."""
+        self.world.spawn_simlings(2000, 800, 600)
+        for simling in self.world.simlings:
+            simling.set_player_commanded_target((400, 300))
+        self.renderer.draw()
+        self.world.step()
+        self.assertEqual(self.renderer.draw(), [self.screen.get_rect()])
+
+    def test_static_layer_rebuilt_on_object_change(self):
+        """Test that adding a bed triggers a full redraw."""
+        self.renderer.draw()
+        self.world.add_bed(x=600, y=300)
+        self.assertEqual(self.renderer.draw(), [self.screen.get_rect()])
+
+
+class TestSelectedSimlingPanel(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        pygame.font.init()
+
+    def setUp(self):
+        self.world = World()
+        self.simling = self.world.add_simling(x=0, y=0)
+        self.cache = TextCache(max_entries=16)
+        self.panel = SelectedSimlingPanel(pygame.font.Font(None, 28), text_cache=self.cache)
+        self.panel.simling = self.simling
+
+    def test_unchanged_lines_are_not_rendered_again(self):
+        """Test that only lines whose text changed go back to the text cache."""
+        self.panel.layout()
+        self.assertEqual(self.cache.stats()["misses"], 6)
+        self.panel.layout()
+        self.assertFalse(self.panel.changed)
+        self.assertEqual(self.cache.stats()["misses"], 6)
+        self.simling.hunger = 61.0
+        self.panel.layout()
+        self.assertTrue(self.panel.changed)
+        self.assertEqual(self.cache.stats()["misses"], 7)
+
+    def test_repeated_strings_hit_the_cache(self):
+        """Test that a value returning to an earlier string reuses the rendered surface."""
+        self.panel.layout()
+        self.simling.hunger = 61.0
+        self.panel.layout()
+        self.simling.hunger = 50.0
+        self.panel.layout()
+        self.assertEqual(self.cache.stats()["misses"], 7)
+        self.assertEqual(self.cache.stats()["hits"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+import json
+import os
+import random
+import tempfile
+import unittest
+from controls import handle_click
+from picking import SimlingPicker
+from replay import InputRecorder, Replay, ReplayMismatch, state_hash
+from world import World
+
+
+class TestControls(unittest.TestCase):
+
+    def test_select_command_and_deselect(self):
+        """Test that clicks select, command and deselect like main.py always did."""
+        world = World()
+        picker = SimlingPicker(world.population)
+        first = world.add_simling(x=100, y=100)
+        world.add_simling(x=110, y=110)  # Overlaps, but the first in the list wins
+        selection = handle_click([], picker, 1, (115, 115))
+        self.assertEqual(selection, [first])
+        selection = handle_click(selection, picker, 3, (400, 300))
+        self.assertEqual((first.target_x, first.target_y, first.current_action), (400, 300, "player_commanded"))
+        self.assertEqual(handle_click(selection, picker, 1, (700, 500)), [])
+        self.assertEqual(handle_click([], picker, 3, (400, 300)), [])
+
+
+class TestReplay(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "session.rec")
+        self.final_hash = self.record(frames=100)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def record(self, frames, hash_interval=30):
+        """Play a session with jittery frame times and some clicks."""
+        rng = random.Random(5)
+        world = World(seed=5)
+        world.spawn_simlings(20, 800, 600)
+        world.add_food_source(x=50, y=50)
+        world.add_food_source(x=700, y=500)
+        world.add_bed(x=400, y=50)
+        for simling in world.simlings[::2]:
+            simling.hunger = 69.5
+        world.remove_simling(world.simlings[3])  # Frees slot 3, then reuses it for the last simling
+        world.remove_simling(world.simlings[8])
+        world.add_simling(x=300, y=300)
+        recorder = InputRecorder(self.path, world, checkpoint_interval=25, hash_interval=hash_interval)
+        picker = SimlingPicker(world.population)
+        selection = []
+        for frame in range(frames):
+            if frame % 15 == 0:
+                target = world.simlings[frame % 7]
+                clicks = [(1, (int(target.x) + 5, int(target.y) + 5), None),
+                          (3, (rng.randrange(800), rng.randrange(600)), None)]
+                if frame % 30 == 0:  # Drag a box around a few instead
+                    clicks[0] = (1, (target.x - 100, target.y - 100), (target.x + 100, target.y + 100))
+                for button, position, end in clicks:
+                    recorder.record_click(button, position, end)
+                    selection = handle_click(selection, picker, button, position, end)
+            dt = rng.uniform(0.010, 0.040)
+            world.step(dt)
+            recorder.end_frame(dt, world, selection)
+        recorder.close()
+        return state_hash(world, selection)
+
+    def test_replay_matches(self):
+        """Test that a headless replay ends in exactly the recorded state."""
+        replay = Replay(self.path)
+        self.assertEqual(len(replay), 100)
+        self.assertEqual(sorted(replay.checkpoints), [0, 25, 50, 75, 100])
+        world, selection = replay.run()
+        self.assertEqual(state_hash(world, selection), self.final_hash)
+        self.assertIsNone(replay.bisect())
+
+    def test_replay_from_checkpoint(self):
+        """Test that a replay can start part way through, from a checkpoint."""
+        world, selection = Replay(self.path).run(start=60)
+        self.assertEqual(state_hash(world, selection), self.final_hash)
+
+    def change_frame(self, changed):
+        with open(self.path) as f:
+            lines = f.readlines()
+        frame = -1
+        for i, line in enumerate(lines):
+            record = json.loads(line)
+            if "dt" in record:
+                frame += 1
+                if frame == changed:
+                    record["dt"] += 0.001
+                    lines[i] = json.dumps(record) + "\n"
+        with open(self.path, "w") as f:
+            f.writelines(lines)
+
+    def test_mismatch_is_found(self):
+        """Test that with a hash every frame, a changed frame is reported by run() and found by bisect()."""
+        self.record(frames=100, hash_interval=1)
+        self.change_frame(70)
+        replay = Replay(self.path)
+        with self.assertRaises(ReplayMismatch) as raised:
+            replay.run()
+        self.assertEqual(raised.exception.frame, 70)
+        self.assertEqual(replay.bisect(), 70)
+
+    def test_mismatch_is_found_between_hashes(self):
+        """Test that with the default hash interval a changed frame shows by the next checkpoint."""
+        self.change_frame(70)  # Frame 60 is hashed, then checkpoint 75 holds the state after frame 74
+        replay = Replay(self.path)
+        with self.assertRaises(ReplayMismatch) as raised:
+            replay.run()
+        self.assertEqual(raised.exception.frame, 74)
+        self.assertEqual(replay.bisect(), 74)
+        with open(self.path) as f:
+            hashed = [record for record in map(json.loads, f) if "dt" in record and "hash" in record]
+        self.assertEqual(len(hashed), 4)  # Frames 0, 30, 60 and 90
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+import unittest
+import numpy as np
+from resources import CANDIDATES, EXACT
+from snapshot import Snapshot
+from world import World
+
+
+def hungry_crowd(contention=True, count=20):
+    world = World(fixed_dt=1 / 10, contention=contention)
+    near = world.add_food_source(x=100, y=100)
+    far = world.add_food_source(x=400, y=100)
+    for i in range(count):
+        simling = world.add_simling(x=60 + i, y=140)
+        simling.hunger = 80
+    return world, near, far
+
+
+class TestReservations(unittest.TestCase):
+
+    def test_lone_simling_takes_closest(self):
+        """Test that without anyone else around the closest object is picked, as before."""
+        world, near, _ = hungry_crowd(count=1)
+        world.step()
+        self.assertIs(world.simlings[0].target_object, near)
+
+    def test_crowd_spreads_out(self):
+        """Test that a crowd is split over objects by expected wait, and piles up without contention."""
+        world, near, far = hungry_crowd()
+        world.step()
+        targets = [simling.target_object for simling in world.simlings]
+        self.assertGreater(targets.count(far), 0)
+        self.assertGreaterEqual(targets.count(near), targets.count(far))
+        self.assertEqual(len(world.food_sources.reservations.station(near).reserved), targets.count(near))
+
+        world, near, far = hungry_crowd(contention=False)
+        world.step()
+        self.assertTrue(all(simling.target_object is near for simling in world.simlings))
+
+    def test_many_objects(self):
+        """Test that with more objects than EXACT, simlings alone take the closest and crowds spread out."""
+        world = World(fixed_dt=1 / 10, seed=5)
+        foods = [world.add_food_source(x=40 * (i % 20), y=40 * (i // 20)) for i in range(EXACT + 36)]
+        reservations = world.food_sources.reservations
+        alone = foods[::3]  # One simling next to each, nobody in each other's way
+        xs = np.array([food.center[0] + 7 for food in alone])
+        ys = np.array([food.center[1] - 3 for food in alone])
+        chosen = [foods[i] for i in reservations.choose(xs, ys, np.full(len(alone), 50.0)).tolist()]
+        self.assertEqual(chosen, alone)
+
+        xs, ys = np.full(300, 400.0), np.full(300, 100.0)
+        choice = reservations.choose(xs, ys, np.full(300, 50.0))
+        near = world.food_sources.nearest_k([400], [100], CANDIDATES)[0]
+        self.assertTrue(set(choice.tolist()) <= set(near.tolist()))
+        self.assertLessEqual(np.bincount(choice).max(), 300 // CANDIDATES + foods[0].capacity)
+
+    def test_queue_and_metrics(self):
+        """Test that simlings beyond capacity wait in line and are served in order."""
+        world = World(fixed_dt=1 / 10)
+        food = world.add_food_source(x=100, y=100)
+        simlings = [world.add_simling(x=105, y=105) for _ in range(3)]
+        for simling in simlings:
+            simling.hunger = 80
+        world.step()  # Pick the food
+        world.step()  # Arrive: capacity 2, so one queues
+        self.assertEqual([simling.current_action for simling in simlings], ["idle", "idle", "waiting"])
+        self.assertEqual(simlings[2].hunger, 80 + 2 * 0.1 * simlings[2].HUNGER_RATE)
+        reservations = world.food_sources.reservations
+        self.assertEqual(reservations.queue_positions(food), [simlings[2]])
+        world.run(food.use_duration - 0.2)
+        self.assertEqual(simlings[2].current_action, "waiting")
+        world.run(0.3)
+        self.assertEqual(simlings[2].current_action, "idle")
+        self.assertLess(simlings[2].hunger, 40)
+        metrics, = reservations.metrics()
+        self.assertEqual((metrics["uses"], metrics["max_queue"], metrics["queued"]), (3, 1, 0))
+        self.assertGreater(metrics["mean_wait"], 0)
+        self.assertGreater(metrics["utilization"], 0.5)
+
+    def test_player_command_leaves_queue(self):
+        """Test that a queued simling sent elsewhere gives up its place."""
+        world = World(fixed_dt=1 / 10)
+        world.add_bed(x=100, y=100)
+        simlings = [world.add_simling(x=115, y=105) for _ in range(2)]
+        for simling in simlings:
+            simling.sleep = 80
+        world.step()
+        world.step()
+        self.assertEqual(simlings[1].current_action, "waiting")
+        simlings[1].set_player_commanded_target((200, 300))
+        reservations = world.beds.reservations
+        self.assertNotIn(simlings[1], reservations.station(world.beds[0]).reserved)
+        world.step()
+        self.assertEqual(simlings[1].current_action, "player_commanded")
+        self.assertEqual(reservations.queue_positions(world.beds[0]), [])
+        metrics, = reservations.metrics()
+        self.assertEqual((metrics["uses"], metrics["reserved"], metrics["queued"]), (1, 0, 0))
+
+    def test_metrics_change_nothing(self):
+        """Test that reading metrics neither purges stale reservations nor sets up stations."""
+        world = World(fixed_dt=1 / 10)
+        world.add_bed(x=100, y=100)
+        world.add_bed(x=600, y=400)
+        simling = world.add_simling(x=115, y=105)
+        simling.sleep = 80
+        world.step()
+        reservations = world.beds.reservations
+        station = reservations.station(world.beds[0])
+        simling.target_object = None  # Gone elsewhere without release()
+        reserved, stations = set(station.reserved), dict(reservations._stations)
+        used, idle = reservations.metrics()
+        self.assertEqual((used["reserved"], idle["reserved"], idle["uses"]), (0, 0, 0))
+        self.assertEqual(station.reserved, reserved)
+        self.assertEqual(reservations._stations, stations)
+
+    def test_snapshot_keeps_queues(self):
+        """Test that a world restored mid-queue carries on exactly like the original."""
+        world, _, _ = hungry_crowd()
+        world.run(3)
+        self.assertIn("waiting", [simling.current_action for simling in world.simlings])
+        restored = Snapshot.capture(world).restore()
+        world.run(10)
+        restored.run(10)
+        state = [(simling.x, simling.y, simling.hunger, simling.current_action) for simling in world.simlings]
+        self.assertEqual([(simling.x, simling.y, simling.hunger, simling.current_action)
+                          for simling in restored.simlings], state)
+
+
+if __name__ == '__main__':
+    unittest.main()
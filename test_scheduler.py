@@ -0,0 +1,113 @@
+import random
+import unittest
+import numpy as np
+from scheduler import EventScheduler, accumulate
+from utility import BALANCED, CLASSIC
+from world import World
+
+
+def build(seed, ai=CLASSIC):
+    world = World(fixed_dt=1 / 20, seed=seed, contention=False, social=False, ai=ai)
+    world.spawn_simlings(80, 800, 600)
+    for simling in world.simlings:
+        simling.hunger = world.rng.uniform(0, 90)
+        simling.sleep = world.rng.uniform(0, 90)
+        simling.fun = world.rng.uniform(0, 90)
+    for simling in world.simlings[::5]:
+        simling.set_player_commanded_target((world.rng.uniform(0, 800), world.rng.uniform(0, 600)))
+    world.add_food_source(x=50, y=50)
+    world.add_food_source(x=700, y=500)
+    world.add_bed(x=400, y=50)
+    world.add_bed(x=100, y=500)
+    world.add_television(x=600, y=100)
+    return world
+
+
+class TestEventScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.ticked = build(seed=11)
+        self.evented = build(seed=11)
+        self.scheduler = EventScheduler(self.evented)
+
+    def assertSameState(self):
+        for a, b in zip(self.ticked.simlings, self.evented.simlings):
+            self.assertEqual(a.current_action, b.current_action)
+            for name in ("x", "y", "hunger", "sleep", "social", "fun"):
+                self.assertAlmostEqual(getattr(a, name), getattr(b, name), places=6, msg=name)
+            self.assertEqual(a.target_x is None, b.target_x is None)
+            self.assertIs(a.target_object is None, b.target_object is None)
+
+    def test_matches_per_tick_model(self):
+        """Test that fast-forwarding gives the same values as stepping every tick."""
+        for _ in range(6):
+            self.ticked.run(30)
+            self.scheduler.advance(30)
+            self.assertSameState()
+        self.assertEqual(self.evented.tick, self.ticked.tick)
+
+    def test_matches_per_tick_model_with_curves(self):
+        """Test that BALANCED's curve floors are crossed on the same tick as stepping, over a long run."""
+        self.ticked = build(seed=11, ai=BALANCED)
+        self.evented = build(seed=11, ai=BALANCED)
+        self.scheduler = EventScheduler(self.evented)
+        for _ in range(20):  # Closed-form decay used to drift a tick off after about 11000 ticks
+            self.ticked.run(30)
+            self.scheduler.advance(30)
+            self.assertSameState()
+
+    def test_accumulate_rounds_like_a_loop(self):
+        """Test that accumulate() gives bit for bit what adding the increment count times does."""
+        rng = random.Random(3)
+        for increment in (0.5 / 20, 0.3 / 60, 2 ** -7, 3 * 2 ** -48, -0.4 / 20):
+            values = [0.0, 5e-324] + [rng.uniform(0, 100) for _ in range(30)]
+            counts = [rng.randrange(4000) for _ in values]
+            expected = []
+            for value, count in zip(values, counts):
+                for _ in range(count):
+                    value += increment
+                expected.append(value)
+            np.testing.assert_array_equal(accumulate(values, increment, counts), expected)
+
+    def test_idle_world_processes_few_events(self):
+        """Test that idle simlings cost nothing between threshold crossings."""
+        world = World(fixed_dt=1 / 60, contention=False, social=False)
+        world.add_simling(x=0, y=0)  # No food or beds: nothing can ever happen
+        scheduler = EventScheduler(world)
+        scheduler.advance(3600)
+        self.assertEqual(scheduler.events_processed, 0)
+        self.assertAlmostEqual(world.simlings[0].fun, 100.0)
+
+    def test_reschedule_after_command(self):
+        """Test that a player command issued mid-run is picked up."""
+        self.ticked.run(10)
+        self.scheduler.advance(10)
+        for world in (self.ticked, self.evented):
+            world.simlings[1].set_player_commanded_target((400, 300))
+        self.scheduler.reschedule(self.evented.simlings[1])
+        self.ticked.run(20)
+        self.scheduler.advance(20)
+        self.assertSameState()
+
+    def test_new_simlings_are_adopted(self):
+        """Test that simlings added after the scheduler was created get scheduled."""
+        for world in (self.ticked, self.evented):
+            simling = world.add_simling(x=10, y=10)
+            simling.hunger = 69.0
+        self.ticked.run(20)
+        self.scheduler.advance(20)
+        self.assertSameState()
+
+    def test_rejects_contention(self):
+        """Test that a World with queues at objects, the default, can't be fast-forwarded."""
+        with self.assertRaises(ValueError):
+            EventScheduler(World(social=False))
+
+    def test_rejects_conversations(self):
+        """Test that a World where simlings talk, the default, can't be fast-forwarded."""
+        with self.assertRaises(ValueError):
+            EventScheduler(World(contention=False))
+
+
+if __name__ == '__main__':
+    unittest.main()
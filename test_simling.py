@@ -1,4 +1,6 @@
+import gc
 import unittest
+import weakref
 from simling import Simling
 from objects import FoodSource, Bed
 import pygame # Simling __init__ tries to load an image, which needs pygame.display.set_mode()
@@ -107,6 +109,15 @@ class TestSimlingNeeds(unittest.TestCase):
         bed.use(self.simling)
         self.assertAlmostEqual(self.simling.sleep, 0.0)
 
+    def test_standalone_simling_is_freed(self):
+        """Test that a simling made without a population doesn't outlive its last reference."""
+        other = Simling(x=5, y=5)
+        self.assertIsNot(other._population, self.simling._population)
+        population = weakref.ref(other._population)
+        del other
+        gc.collect()
+        self.assertIsNone(population())
+
 
 class TestSimlingAI(unittest.TestCase):
 
@@ -0,0 +1,187 @@
+import os
+import struct
+import tempfile
+import unittest
+import numpy as np
+from snapshot import VERSION, Snapshot, SnapshotWriter, StreamReader, StreamWriter
+from utility import BALANCED, UtilityAI
+from world import World
+
+
+def make_world():
+    world = World(fixed_dt=1 / 10, seed=4)
+    world.add_food_source(x=50, y=50)
+    world.add_food_source(x=700, y=500)
+    world.add_bed(x=400, y=50)
+    world.add_wall(x=300, y=200, width=20, height=200)
+    for simling in world.spawn_simlings(40, 800, 600):
+        simling.hunger = world.rng.uniform(50, 90)
+        simling.sleep = world.rng.uniform(50, 90)
+    world.simlings[0].set_player_commanded_target((600, 300))
+    world.remove_simling(world.simlings[3])
+    world.add_simling(x=5, y=5)  # Reuses slot 3, so list order and slot order differ
+    world.run(2)
+    return world
+
+
+def state(world):
+    return [(simling.x, simling.y, simling.target_x, simling.target_y, simling.hunger, simling.sleep,
+             simling.current_action, simling.target_object and simling.target_object.center)
+            for simling in world.simlings]
+
+
+class TestSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "world.snap")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_save_load_restore(self):
+        """Test that a restored world carries on exactly like the original."""
+        world = make_world()
+        Snapshot.capture(world).save(self.path)
+        snapshot = Snapshot.load(self.path)
+        restored = snapshot.restore()
+        snapshot.close()
+        self.assertEqual(state(restored), state(world))
+        self.assertEqual((restored.tick, restored.time), (world.tick, world.time))
+        self.assertEqual(restored.rng.random(), world.rng.random())
+        world.run(5)
+        restored.run(5)
+        self.assertEqual(state(restored), state(world))
+
+    def test_load_is_zero_copy(self):
+        """Test that loaded columns are views onto the mapped file."""
+        Snapshot.capture(make_world()).save(self.path)
+        snapshot = Snapshot.load(self.path)
+        x = snapshot.columns["x"]
+        self.assertFalse(x.flags.owndata)
+        self.assertFalse(x.flags.writeable)
+        self.assertEqual(len(snapshot), 40)
+        del x
+        snapshot.close()
+
+    def test_background_writer(self):
+        """Test that snapshots queued on the writer thread end up on disk."""
+        world = make_world()
+        writer = SnapshotWriter()
+        writer.save(Snapshot.capture(world), self.path)
+        writer.close()
+        snapshot = Snapshot.load(self.path)
+        self.assertEqual(snapshot.tick, world.tick)
+        snapshot.close()
+
+    def test_failed_save_keeps_the_old_file(self):
+        """Test that saves replace the file whole, and one that fails leaves the previous save."""
+        world = make_world()
+        Snapshot.capture(world).save(self.path)
+        world.run(1)
+        broken = Snapshot.capture(world)
+        broken.to_buffer = lambda: 1 / 0
+        with self.assertRaises(ZeroDivisionError):
+            broken.save(self.path)
+        self.assertEqual(os.listdir(self.directory.name), ["world.snap"])
+        snapshot = Snapshot.load(self.path)
+        self.assertEqual(snapshot.tick, world.tick - 10)
+        snapshot.close()
+
+    def test_version_1_is_upgraded(self):
+        """Test that a snapshot in the first version 1 layout restores, and unknown versions are rejected."""
+        world = make_world()
+        snapshot = Snapshot.capture(world)
+        for name in ("talk_until", "list_order", "partner_row", "queue_position", "queued_since",
+                     "food_busy_until", "bed_busy_until", "tv_busy_until", "tv_x", "tv_y"):
+            del snapshot.columns[name]
+        buffer = snapshot.to_buffer()
+        struct.pack_into("<H", buffer, 8, 1)
+        restored = Snapshot.from_buffer(buffer).restore()
+        expected = state(world)
+        by_slot = sorted(range(len(expected)), key=lambda i: world.simlings[i].index)  # It had no list order
+        self.assertEqual(state(restored), [expected[i] for i in by_slot])
+        self.assertEqual(restored.rng.random(), world.rng.random())
+        defaults = World()
+        self.assertEqual((restored.contention, restored.interactions is not None, restored.ai),
+                         (defaults.contention, True, defaults.ai))
+        struct.pack_into("<H", buffer, 8, VERSION + 1)
+        with self.assertRaises(ValueError):
+            Snapshot.from_buffer(buffer)
+
+    def test_settings_round_trip(self):
+        """Test that contention, social and the AI come back as they were, not as World's defaults."""
+        world = World(fixed_dt=1 / 10, seed=6, contention=False, social=False, ai=BALANCED)
+        world.add_food_source(x=100, y=100)
+        for simling in world.spawn_simlings(20, 800, 600):
+            simling.hunger = world.rng.uniform(60, 100)
+        world.run(3)
+        Snapshot.capture(world).save(self.path)
+        snapshot = Snapshot.load(self.path)
+        restored = snapshot.restore()
+        snapshot.close()
+        self.assertFalse(restored.contention)
+        self.assertIsNone(restored.food_sources.reservations)
+        self.assertIsNone(restored.interactions)
+        self.assertNotIn("interactions", restored.world_objects)
+        self.assertIs(restored.world_objects["ai"], BALANCED)
+        world.run(20)
+        restored.run(20)
+        self.assertEqual(state(restored), state(world))
+
+    def test_custom_ai_needs_a_world(self):
+        """Test that an AI the snapshot can't name is refused, unless restoring into a world built with it."""
+        ai = UtilityAI(BALANCED.behaviors[:1])
+        world = World(fixed_dt=1 / 10, seed=6, ai=ai)
+        world.spawn_simlings(5, 800, 600)
+        snapshot = Snapshot.from_buffer(Snapshot.capture(world).to_buffer())
+        with self.assertRaises(ValueError):
+            snapshot.restore()
+        restored = snapshot.restore(World(fixed_dt=1 / 10, ai=ai))
+        self.assertEqual(state(restored), state(world))
+
+    def test_writer_reports_errors(self):
+        """Test that a failed background save is raised from close()."""
+        writer = SnapshotWriter()
+        writer.save(Snapshot.capture(make_world()), os.path.join(self.directory.name, "missing", "world.snap"))
+        with self.assertRaises(OSError):
+            writer.close()
+
+
+class TestSnapshotStream(unittest.TestCase):
+
+    def test_replay_and_seek(self):
+        """Test that every tick of a delta stream decodes back to what was captured."""
+        world = make_world()
+        captured = {}
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "world.stream")
+            writer = SnapshotWriter()
+            stream = StreamWriter(path, keyframe_interval=8, writer=writer)
+            for step in range(30):
+                if step == 13:
+                    world.add_simling(x=10, y=10)  # Layout change, forces a keyframe
+                world.step()
+                snapshot = Snapshot.capture(world)
+                captured[world.tick] = snapshot
+                stream.append(snapshot)
+            stream.close()
+            writer.close()
+
+            reader = StreamReader(path)
+            self.assertEqual(reader.ticks, sorted(captured))
+            kinds = [record[1] for record in reader.records]
+            self.assertEqual(kinds.count(b"KEYF"), 5)  # Steps 0, 8, 13, 21 and 29
+            for replayed in reader:
+                expected = captured[replayed.tick]
+                for name, column in expected.columns.items():
+                    np.testing.assert_array_equal(replayed.columns[name], column)
+            sought = reader.seek(world.tick - 5)
+            self.assertEqual(sought.tick, world.tick - 5)
+            np.testing.assert_array_equal(sought.columns["hunger"], captured[world.tick - 5].columns["hunger"])
+            del replayed, sought
+            reader.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
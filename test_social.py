@@ -0,0 +1,131 @@
+import unittest
+import numpy as np
+from snapshot import Snapshot
+from world import World
+
+
+def lonely(world, x, y):
+    simling = world.add_simling(x=x, y=y)
+    simling.social = 80
+    return simling
+
+
+class TestConversations(unittest.TestCase):
+
+    def setUp(self):
+        self.world = World(fixed_dt=1 / 10)
+        self.interactions = self.world.interactions
+
+    def test_neighbors_meet_talk_and_feel_better(self):
+        """Test that a lonely simling pairs with the closest idle neighbor and both gain from talking."""
+        first = lonely(self.world, 100, 100)
+        second = self.world.add_simling(x=180, y=100)
+        far = self.world.add_simling(x=600, y=500)  # Out of reach
+        self.world.step()
+        self.assertEqual((first.current_action, second.current_action, far.current_action),
+                         ("seeking_social", "seeking_social", "idle"))
+        self.assertIs(self.interactions.partner_of(first), second)
+        self.assertEqual((first.target_x, second.target_x), (130, 150))
+        self.world.run(1.5)  # 40 units to go at speed 50
+        self.assertEqual((first.current_action, second.current_action), ("talking", "talking"))
+        self.world.run(self.interactions.conversation_seconds)
+        self.assertEqual((first.current_action, second.current_action), ("idle", "idle"))
+        self.assertLess(first.social, 80 - self.interactions.relief + 10)
+        self.assertLess(second.social, 5)  # 50 - relief, clamped at 0
+        self.assertEqual((self.interactions.conversations, self.interactions.finished), (1, 1))
+
+    def test_busy_simlings_are_left_alone(self):
+        """Test that simlings with a more pressing need, or with something to do, aren't picked."""
+        self.world.add_food_source(x=700, y=500)
+        first = lonely(self.world, 100, 100)
+        hungry = self.world.add_simling(x=110, y=100)
+        hungry.hunger = 80
+        commanded = self.world.add_simling(x=120, y=100)
+        commanded.set_player_commanded_target((700, 100))
+        self.world.step()
+        self.assertEqual(first.current_action, "idle")
+        self.assertIsNone(self.interactions.partner_of(first))
+
+    def test_walking_away_ends_the_conversation(self):
+        """Test that a partner sent elsewhere cuts the conversation short, with nothing gained."""
+        first = lonely(self.world, 100, 100)
+        second = self.world.add_simling(x=130, y=100)
+        self.world.run(1.0)
+        self.assertEqual(first.current_action, "talking")
+        second.set_player_commanded_target((600, 100))
+        self.world.step()
+        self.assertEqual(first.current_action, "idle")
+        self.assertGreater(first.social, 80)
+        self.assertEqual(self.interactions.finished, 0)
+
+    def test_batched_matches_per_simling(self):
+        """Test that update_many pairs and talks exactly like per-simling update()."""
+        worlds = [World(fixed_dt=1 / 10, seed=3) for _ in range(2)]
+        for world in worlds:
+            world.spawn_simlings(60, 800, 600)
+            for simling in world.simlings:
+                simling.social = world.rng.uniform(40, 90)
+                simling.fun = world.rng.uniform(40, 90)
+            world.add_television(x=400, y=300)
+        batched, single = worlds
+        for _ in range(200):
+            batched.step()
+            single.serve_queues()
+            for simling in single.simlings:
+                simling.update(single.fixed_dt, single.world_objects)
+            single.time += single.fixed_dt
+        self.assertGreater(batched.interactions.finished, 5)
+        for a, b in zip(batched.simlings, single.simlings):
+            self.assertEqual(a.current_action, b.current_action)
+            self.assertAlmostEqual(a.social, b.social)
+            self.assertAlmostEqual(a.fun, b.fun)
+        self.assertTrue(np.array_equal(batched.population.partner, single.population.partner))
+
+    def test_snapshot_keeps_conversations(self):
+        """Test that a world restored mid-conversation carries on exactly like the original."""
+        lonely(self.world, 100, 100)
+        self.world.add_simling(x=130, y=100)
+        lonely(self.world, 400, 100)
+        self.world.add_simling(x=500, y=100)
+        self.world.run(1.0)
+        restored = Snapshot.capture(self.world).restore()
+        self.world.run(5.0)
+        restored.run(5.0)
+        for a, b in zip(self.world.simlings, restored.simlings):
+            self.assertEqual((a.current_action, a.social), (b.current_action, b.social))
+        self.assertEqual(restored.interactions.finished, 2)
+
+
+class TestTelevision(unittest.TestCase):
+
+    def test_bored_simling_watches_tv(self):
+        """Test that a bored simling goes to a television and it takes away boredom."""
+        world = World(fixed_dt=1 / 10, social=False)
+        television = world.add_television(x=100, y=100)
+        simling = world.add_simling(x=105, y=100)
+        simling.fun = 80
+        world.step()
+        self.assertEqual((simling.current_action, simling.target_object), ("seeking_fun", television))
+        world.run(1.0)
+        self.assertEqual(simling.current_action, "idle")
+        self.assertLess(simling.fun, 30)
+        self.assertEqual(world.televisions.reservations.metrics()[0]["uses"], 1)
+
+
+class TestNeighborQueries(unittest.TestCase):
+
+    def test_within_radius(self):
+        """Test that within() finds exactly the simlings in range, across cells."""
+        world = World(seed=1)
+        world.spawn_simlings(300, 800, 600)
+        picker = world.interactions.neighbors
+        picker.sync()
+        population = world.population
+        for x, y in ((0, 0), (400, 300), (149, 151), (799, 10)):
+            distance = np.hypot(population.x[:300] - x, population.y[:300] - y)
+            expected = np.flatnonzero(distance <= 150)
+            self.assertEqual(picker.within(x, y, 150).tolist(), expected.tolist())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+import random
+import unittest
+from simling import Simling
+from objects import FoodSource, Bed
+from population import Population
+from spatial import ObjectGrid, closest_objects
+
+
+def linear_nearest(objects, x, y):
+    best, best_dist = None, float('inf')
+    for obj in objects:
+        dx = obj.center[0] - x
+        dy = obj.center[1] - y
+        if dx*dx + dy*dy < best_dist:
+            best, best_dist = obj, dx*dx + dy*dy
+    return best
+
+
+class TestObjectGrid(unittest.TestCase):
+
+    def setUp(self):
+        rng = random.Random(42)
+        self.objects = [FoodSource(x=rng.uniform(0, 2000), y=rng.uniform(0, 1500)) for _ in range(150)]
+        self.objects += [Bed(x=rng.uniform(0, 2000), y=rng.uniform(0, 1500)) for _ in range(50)]
+        self.grid = ObjectGrid(self.objects, cell_size=100)
+        self.points = [(rng.uniform(-500, 2500), rng.uniform(-500, 2000)) for _ in range(500)]
+
+    def test_nearest_matches_linear_scan(self):
+        """Test that single queries agree with a linear scan."""
+        for x, y in self.points:
+            self.assertIs(self.grid.nearest(x, y), linear_nearest(self.objects, x, y))
+
+    def test_nearest_many_matches_linear_scan(self):
+        """Test that batched queries agree with a linear scan, for grids and lists."""
+        xs = [p[0] for p in self.points]
+        ys = [p[1] for p in self.points]
+        expected = [linear_nearest(self.objects, x, y) for x, y in self.points]
+        self.assertEqual(self.grid.nearest_many(xs, ys), expected)
+        self.assertEqual(closest_objects(self.objects, xs, ys), expected)
+
+    def test_query_overlapping_matches_linear_scan(self):
+        """Test that overlap queries find every object whose box touches the rectangle, in insertion order."""
+        def overlaps(obj, left, top):
+            width, height = obj.size if isinstance(obj.size, tuple) else (obj.size, obj.size)
+            return obj.x < left + 300 and obj.x + width > left and obj.y < top + 200 and obj.y + height > top
+        for left, top in self.points[:50]:
+            expected = [obj for obj in self.objects if overlaps(obj, left, top)]
+            self.assertEqual(self.grid.query_overlapping(left, top, 300, 200), expected)
+
+    def test_ties_go_to_first_inserted(self):
+        """Test that equidistant objects resolve in insertion order like the list scan."""
+        left, right = FoodSource(x=0, y=0), FoodSource(x=100, y=0)
+        grid = ObjectGrid([right, left], cell_size=30)
+        self.assertIs(grid.nearest(65, 15), right)
+        self.assertIs(grid.nearest_many([65], [15])[0], right)
+
+    def test_layouts_match_linear_scan(self):
+        """Test nearest and k-nearest queries on few, clustered, collinear and stacked objects, near and far."""
+        rng = random.Random(7)
+        layouts = {
+            "few": [FoodSource(x=50, y=50), FoodSource(x=700, y=500)],
+            "clustered": [FoodSource(x=rng.uniform(0, 100), y=rng.uniform(0, 100)) for _ in range(300)],
+            "collinear": [FoodSource(x=rng.uniform(0, 3000), y=20) for _ in range(200)],
+            "stacked": [FoodSource(x=40 * (i % 10), y=40 * (i // 10 % 10)) for i in range(250)],  # Many ties
+        }
+        points = [(rng.uniform(-3000, 6000), rng.uniform(-3000, 6000)) for _ in range(300)]
+        points += [(rng.uniform(0, 400), rng.uniform(0, 400)) for _ in range(300)]
+        xs, ys = [p[0] for p in points], [p[1] for p in points]
+        for name, objects in layouts.items():
+            with self.subTest(name):
+                grid = ObjectGrid(objects)
+                expected = [linear_nearest(objects, x, y) for x, y in points]
+                self.assertEqual(grid.nearest_many(xs, ys), expected)
+                self.assertEqual([grid.nearest(x, y) for x, y in points], expected)
+                distances = [[(obj.center[0] - x) ** 2 + (obj.center[1] - y) ** 2 for obj in objects]
+                             for x, y in points]
+                expected = [sorted(range(len(objects)), key=row.__getitem__)[:5] for row in distances]
+                self.assertEqual(grid.nearest_k(xs, ys, 5).tolist(), [row[:len(objects)] for row in expected])
+
+    def test_incremental_updates(self):
+        """Test that add, remove and move keep the index consistent."""
+        far = self.objects[0]
+        self.grid.remove(far)
+        self.assertNotIn(far, self.grid)
+        self.assertEqual(len(self.grid), 199)
+        far.x, far.y = 5000, 5000
+        self.grid.append(far)
+        self.assertIs(self.grid.nearest(5010, 5010), far)
+        far.x, far.y = -3000, -3000
+        self.grid.move(far)
+        self.assertIs(self.grid.nearest(-2990, -2990), far)
+        remaining = list(self.grid)
+        for x, y in self.points[:100]:
+            self.assertIs(self.grid.nearest(x, y), linear_nearest(remaining, x, y))
+
+    def test_query_rect(self):
+        """Test that rectangle queries return the objects with centers inside."""
+        found = set(self.grid.query_rect(200, 300, 400, 250))
+        expected = {obj for obj in self.objects
+                    if 200 <= obj.center[0] < 600 and 300 <= obj.center[1] < 550}
+        self.assertEqual(found, expected)
+
+    def test_simlings_use_grid(self):
+        """Test that seeking food through a grid picks the same food as through a list."""
+        for objects in (self.objects[:150], ObjectGrid(self.objects[:150], cell_size=100)):
+            population = Population()
+            simlings = [Simling(x=x, y=y, population=population) for x, y in self.points[:50]]
+            for simling in simlings:
+                simling.hunger = 80.0
+            Simling.update_many(0.0, {"food_sources": objects}, population=population)
+            chosen = [simling.target_object for simling in simlings]
+            expected = [linear_nearest(self.objects[:150], s.x + s.size / 2, s.y + s.size / 2) for s in simlings]
+            self.assertEqual(chosen, expected)
+            self.assertIs(simlings[0].find_closest_object(objects), expected[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
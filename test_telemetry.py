@@ -0,0 +1,186 @@
+import io
+import json
+import logging
+import socket
+import time
+import unittest
+import numpy as np
+from telemetry import (DeltaEncoder, TelemetryServer, apply_message, capture_frame, encode_message, read_message,
+                       start_logging)
+from world import World
+
+
+def expected_state(world):
+    columns, _ = capture_frame(world)
+    return {row: {name: columns[name][i] for name in ("x", "y", "hunger")}
+            for i, row in enumerate(columns["id"].tolist())}
+
+
+def matches(test, state, world):
+    expected = expected_state(world)
+    test.assertEqual(state.keys(), expected.keys())
+    for simling_id, values in expected.items():
+        for name, value in values.items():
+            test.assertAlmostEqual(state[simling_id][name], value, delta=0.051)  # Sent rounded to 0.1
+
+
+class Subscriber:
+    """Test client reading messages from a TelemetryServer."""
+
+    def __init__(self, port):
+        self.connection = socket.create_connection(("127.0.0.1", port))
+        self.connection.settimeout(10)
+        self.stream = self.connection.makefile("rb")
+        self.state = {}
+        self.messages = []
+        assert read_message(self.stream)["type"] == "hello"
+
+    def read_until(self, tick):
+        while True:
+            message = read_message(self.stream)
+            self.messages.append(message)
+            apply_message(self.state, message)
+            if message["metrics"]["tick"] >= tick:
+                return
+
+    def close(self):
+        self.stream.close()
+        self.connection.close()
+
+
+def wait_for_clients(server, count):
+    deadline = time.monotonic() + 5
+    while server.clients < count and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+class TestDeltaEncoder(unittest.TestCase):
+
+    def test_deltas_rebuild_the_state(self):
+        """Test that a keyframe and the deltas after it rebuild the world, including removed simlings."""
+        world = World(fixed_dt=1 / 10, seed=2)
+        world.spawn_simlings(50, 800, 600)
+        world.add_food_source(x=400, y=300)
+        encoder = DeltaEncoder(keyframe_interval=1000)
+        state = {}
+        for tick in range(30):
+            world.step()
+            if tick == 10:
+                world.remove_simling(world.simlings[5])
+                world.add_simling(x=10, y=10)
+            message = encoder.encode(*capture_frame(world))
+            self.assertEqual(message["type"], "keyframe" if tick == 0 else "delta")
+            apply_message(state, message)
+        matches(self, state, world)
+        self.assertLess(len(message["simlings"]["id"]), 51)
+        world.step()  # Nothing visibly changes in a tenth of a second for most simlings
+        quiet = encoder.encode(*capture_frame(world))
+        self.assertLess(len(quiet["simlings"]["id"]), 50)
+
+    def test_messages_survive_the_wire(self):
+        """Test that keyframes and deltas read back from their bytes with the same columns and removed ids."""
+        world = World(fixed_dt=1 / 10, seed=3)
+        world.spawn_simlings(40, 800, 600)
+        encoder = DeltaEncoder()
+        keyframe = encoder.encode(*capture_frame(world))
+        world.remove_simling(world.simlings[7])
+        world.step()
+        delta = encoder.encode(*capture_frame(world))
+        stream = io.BytesIO(encode_message(keyframe) + encode_message(delta))
+        for sent in (keyframe, delta):
+            received = read_message(stream)
+            self.assertEqual((received["type"], received["metrics"]), (sent["type"], sent["metrics"]))
+            self.assertEqual(list(received["simlings"]), list(sent["simlings"]))
+            for name, column in sent["simlings"].items():
+                np.testing.assert_array_equal(received["simlings"][name], column, err_msg=name)
+        np.testing.assert_array_equal(received["removed"], delta["removed"])
+        self.assertEqual(len(delta["removed"]), 1)
+        self.assertIsNone(read_message(stream))
+
+
+class TestTelemetryServer(unittest.TestCase):
+
+    def setUp(self):
+        self.world = World(fixed_dt=1 / 10, seed=4)
+        self.world.spawn_simlings(2000, 800, 600)
+
+    def test_streams_to_subscribers(self):
+        """Test that a subscriber rebuilds the world from the stream, and publishing without one is free."""
+        server = TelemetryServer(keyframe_interval=5)
+        self.addCleanup(server.close)
+        self.assertFalse(server.publish(self.world))
+        subscriber = Subscriber(server.port)
+        self.addCleanup(subscriber.close)
+        wait_for_clients(server, 1)
+        for _ in range(12):
+            self.world.step()
+            server.publish(self.world, frame_seconds=0.016)
+            subscriber.read_until(self.world.tick)
+        matches(self, subscriber.state, self.world)
+        types = [message["type"] for message in subscriber.messages]
+        self.assertEqual(types.count("keyframe"), 3)
+        metrics = subscriber.messages[-1]["metrics"]
+        self.assertEqual((metrics["simlings"], metrics["frame_ms"]), (2000, 16.0))
+
+    def test_slow_subscriber_does_not_hold_up_the_others(self):
+        """Test that a subscriber that never reads loses frames, while publish and the others keep going."""
+        server = TelemetryServer(keyframe_interval=1000, client_queue=2, max_pending=64)
+        self.addCleanup(server.close)
+        stuck = socket.create_connection(("127.0.0.1", server.port))
+        stuck.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+        self.addCleanup(stuck.close)
+        subscriber = Subscriber(server.port)
+        self.addCleanup(subscriber.close)
+        wait_for_clients(server, 2)
+        for _ in range(60):
+            self.world.step()
+            self.assertTrue(server.publish(self.world))
+            subscriber.read_until(self.world.tick)
+        matches(self, subscriber.state, self.world)
+        self.assertGreater(server.client_dropped, 0)
+        self.assertEqual(server.dropped, 0)
+        # The reader got every tick, and no keyframe beyond its first: the resyncs were only the stuck one's
+        self.assertEqual([message["metrics"]["tick"] for message in subscriber.messages], list(range(1, 61)))
+        self.assertEqual([message["type"] for message in subscriber.messages].count("keyframe"), 1)
+
+    def test_rate_limit(self):
+        """Test that with a rate, publish() skips frames that come sooner than 1/rate after the last one."""
+        server = TelemetryServer(rate=2)
+        self.addCleanup(server.close)
+        subscriber = Subscriber(server.port)
+        self.addCleanup(subscriber.close)
+        wait_for_clients(server, 1)
+        published = [server.publish(self.world) for _ in range(20)]
+        self.assertEqual(published, [True] + [False] * 19)
+        time.sleep(0.55)
+        self.assertTrue(server.publish(self.world))
+
+    def test_port_in_use(self):
+        """Test that a server that can't listen raises instead of hanging."""
+        taken = socket.socket()
+        self.addCleanup(taken.close)
+        taken.bind(("127.0.0.1", 0))
+        taken.listen()
+        with self.assertRaises(OSError):
+            TelemetryServer(port=taken.getsockname()[1])
+
+
+class TestLogging(unittest.TestCase):
+
+    def test_json_lines(self):
+        """Test that records come out as JSON lines with their data, written off the calling thread."""
+        stream = io.StringIO()
+        listener = start_logging("simling.test", stream=stream)
+        logger = logging.getLogger("simling.test")
+        self.addCleanup(logger.handlers.clear)
+        logger.info("Selected %d Simlings", 3, extra={"data": {"count": 3}})
+        logger.debug("Not shown")
+        listener.stop()
+        entries = [json.loads(line) for line in stream.getvalue().splitlines()]
+        self.assertEqual(len(entries), 1)
+        self.assertEqual((entries[0]["message"], entries[0]["count"], entries[0]["level"]),
+                         ("Selected 3 Simlings", 3, "INFO"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import unittest
+import numpy as np
+from scheduler import EventScheduler
+from utility import CLASSIC, BALANCED, Behavior, Linear, Step, UtilityAI
+from world import World
+
+
+def needy_world(ai=CLASSIC, **needs):
+    world = World(fixed_dt=1 / 10, contention=False, social=False, ai=ai)
+    world.add_food_source(x=300, y=100)
+    world.add_bed(x=100, y=300)
+    simling = world.add_simling(x=100, y=100)
+    for name, value in needs.items():
+        setattr(simling, name, value)
+    return world, simling
+
+
+class TestUtilityAI(unittest.TestCase):
+
+    def test_classic_keeps_the_old_priorities(self):
+        """Test that the classic configuration prefers food over sleep, however much sleepier."""
+        world, simling = needy_world(hunger=71, sleep=99)
+        world.step()
+        self.assertEqual(simling.current_action, "seeking_food")
+        world, simling = needy_world(hunger=69.9, sleep=71)  # 69.95 after the step, not over 70
+        world.step()
+        self.assertEqual(simling.current_action, "seeking_sleep")
+
+    def test_balanced_goes_for_the_most_pressing_need(self):
+        """Test that with linear curves the higher need wins instead."""
+        world, simling = needy_world(ai=BALANCED, hunger=75, sleep=95)
+        world.step()
+        self.assertEqual(simling.current_action, "seeking_sleep")
+        world, simling = needy_world(ai=BALANCED, hunger=65, sleep=55)
+        world.step()
+        self.assertEqual(simling.current_action, "seeking_food")
+
+    def test_decide_scores_a_batch(self):
+        """Test that decide() gives every simling its best behavior, or -1, and skips missing objects."""
+        world = World(social=False)
+        world.add_food_source(x=0, y=0)
+        for hunger, sleep in ((80, 80), (10, 80), (10, 10)):
+            simling = world.add_simling(x=0, y=0)
+            simling.hunger, simling.sleep = hunger, sleep
+        indices = world.population.indices()
+        self.assertEqual(CLASSIC.decide(world.population, indices, world.world_objects).tolist(), [0, -1, -1])
+        self.assertEqual(CLASSIC.wants(world.population, indices, world.world_objects).tolist(),
+                         [True, False, False])
+        world.add_bed(x=0, y=0)
+        self.assertEqual(CLASSIC.decide(world.population, indices, world.world_objects).tolist(), [0, 1, -1])
+
+    def test_distance_curve(self):
+        """Test that a distance curve makes far objects less attractive."""
+        ai = UtilityAI([
+            Behavior("seeking_food", "hunger", Linear(50, 100), objects="food_sources",
+                     distance_curve=lambda distances: np.where(distances > 500, 0.1, 1.0)),
+            Behavior("seeking_sleep", "sleep", Step(70), weight=0.5, objects="beds"),
+        ])
+        world = World(social=False, ai=ai)
+        food = world.add_food_source(x=0, y=0)
+        world.add_bed(x=0, y=0)
+        near = world.add_simling(x=0, y=0)
+        far = world.add_simling(x=700, y=0)
+        for simling in (near, far):
+            simling.hunger, simling.sleep = 90, 80
+        choice = ai.decide(world.population, world.population.indices(), world.world_objects)
+        self.assertEqual(choice.tolist(), [0, 1])
+        world.step()
+        self.assertEqual((near.target_object, far.current_action), (food, "seeking_sleep"))
+
+    def test_scheduler_follows_the_ai(self):
+        """Test that the event scheduler wakes simlings at the floors of the world's curves."""
+        for ai, expected in ((CLASSIC, "idle"), (BALANCED, "seeking_food")):
+            world, simling = needy_world(ai=ai, hunger=62)
+            EventScheduler(world).advance(1)
+            self.assertEqual(simling.current_action, expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
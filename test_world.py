@@ -0,0 +1,58 @@
+import unittest
+import assets
+from world import World
+
+
+class TestHeadlessWorld(unittest.TestCase):
+    # Deliberately no pygame.display setup: the world must run without one.
+
+    def setUp(self):
+        self.world = World(fixed_dt=0.5)
+        self.simling = self.world.add_simling(x=100, y=100)
+        self.world.add_food_source(x=50, y=50)
+        self.world.add_food_source(x=700, y=500)
+        self.world.add_bed(x=400, y=50)
+        self.world.add_bed(x=100, y=500)
+
+    def test_long_run_keeps_needs_in_check(self):
+        """Test that a day of simulated time runs headless and simlings eat and sleep."""
+        self.world.fixed_dt = 2.0
+        disk_loads = assets.stats()["disk_loads"]
+        steps = self.world.run(24 * 3600)
+        self.assertEqual(steps, 24 * 3600 // 2)
+        self.assertAlmostEqual(self.world.time, 24 * 3600)
+        self.assertLess(self.simling.hunger, 100.0)
+        self.assertLess(self.simling.sleep, 100.0)
+        self.assertEqual(assets.stats()["disk_loads"], disk_loads)  # Never drawn, never loaded
+
+    def test_advance_uses_fixed_steps(self):
+        """Test that advance() carries leftover time over to the next call."""
+        self.assertEqual(self.world.advance(1.2), 2)
+        self.assertEqual(self.world.advance(0.3), 1)
+        self.assertEqual(self.world.tick, 3)
+        self.assertAlmostEqual(self.world.time, 1.5)
+
+    def test_chunking_does_not_change_result(self):
+        """Test that the same simulated time gives the same state however it is split."""
+        other = World(fixed_dt=0.5)
+        other_simling = other.add_simling(x=100, y=100)
+        other.add_food_source(x=50, y=50)
+        other.add_food_source(x=700, y=500)
+        other.add_bed(x=400, y=50)
+        other.add_bed(x=100, y=500)
+        self.world.run(600)
+        for _ in range(600):
+            other.advance(1.0)
+        self.assertEqual((self.simling.x, self.simling.y, self.simling.hunger),
+                         (other_simling.x, other_simling.y, other_simling.hunger))
+
+    def test_remove_simling(self):
+        """Test that removed simlings stop being updated."""
+        self.world.remove_simling(self.simling)
+        self.assertEqual(len(self.world.population), 0)
+        self.world.step()
+        self.assertEqual(self.world.simlings, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
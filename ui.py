@@ -0,0 +1,169 @@
+import pygame
+from cache import LRUCache
+
+
+class TextCache:
+    """Rendered text surfaces keyed by (string, color, font, antialias).
+
+    Fonts are keyed by identity, so keep using the same Font object.
+    """
+
+    def __init__(self, max_entries=256):
+        self._surfaces = LRUCache(max_entries)
+
+    def render(self, font, text, color, antialias=True):
+        key = (text, color, font, antialias)
+        surface = self._surfaces.get(key)
+        if surface is None:
+            surface = font.render(text, antialias, color)
+            self._surfaces.put(key, surface)
+        return surface
+
+    def stats(self):
+        return self._surfaces.stats()
+
+
+# Shared by all UI text
+default_text_cache = TextCache()
+
+
+class TextPanel:
+    """Lines of text drawn at a fixed position, usable as a Renderer overlay.
+
+    Subclasses implement lines(), returning the strings to show or None to
+    hide the panel. layout() renders the lines and returns the area they
+    will cover (or None when hidden), draw() blits them. A line is only
+    looked up again when its string changes, and rendering goes through a
+    TextCache, so values that flip back and forth don't hit the font
+    rasterizer either.
+    """
+
+    START_Y = 10
+    LINE_HEIGHT = 25  # Pixels between lines of text
+    MARGIN_X = 10
+
+    def __init__(self, font, color=(0, 0, 0), text_cache=None):  # Black text by default
+        self.font = font
+        self.color = color
+        self.text_cache = text_cache if text_cache is not None else default_text_cache
+        self._texts = []
+        self._surfaces = []
+        self.changed = True  # Whether the last layout() changed anything on screen
+
+    def lines(self):
+        raise NotImplementedError
+
+    def layout(self):
+        texts = self.lines()
+        if texts is None:
+            self.changed = bool(self._texts)
+            self._texts = []
+            self._surfaces = []
+            return None
+        self.changed = len(texts) != len(self._texts)
+        if self.changed:
+            self._texts = [None] * len(texts)
+            self._surfaces = [None] * len(texts)
+        for i, text in enumerate(texts):
+            if text != self._texts[i]:
+                self._texts[i] = text
+                self._surfaces[i] = self.text_cache.render(self.font, text, self.color)
+                self.changed = True
+        rects = [surface.get_rect(topleft=(self.MARGIN_X, self.START_Y + i * self.LINE_HEIGHT))
+                 for i, surface in enumerate(self._surfaces)]
+        return rects[0].unionall(rects[1:])
+
+    def draw(self, surface):
+        for i, text_surface in enumerate(self._surfaces):
+            surface.blit(text_surface, (self.MARGIN_X, self.START_Y + i * self.LINE_HEIGHT))
+
+
+class SelectedSimlingPanel(TextPanel):
+    """Needs readout for the selected simling, in the top-left corner."""
+
+    def __init__(self, font, color=(0, 0, 0), text_cache=None):
+        super().__init__(font, color, text_cache)
+        self.simling = None
+        self.title = "Selected Simling:"  # E.g. for the hovered simling instead
+
+    def lines(self):
+        simling = self.simling
+        if simling is None:
+            return None
+        return [
+            self.title,
+            f" - Hunger: {simling.hunger:.1f}",
+            f" - Sleep: {simling.sleep:.1f}",
+            f" - Social: {simling.social:.1f}",
+            f" - Fun: {simling.fun:.1f}",
+            f" - Action: {simling.current_action}",
+        ]
+
+
+class ProfilerOverlay(TextPanel):
+    """Frame time percentiles per phase from a FrameProfiler, shown while it is enabled.
+
+    The numbers are refreshed every refresh_frames frames so they stay
+    readable (and the text isn't re-rendered every frame).
+    """
+
+    LINE_HEIGHT = 18
+
+    def __init__(self, profiler, font, x=560, color=(0, 0, 160), text_cache=None, refresh_frames=30):
+        super().__init__(font, color, text_cache)
+        self.profiler = profiler
+        self.MARGIN_X = x
+        self.refresh_frames = refresh_frames
+        self._lines = None
+        self._refreshed_at = None
+
+    def lines(self):
+        profiler = self.profiler
+        if not profiler.enabled:
+            self._lines = None
+            return None
+        frame = profiler.frame_count
+        if self._lines is None or frame - self._refreshed_at >= self.refresh_frames:
+            self._lines = self._format()
+            self._refreshed_at = frame
+        return self._lines
+
+    def _format(self):
+        lines = ["ms          p50    p95    p99"]
+        for phase, stats in self.profiler.summary().items():
+            if stats is not None:
+                lines.append(f"{phase:10s}" + "".join(f"{value * 1000:7.2f}" for value in stats.values()))
+        agents = self.profiler.percentiles("per_agent")
+        if agents is not None:
+            lines.append(f"per agent {agents['p50'] * 1e6:6.2f} us (p50)")
+        if self.profiler.capturing:
+            lines.append("cProfile capture running")
+        return lines
+
+
+class SelectionBox:
+    """Outline of the box being dragged out to select simlings, as a Renderer overlay.
+
+    start and end are the screen positions of the drag, None when there is none.
+    """
+
+    def __init__(self, color=(0, 120, 255)):
+        self.color = color
+        self.start = None
+        self.end = None
+        self.changed = True
+        self._rect = None
+
+    def layout(self):
+        rect = None
+        if self.start is not None and self.end is not None:
+            left, right = sorted((self.start[0], self.end[0]))
+            top, bottom = sorted((self.start[1], self.end[1]))
+            rect = pygame.Rect(left, top, right - left + 1, bottom - top + 1)
+        self.changed = rect != self._rect
+        self._rect = rect
+        return rect
+
+    def draw(self, surface):
+        if self._rect is not None:
+            pygame.draw.rect(surface, self.color, self._rect, 1)
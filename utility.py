@@ -0,0 +1,187 @@
+import numpy as np
+from objects import FoodSource, Bed, Television
+from spatial import closest_objects
+
+NEAREST_SCAN = 64  # Up to this many objects, distance curves compare against all of them
+CHUNK_ENTRIES = 1 << 20  # Cap on points x objects distances computed at once
+
+
+class Step:
+    """Scores 1 once the need is over threshold, 0 up to it: the classic "need > 70" check."""
+
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self.floor = threshold  # Values up to this score 0
+
+    def __call__(self, values):
+        return (values > self.threshold).astype(np.float64)
+
+
+class Linear:
+    """Rises from 0 at low to 1 at high, flat outside."""
+
+    def __init__(self, low, high):
+        self.low = low
+        self.high = high
+        self.floor = low
+
+    def __call__(self, values):
+        return np.clip((values - self.low) / (self.high - self.low), 0.0, 1.0)
+
+
+class Falloff:
+    """Distance curve: 1 right at the object, half at half_distance, never quite 0."""
+
+    def __init__(self, half_distance):
+        self.half_distance = half_distance
+
+    def __call__(self, distances):
+        return 1.0 / (1.0 + distances / self.half_distance)
+
+
+class Behavior:
+    """Something an idle simling can decide to do, and how much it wants to.
+
+    The score is weight * curve(need), times distance_curve of the way to
+    the closest of the objects if it has one. objects is the world_objects
+    key of what it goes for: an object kind (kind is its class, checked on
+    arrival) or "interactions" for a conversation (see social.py). A
+    behavior whose objects are missing or empty scores 0.
+    """
+
+    def __init__(self, action, need, curve, weight=1.0, objects=None, kind=None, distance_curve=None):
+        self.action = action  # current_action while doing it
+        self.need = need
+        self.curve = curve
+        self.weight = weight
+        self.objects = objects
+        self.kind = kind
+        self.distance_curve = distance_curve
+
+    def score(self, population, indices, world_objects, nearest_distances):
+        """Scores for the slots in indices. nearest_distances(objects, xs, ys) is UtilityAI's."""
+        scores = self.weight * self.curve(getattr(population, self.need)[indices])
+        if self.distance_curve is not None:
+            wanted = np.flatnonzero(scores > 0)
+            if len(wanted):
+                slots = indices[wanted]
+                half = population.owners[slots[0]].size / 2
+                distances = nearest_distances(world_objects[self.objects],
+                                              population.x[slots] + half, population.y[slots] + half)
+                scores[wanted] *= self.distance_curve(distances)
+        return scores
+
+
+class UtilityAI:
+    """Picks what idle simlings do by scoring every behavior for all of them at once.
+
+    Each behavior is scored over the whole batch in one vectorized pass and
+    the highest score wins, ties going to the earlier behavior. A simling
+    with no positive score stays idle. Which behaviors can score at all
+    depends only on which objects exist, so that table, and the need
+    floors Simling.think_many filters idle simlings with, is cached per
+    set of available objects. So are the centers of each kind of object,
+    for distance curves.
+    """
+
+    def __init__(self, behaviors):
+        self.behaviors = tuple(behaviors)
+        self._by_action = {behavior.action: behavior for behavior in self.behaviors}
+        self._tables = {}
+        self._centers = {}  # id(objects) -> (version, objects, centers array)
+
+    def __getstate__(self):
+        # The caches hold on to world objects, a copy (e.g. sent to a worker process) starts without them
+        state = self.__dict__.copy()
+        state["_tables"] = {}
+        state["_centers"] = {}
+        return state
+
+    def behavior_for(self, action):
+        """The behavior a simling doing action is carrying out, or None."""
+        return self._by_action.get(action)
+
+    def _table(self, world_objects):
+        # Positions of the behaviors whose objects exist
+        key = tuple(bool(world_objects.get(behavior.objects)) if behavior.objects else True
+                    for behavior in self.behaviors)
+        table = self._tables.get(key)
+        if table is None:
+            table = self._tables[key] = {"rows": tuple(row for row, available in enumerate(key) if available)}
+        return table
+
+    def floors(self, world_objects, skip=None):
+        """(need, floor) pairs: the need values up to which no available behavior (but skip) scores."""
+        table = self._table(world_objects)
+        floors = table.get(skip)
+        if floors is None:
+            lowest = {}
+            for row in table["rows"]:
+                behavior = self.behaviors[row]
+                if behavior is not skip:
+                    lowest[behavior.need] = min(lowest.get(behavior.need, np.inf), behavior.curve.floor)
+            floors = table[skip] = tuple(lowest.items())
+        return floors
+
+    def wants(self, population, indices, world_objects, skip=None):
+        """Which of indices could score above 0: a superset of those decide() gives something to do.
+
+        With skip, as if that behavior didn't exist.
+        """
+        wanting = np.zeros(len(indices), dtype=bool)
+        for need, floor in self.floors(world_objects, skip):
+            wanting |= getattr(population, need)[indices] > floor
+        return wanting
+
+    def nearest_distances(self, objects, xs, ys):
+        """Distance from each point to the closest of objects' centers."""
+        version = getattr(objects, "version", len(objects))
+        cached = self._centers.get(id(objects))
+        if cached is None or cached[0] != version or cached[1] is not objects:
+            centers = np.array([obj.center for obj in objects], dtype=np.float64).reshape(-1, 2)
+            cached = self._centers[id(objects)] = (version, objects, centers)
+        centers = cached[2]
+        if len(centers) > NEAREST_SCAN:  # Too many to compare with all of them
+            closest = closest_objects(objects, xs, ys)
+            centers = np.array([obj.center for obj in closest], dtype=np.float64)
+            return np.hypot(centers[:, 0] - xs, centers[:, 1] - ys)
+        distances = np.empty(len(xs))
+        chunk = max(1, CHUNK_ENTRIES // len(centers))
+        for start in range(0, len(xs), chunk):
+            dx = centers[None, :, 0] - xs[start:start + chunk, None]
+            dy = centers[None, :, 1] - ys[start:start + chunk, None]
+            distances[start:start + chunk] = np.sqrt(np.min(dx * dx + dy * dy, axis=1))
+        return distances
+
+    def decide(self, population, indices, world_objects):
+        """Position in behaviors of what each simling in indices should do, -1 for nothing."""
+        indices = np.asarray(indices)
+        rows = self._table(world_objects)["rows"]
+        choice = np.full(len(indices), -1, dtype=np.int64)
+        best = np.zeros(len(indices))
+        for row in rows:
+            scores = self.behaviors[row].score(population, indices, world_objects, self.nearest_distances)
+            better = scores > best  # Strictly, so ties stay with the earlier behavior
+            choice[better] = row
+            best[better] = scores[better]
+        return choice
+
+
+# What simlings always did: food when hungry, else sleep when sleepy, else
+# fun, else company, each once its need is over 70. Weights only order them.
+CLASSIC = UtilityAI([
+    Behavior("seeking_food", "hunger", Step(70), weight=4, objects="food_sources", kind=FoodSource),
+    Behavior("seeking_sleep", "sleep", Step(70), weight=3, objects="beds", kind=Bed),
+    Behavior("seeking_fun", "fun", Step(70), weight=2, objects="televisions", kind=Television),
+    Behavior("seeking_social", "social", Step(70), weight=1, objects="interactions"),
+])
+
+# The most pressing need first, and a bit less keen on far away objects
+BALANCED = UtilityAI([
+    Behavior("seeking_food", "hunger", Linear(60, 100), objects="food_sources", kind=FoodSource,
+             distance_curve=Falloff(800)),
+    Behavior("seeking_sleep", "sleep", Linear(60, 100), objects="beds", kind=Bed, distance_curve=Falloff(800)),
+    Behavior("seeking_fun", "fun", Linear(70, 100), weight=0.8, objects="televisions", kind=Television,
+             distance_curve=Falloff(800)),
+    Behavior("seeking_social", "social", Linear(70, 100), weight=0.8, objects="interactions"),
+])
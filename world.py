@@ -0,0 +1,160 @@
+import random
+from simling import Simling
+from objects import FoodSource, Bed, Television, Wall
+from navigation import Navigation
+from resources import Reservations
+from social import Interactions
+from population import Population
+from spatial import ObjectGrid
+from utility import CLASSIC
+
+
+class World:
+    """All simlings and world objects, advanced without any rendering.
+
+    step() advances by an explicit dt (what main.py does with the frame
+    time from clock.tick). advance() and run() use a fixed timestep, so a
+    headless run goes as fast as the CPU allows and gives the same result
+    however it is chunked.
+
+    Walls are optional. While there are none, simlings walk straight at
+    their targets; otherwise they path around them within the size area
+    (see navigation.Navigation).
+
+    With contention (the default), food sources, beds and televisions
+    serve a limited number of simlings at a time and the rest queue, see
+    resources.Reservations. Without it, any number use them at once.
+    Queues aren't modelled by scheduler.EventScheduler, so a world to
+    fast-forward with it needs contention=False.
+
+    What idle simlings decide to do is up to ai, a utility.UtilityAI
+    (utility.CLASSIC, the original rules, by default). It rides along in
+    world_objects["ai"].
+
+    With social (the default), lonely simlings pair up with a neighbor
+    and talk, see social.Interactions. Without it nothing satisfies the
+    social need, as before there was a way to. Conversations aren't
+    modelled by scheduler.EventScheduler either, so fast-forwarding with
+    it needs social=False as well.
+
+    Setting lod to a lod.LODScheduler updates simlings far from the view
+    less often. Call lod.sync() before reading all of them.
+    """
+
+    def __init__(self, fixed_dt=1 / 60, seed=None, population=None, size=(800, 600), contention=True,
+                 social=True, ai=CLASSIC):
+        self.fixed_dt = fixed_dt
+        self.size = size
+        self.rng = random.Random(seed)
+        self.population = population if population is not None else Population()
+        self.simlings = []
+        self.food_sources = ObjectGrid()
+        self.beds = ObjectGrid()
+        self.televisions = ObjectGrid()
+        self.walls = ObjectGrid()
+        self.world_objects = {
+            "food_sources": self.food_sources,
+            "beds": self.beds,
+            "televisions": self.televisions,
+            "walls": self.walls,
+            "ai": ai,
+        }
+        self.ai = ai
+        self.navigation = Navigation(self.walls, *size)
+        self.contention = contention
+        if contention:
+            self.food_sources.reservations = Reservations(self.food_sources)
+            self.beds.reservations = Reservations(self.beds)
+            self.televisions.reservations = Reservations(self.televisions)
+        self.interactions = Interactions(self.population) if social else None
+        if social:
+            self.world_objects["interactions"] = self.interactions
+        self.lod = None
+        self.time = 0.0
+        self.tick = 0
+        self._accumulator = 0.0
+
+    def add_simling(self, x, y):
+        simling = Simling(x=x, y=y, population=self.population)
+        self.simlings.append(simling)
+        return simling
+
+    def spawn_simlings(self, count, width, height):
+        """Add count simlings at random positions in a width x height area, drawn from self.rng."""
+        return [self.add_simling(x=self.rng.uniform(0, width), y=self.rng.uniform(0, height))
+                for _ in range(count)]
+
+    def remove_simling(self, simling):
+        self.simlings.remove(simling)
+        for reservations in self.reservations():
+            reservations.cancel(simling)
+        self.population.release(simling.index)
+
+    def add_food_source(self, x, y):
+        food = FoodSource(x=x, y=y)
+        self.food_sources.append(food)
+        return food
+
+    def add_bed(self, x, y):
+        bed = Bed(x=x, y=y)
+        self.beds.append(bed)
+        return bed
+
+    def add_television(self, x, y):
+        television = Television(x=x, y=y)
+        self.televisions.append(television)
+        return television
+
+    def add_wall(self, x, y, width, height):
+        wall = Wall(x, y, width, height)
+        self.walls.append(wall)
+        return wall
+
+    def reservations(self):
+        """The Reservations of food sources, beds and televisions (none without contention)."""
+        return [objects.reservations for objects in (self.food_sources, self.beds, self.televisions)
+                if objects.reservations is not None]
+
+    def serve_queues(self):
+        """Let queued simlings use the objects that freed up by now, and end finished conversations."""
+        for reservations in self.reservations():
+            reservations.advance(self.time)
+        if self.interactions is not None:
+            self.interactions.advance(self.time)
+
+    def step(self, time_delta_seconds=None):
+        """Advance every simling by one step of time_delta_seconds (default fixed_dt)."""
+        if time_delta_seconds is None:
+            time_delta_seconds = self.fixed_dt
+        self.serve_queues()
+        if self.lod is not None:
+            self.lod.update(time_delta_seconds)
+        else:
+            self.update_slots(time_delta_seconds)
+        self.time += time_delta_seconds
+        self.tick += 1
+
+    def update_slots(self, elapsed, indices=None):
+        """Advance simlings (all, or the given slots) by elapsed seconds, without moving the clock.
+
+        elapsed is one value for all of them or one per slot.
+        """
+        Simling.update_many(elapsed, self.world_objects, population=self.population, indices=indices,
+                            navigation=self.navigation if self.walls else None)
+
+    def advance(self, elapsed_seconds):
+        """Run as many fixed steps as fit in elapsed_seconds, carrying the remainder over."""
+        self._accumulator += elapsed_seconds
+        # Small tolerance so float error doesn't drop a step that is due
+        steps = int(self._accumulator / self.fixed_dt + 1e-9)
+        self._accumulator -= steps * self.fixed_dt
+        for _ in range(steps):
+            self.step()
+        return steps
+
+    def run(self, duration_seconds):
+        """Simulate duration_seconds in fixed steps as fast as possible. Returns the step count."""
+        steps = round(duration_seconds / self.fixed_dt)
+        for _ in range(steps):
+            self.step()
+        return steps